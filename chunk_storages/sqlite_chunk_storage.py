@@ -42,7 +42,10 @@ class SQLiteChunkStorage(ChunkStorage):
     if not ids:
       return []
     id_placeholders = ",".join("?" for _ in ids)
-    self.cur.execute(f"SELECT chunk_json FROM {self.table_name} WHERE id IN ({id_placeholders})", ids)
-    rows = self.cur.fetchall()
-    chunks = [json.loads(row[0]) for row in rows]
+    self.cur.execute(f"SELECT id, chunk_json FROM {self.table_name} WHERE id IN ({id_placeholders})", ids)
+    chunk_of_id = {int(id): chunk_json for id, chunk_json in self.cur.fetchall()}
+
+    # Return the chunks in the order they were asked for (e.g. ranked), skipping unknown ids. Vector stores
+    # may hand out ids as strings (Pinecone does), so ids are compared as integers
+    chunks = [json.loads(chunk_of_id[int(id)]) for id in ids if int(id) in chunk_of_id]
     return chunks
\ No newline at end of file
@@ -52,6 +52,33 @@ class TestSQLiteChunkStorage(unittest.TestCase):
     actualChunks = sqliteStorage.retrieve_chunks(actualIds)
     self.assertEqual(actualChunks, expectedChunks)
 
+  def test_retrieve_chunks_in_requested_order(self):
+    # Arrange
+    chunks: List[Chunk] = [
+      {"search_text": "first", "metadata": {}},
+      {"search_text": "second", "metadata": {}},
+      {"search_text": "third", "metadata": {}}
+    ]
+    sqliteStorage = SQLiteChunkStorage(SQLITE_DB_NAME, "ordered_chunks")
+    ids = sqliteStorage.store_chunks(chunks)
+
+    # Act: Ask in rank order, including an id that does not exist
+    actualChunks = sqliteStorage.retrieve_chunks([ids[2], ids[0], 999, ids[1]])
+
+    # Assert
+    self.assertEqual([chunk["search_text"] for chunk in actualChunks], ["third", "first", "second"])
+
+  def test_retrieve_chunks_with_string_ids(self):
+    # Arrange: Pinecone returns the stored ids as strings
+    sqliteStorage = SQLiteChunkStorage(SQLITE_DB_NAME, "string_id_chunks")
+    ids = sqliteStorage.store_chunks([{"search_text": "first", "metadata": {}}, {"search_text": "second", "metadata": {}}])
+
+    # Act
+    actualChunks = sqliteStorage.retrieve_chunks([str(ids[1]), str(ids[0])])
+
+    # Assert
+    self.assertEqual([chunk["search_text"] for chunk in actualChunks], ["second", "first"])
+
 
 if __name__ == '__main__':
   unittest.main()
\ No newline at end of file
@@ -0,0 +1,106 @@
+from embedders.embedder import Embedder
+from rag_types.vector import as_matrix
+from typing import Dict, Iterable
+from collections import OrderedDict
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+
+# SQLite caps the number of parameters in one statement, so cache lookups are split into chunks of this size
+LOOKUP_CHUNK_SIZE = 500
+
+# Wraps any Embedder with a persistent, content-addressed cache. Vectors are keyed by a hash of
+# (model, dimension, text) and stored as float32 blobs in SQLite, with a size-bounded in-memory LRU in
+# front. Only the texts that miss both layers are sent to the wrapped embedder
+class CachingEmbedder(Embedder):
+  def __init__(self, embedder: Embedder, db_name: str, table_name: str = "embedding_cache", max_memory_entries: int = 10000,
+      model: str | None = None, dimension: int | None = None):
+    if not db_name:
+      raise RuntimeError("CachingEmbedder requires a db_name.")
+    if not table_name:
+      raise RuntimeError("CachingEmbedder requires a table_name.")
+
+    self.embedder = embedder
+    self.table_name = table_name
+    self.max_memory_entries = max_memory_entries
+
+    # The model and dimension are part of the key so that switching either never serves stale vectors
+    self.model = model if model is not None else getattr(embedder, "model", type(embedder).__name__)
+    self.dimension = dimension if dimension is not None else getattr(embedder, "dimension", None)
+
+    self.memory: OrderedDict[str, np.ndarray] = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+    # The retrievers call embed_strings from worker threads, so the connection is shared behind a lock
+    self.lock = threading.Lock()
+    self.conn = sqlite3.connect(db_name, check_same_thread=False)
+    self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table_name} (key TEXT PRIMARY KEY, vector BLOB)")
+    self.conn.commit()
+
+  def key(self, text: str) -> str:
+    return hashlib.sha256(f"{self.model}\x00{self.dimension}\x00{text}".encode("utf-8")).hexdigest()
+
+  def _remember(self, key: str, vector: np.ndarray):
+    self.memory[key] = vector
+    self.memory.move_to_end(key)
+    while len(self.memory) > self.max_memory_entries:
+      self.memory.popitem(last=False)
+
+  def embed_strings(self, strings: Iterable[str]) -> np.ndarray:
+    strings = list(strings)
+    if len(strings) == 0:
+      return np.empty((0, self.dimension or 0), dtype=np.float32)
+    keys = [self.key(string) for string in strings]
+
+    with self.lock:
+      found: Dict[str, np.ndarray] = {}
+
+      # First layer: the in-memory LRU
+      for key in keys:
+        if key in self.memory:
+          self.memory.move_to_end(key)
+          found[key] = self.memory[key]
+
+      # Second layer: SQLite, for everything the LRU did not have
+      missing = list(dict.fromkeys(key for key in keys if key not in found))
+      for start in range(0, len(missing), LOOKUP_CHUNK_SIZE):
+        chunk = missing[start:start + LOOKUP_CHUNK_SIZE]
+        placeholders = ",".join("?" for _ in chunk)
+        rows = self.conn.execute(f"SELECT key, vector FROM {self.table_name} WHERE key IN ({placeholders})", chunk).fetchall()
+        for key, blob in rows:
+          found[key] = np.frombuffer(blob, dtype=np.float32)
+          self._remember(key, found[key])
+
+      # Every requested text the cache layers answered is a hit, repeats included; the rest are misses
+      cache_hits = sum(1 for key in keys if key in found)
+
+    # Send each distinct missing text upstream once, outside the lock so other callers aren't blocked
+    string_of_key = dict(zip(keys, strings))
+    upstream_keys = list(dict.fromkeys(key for key in keys if key not in found))
+    upstream_strings = [string_of_key[key] for key in upstream_keys]
+    upstream_vectors = as_matrix(self.embedder.embed_strings(upstream_strings)) if upstream_strings else None
+
+    with self.lock:
+      if upstream_vectors is not None:
+        self.conn.executemany(
+          f"INSERT OR REPLACE INTO {self.table_name} (key, vector) VALUES (?, ?)",
+          [(key, vector.tobytes()) for key, vector in zip(upstream_keys, upstream_vectors)]
+        )
+        self.conn.commit()
+        for key, vector in zip(upstream_keys, upstream_vectors):
+          # Copied so the LRU doesn't keep the whole upstream matrix alive through a view
+          found[key] = vector.copy()
+          self._remember(key, found[key])
+
+      self.hits += cache_hits
+      self.misses += len(keys) - cache_hits
+
+    # Reassemble in the caller's order
+    return np.stack([found[key] for key in keys])
+
+  @property
+  def hit_rate(self) -> float:
+    total = self.hits + self.misses
+    return self.hits / total if total else 0.0
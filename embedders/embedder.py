@@ -1,7 +1,16 @@
 from abc import ABC, abstractmethod
 from typing import List
+import asyncio
+import numpy as np
 
 class Embedder(ABC):
+  # Returns one row per string as an (n, dimension) float32 matrix, so embeddings can flow into the vector
+  # stores without being boxed into Python floats
   @abstractmethod
-  def embed_strings(self, strings: List[str]) -> List[List[float]]:
-    pass
\ No newline at end of file
+  def embed_strings(self, strings: List[str]) -> np.ndarray:
+    pass
+
+  # Async counterpart of embed_strings. The default runs the synchronous method in a worker thread;
+  # embedders with a native async client should override it
+  async def embed_strings_async(self, strings: List[str]) -> np.ndarray:
+    return await asyncio.to_thread(self.embed_strings, strings)
\ No newline at end of file
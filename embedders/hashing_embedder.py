@@ -0,0 +1,104 @@
+from embedders.embedder import Embedder
+from typing import List, Dict, Iterable
+from multiprocessing.pool import Pool
+import multiprocessing
+import re
+import zlib
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Strings per worker task. A batch that fits in one chunk is embedded in-process, since shipping it to a
+# worker costs more than it saves
+DEFAULT_CHUNK_SIZE = 2048
+
+# Embeds a list of strings with the hashing trick: every word n-gram is hashed to one of dimension
+# columns, with a second hash bit choosing its sign so that collisions cancel out on average instead of
+# piling up. Rows are L2 normalized, so cosine similarity tracks the overlap of the texts' n-grams.
+# The strings are embedded chunk_size at a time straight into one float32 matrix, so the only float64
+# temporaries are the size of a chunk rather than of the whole batch
+def hash_embed(strings: List[str], dimension: int, ngram_range: tuple[int, int] = (1, 2),
+    chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+  matrix = np.empty((len(strings), dimension), dtype=np.float32)
+  for start in range(0, len(strings), chunk_size):
+    _hash_embed_into(strings[start:start + chunk_size], ngram_range, matrix[start:start + chunk_size])
+  return matrix
+
+# Writes the normalized embeddings of strings into out, a float32 (len(strings), dimension) view
+def _hash_embed_into(strings: List[str], ngram_range: tuple[int, int], out: np.ndarray):
+  dimension = out.shape[1]
+  rows: List[int] = []
+  tokens: List[str] = []
+  for row, string in enumerate(strings):
+    words = TOKEN_PATTERN.findall(string.lower())
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+      grams = words if n == 1 else [" ".join(words[i:i + n]) for i in range(len(words) - n + 1)]
+      tokens += grams
+      rows += [row] * len(grams)
+
+  out[:] = 0
+  if tokens:
+    # Each distinct n-gram is hashed once. crc32 is used rather than hash() because it is stable across
+    # processes, which both the worker pool and persisted vectors rely on
+    position_of_token: Dict[str, int] = {}
+    inverse = np.fromiter((position_of_token.setdefault(token, len(position_of_token)) for token in tokens),
+      dtype=np.int64, count=len(tokens))
+    hashes = np.fromiter((zlib.crc32(token.encode("utf-8")) for token in position_of_token), dtype=np.int64,
+      count=len(position_of_token))[inverse]
+    columns = (hashes & 0x7FFFFFFF) % dimension
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+
+    # One bincount over the flattened (row, column) cells accumulates every count at once
+    counts = np.bincount(np.asarray(rows, dtype=np.int64) * dimension + columns, weights=signs, minlength=out.size)
+    out[:] = counts.reshape(out.shape)
+
+  norms = np.linalg.norm(out, axis=1, keepdims=True)
+  out /= np.where(norms == 0, 1, norms)
+
+def _hash_embed_chunk(args: tuple[List[str], int, tuple[int, int]]) -> np.ndarray:
+  return hash_embed(*args)
+
+# Local embedder that needs no network, API key or model weights, for tests, benchmarks, load tests and
+# low-value bulk ingestion. Vectors only capture lexical overlap, so they are no substitute for a semantic
+# model in retrieval quality, but they are deterministic and cost microseconds per chunk. With processes
+# above 1, large batches are split across a pool of worker processes
+class HashingEmbedder(Embedder):
+  def __init__(self, dimension: int = 3072, ngram_range: tuple[int, int] = (1, 2), processes: int = 1,
+      chunk_size: int = DEFAULT_CHUNK_SIZE):
+    if dimension < 1:
+      raise RuntimeError("HashingEmbedder requires a dimension of at least 1.")
+    if ngram_range[0] < 1 or ngram_range[1] < ngram_range[0]:
+      raise RuntimeError("HashingEmbedder requires an ngram_range (min, max) with 1 <= min <= max.")
+
+    self.dimension = dimension
+    self.ngram_range = ngram_range
+    self.processes = processes
+    self.chunk_size = chunk_size
+    self.model = f"hashing-{ngram_range[0]}-{ngram_range[1]}"
+
+    # The pool is started on first use and reused by every later batch
+    self.pool: Pool | None = None
+
+  def embed_strings(self, strings: Iterable[str]) -> np.ndarray:
+    strings = list(strings)
+    if self.processes <= 1 or len(strings) <= self.chunk_size:
+      return hash_embed(strings, self.dimension, self.ngram_range, self.chunk_size)
+
+    if self.pool is None:
+      self.pool = multiprocessing.Pool(self.processes)
+    chunks = [
+      (strings[start:start + self.chunk_size], self.dimension, self.ngram_range)
+      for start in range(0, len(strings), self.chunk_size)
+    ]
+
+    # Worker results are copied into one preallocated matrix as they arrive rather than concatenated at the end
+    matrix = np.empty((len(strings), self.dimension), dtype=np.float32)
+    for n, embeddings in enumerate(self.pool.imap(_hash_embed_chunk, chunks)):
+      matrix[n * self.chunk_size:n * self.chunk_size + len(embeddings)] = embeddings
+    return matrix
+
+  def close(self):
+    if self.pool is not None:
+      self.pool.close()
+      self.pool.join()
+      self.pool = None
@@ -1,19 +1,105 @@
 from embedders.embedder import Embedder
-from typing import List
-from openai import OpenAI
-from rag_types.chunk import Chunk
+from openai_clients.client_pool import get_client, get_async_client
+from openai import AsyncOpenAI
+from openai_clients.rate_limiter import get_rate_limiter, configure_rate_limit, estimate_tokens, INTERACTIVE
+from openai_clients.retry_policy import RetryPolicy, DEFAULT_RETRY_POLICY
+from typing import List, Iterable, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import asyncio
+import base64
 
+# OpenAI rejects embedding requests with more than 2048 inputs or 300k tokens in total
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = 300_000
+
+# The client, the model's rate limiter and the retry policy are shared with every other OpenAI-backed
+# component. requests_per_minute and tokens_per_minute, when given, set the budget of the model for all of
+# them. Embedders used for ingestion should pass priority=BATCH so query embeddings go first
 class OpenAIEmbedder(Embedder):
-  def __init__(self, openai_api_key: str, dimension: int = 3072, model: str = "text-embedding-3-large"):
-    self.client = OpenAI(api_key=openai_api_key)
+  def __init__(self, openai_api_key: str, dimension: int = 3072, model: str = "text-embedding-3-large",
+      max_batch_inputs: int = MAX_BATCH_INPUTS, max_batch_tokens: int = MAX_BATCH_TOKENS, max_concurrency: int = 4,
+      requests_per_minute: int | None = None, tokens_per_minute: int | None = None, priority: int = INTERACTIVE,
+      retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY):
+    self.openai_api_key = openai_api_key
+    self.client = get_client(openai_api_key)
     self.model = model
     self.dimension = dimension
 
-  def embed_strings(self, strings: List[str]) -> List[List[float]]:
-    if len(strings) == 0:
-      return []
+    self.max_batch_inputs = min(max_batch_inputs, MAX_BATCH_INPUTS)
+    self.max_batch_tokens = min(max_batch_tokens, MAX_BATCH_TOKENS)
+    self.max_concurrency = max_concurrency
+    self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    if requests_per_minute is not None or tokens_per_minute is not None:
+      configure_rate_limit(model, requests_per_minute, tokens_per_minute)
+    self.rate_limiter = get_rate_limiter(model)
+    self.priority = priority
+    self.retry_policy = retry_policy
+
+  # The pooled async client of the running event loop
+  @property
+  def async_client(self) -> AsyncOpenAI:
+    return get_async_client(self.openai_api_key)
+
+  # Splits the inputs into consecutive (start, end, estimated tokens) batches bounded by both the input
+  # count and the estimated token count
+  def make_batches(self, strings: List[str]) -> List[Tuple[int, int, int]]:
+    batches = []
+    start = 0
+    batch_tokens = 0
+    for i, string in enumerate(strings):
+      tokens = estimate_tokens(string)
+      if i > start and (i - start >= self.max_batch_inputs or batch_tokens + tokens > self.max_batch_tokens):
+        batches.append((start, i, batch_tokens))
+        start = i
+        batch_tokens = 0
+      batch_tokens += tokens
+    if start < len(strings):
+      batches.append((start, len(strings), batch_tokens))
+    return batches
+
+  def embed_strings(self, strings: Iterable[str]) -> np.ndarray:
+    strings = list(strings)
+
+    # Every batch is decoded straight into its rows of one preallocated matrix, in input order
+    vectors = np.empty((len(strings), self.dimension), dtype=np.float32)
+    batches = self.make_batches(strings)
+    for _ in self.executor.map(lambda batch: self._embed_batch(strings, batch, vectors), batches):
+      pass
+    return vectors
+
+  async def embed_strings_async(self, strings: Iterable[str]) -> np.ndarray:
+    strings = list(strings)
+    vectors = np.empty((len(strings), self.dimension), dtype=np.float32)
+
+    # Same batching as embed_strings, with a semaphore instead of a thread pool bounding the concurrency
+    semaphore = asyncio.Semaphore(self.max_concurrency)
+    async def embed_batch(batch: Tuple[int, int, int]):
+      async with semaphore:
+        await self._embed_batch_async(strings, batch, vectors)
+    await asyncio.gather(*(embed_batch(batch) for batch in self.make_batches(strings)))
+    return vectors
+
+  # Requests base64 embeddings and decodes them with NumPy instead of letting the SDK parse one Python float
+  # per value, writing each row into the output matrix
+  @staticmethod
+  def _write_rows(response, start: int, vectors: np.ndarray):
+    for data in response.data:
+      vectors[start + data.index] = np.frombuffer(base64.b64decode(data.embedding), dtype=np.float32)
 
-    response = self.client.embeddings.create(model=self.model, input=strings, dimensions=self.dimension)
-    vectors = [data.embedding for data in response.data]
+  # Embeds one batch within the shared rate limits, retrying transient failures
+  def _embed_batch(self, strings: List[str], batch: Tuple[int, int, int], vectors: np.ndarray):
+    start, end, estimated_tokens = batch
+    response = self.retry_policy.call(
+      lambda: self.client.embeddings.create(model=self.model, input=strings[start:end], dimensions=self.dimension,
+        encoding_format="base64"),
+      self.rate_limiter, estimated_tokens, self.priority, component="openai_embedder", model=self.model)
+    self._write_rows(response, start, vectors)
 
-    return vectors
\ No newline at end of file
+  async def _embed_batch_async(self, strings: List[str], batch: Tuple[int, int, int], vectors: np.ndarray):
+    start, end, estimated_tokens = batch
+    response = await self.retry_policy.call_async(
+      lambda: self.async_client.embeddings.create(model=self.model, input=strings[start:end], dimensions=self.dimension,
+        encoding_format="base64"),
+      self.rate_limiter, estimated_tokens, self.priority, component="openai_embedder", model=self.model)
+    self._write_rows(response, start, vectors)
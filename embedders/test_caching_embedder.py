@@ -0,0 +1,98 @@
+import unittest
+import os
+import tempfile
+from unittest.mock import MagicMock
+from embedders.caching_embedder import CachingEmbedder
+
+class TestCachingEmbedder(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+    self.db_name = os.path.join(self.directory.name, "cache.db")
+
+    # Fake upstream embedder: each string embeds to [len(string), 1.0]
+    self.upstream = MagicMock()
+    self.upstream.model = "test-model"
+    self.upstream.dimension = 2
+    self.upstream.embed_strings.side_effect = lambda strings: [[float(len(s)), 1.0] for s in strings]
+
+  def test_only_misses_are_sent_upstream_and_order_is_preserved(self):
+    # Arrange
+    embedder = CachingEmbedder(self.upstream, self.db_name)
+    embedder.embed_strings(["a", "bb"])
+
+    # Act
+    vectors = embedder.embed_strings(["ccc", "a", "bb", "ccc"])
+
+    # Assert: only "ccc" was new, and it was sent once despite appearing twice
+    self.upstream.embed_strings.assert_called_with(["ccc"])
+    self.assertEqual(vectors.tolist(), [[3.0, 1.0], [1.0, 1.0], [2.0, 1.0], [3.0, 1.0]])
+    self.assertEqual(embedder.misses, 4)
+    self.assertEqual(embedder.hits, 2)
+
+  def test_cache_persists_across_instances(self):
+    # Arrange
+    CachingEmbedder(self.upstream, self.db_name).embed_strings(["hello"])
+    self.upstream.embed_strings.reset_mock()
+
+    # Act: A fresh instance with an empty memory layer reads the vector from SQLite
+    vectors = CachingEmbedder(self.upstream, self.db_name).embed_strings(["hello"])
+
+    # Assert
+    self.upstream.embed_strings.assert_not_called()
+    self.assertEqual(vectors.tolist(), [[5.0, 1.0]])
+
+  def test_different_model_or_dimension_does_not_share_entries(self):
+    # Arrange
+    CachingEmbedder(self.upstream, self.db_name).embed_strings(["hello"])
+    self.upstream.embed_strings.reset_mock()
+
+    # Act
+    CachingEmbedder(self.upstream, self.db_name, dimension=3).embed_strings(["hello"])
+
+    # Assert
+    self.upstream.embed_strings.assert_called_once_with(["hello"])
+
+  def test_memory_layer_is_bounded(self):
+    # Arrange
+    embedder = CachingEmbedder(self.upstream, self.db_name, max_memory_entries=2)
+
+    # Act
+    embedder.embed_strings(["a", "b", "c"])
+
+    # Assert: The least recently used entry was evicted from memory but is still on disk
+    self.assertEqual(len(embedder.memory), 2)
+    self.upstream.embed_strings.reset_mock()
+    self.assertEqual(embedder.embed_strings(["a"]).tolist(), [[1.0, 1.0]])
+    self.upstream.embed_strings.assert_not_called()
+
+  def test_hit_rate(self):
+    # Arrange
+    embedder = CachingEmbedder(self.upstream, self.db_name)
+
+    # Act
+    embedder.embed_strings(["a", "b"])
+    embedder.embed_strings(["a", "b"])
+
+    # Assert
+    self.assertEqual(embedder.hit_rate, 0.5)
+
+  def test_repeated_misses_are_not_counted_as_hits(self):
+    # Arrange
+    embedder = CachingEmbedder(self.upstream, self.db_name)
+
+    # Act: "a" is asked for twice in one call but is in neither cache layer
+    embedder.embed_strings(["a", "a"])
+
+    # Assert
+    self.assertEqual((embedder.hits, embedder.misses), (0, 2))
+    self.assertEqual(embedder.hit_rate, 0.0)
+
+  def test_embedding_0_strings(self):
+    embedder = CachingEmbedder(self.upstream, self.db_name)
+    self.assertEqual(len(embedder.embed_strings([])), 0)
+    self.upstream.embed_strings.assert_not_called()
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+from embedders.hashing_embedder import HashingEmbedder
+
+class TestHashingEmbedder(unittest.TestCase):
+
+  def setUp(self):
+    self.embedder = HashingEmbedder(dimension=256)
+
+  def test_returns_normalized_float32_matrix(self):
+    # Act
+    vectors = self.embedder.embed_strings(["the cat sat on the mat", "a dog barked"])
+
+    # Assert
+    self.assertEqual(vectors.shape, (2, 256))
+    self.assertEqual(vectors.dtype, np.float32)
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), [1.0, 1.0], rtol=1e-5)
+
+  def test_is_deterministic_across_instances(self):
+    first = self.embedder.embed_strings(["retrieval augmented generation"])
+    second = HashingEmbedder(dimension=256).embed_strings(["retrieval augmented generation"])
+    np.testing.assert_array_equal(first, second)
+
+  def test_overlapping_texts_are_more_similar(self):
+    # Arrange
+    query, related, unrelated = self.embedder.embed_strings([
+      "how do I reset my password",
+      "steps to reset a forgotten password",
+      "quarterly revenue grew by ten percent",
+    ])
+
+    # Act & Assert
+    self.assertGreater(query @ related, query @ unrelated)
+
+  def test_empty_inputs(self):
+    self.assertEqual(self.embedder.embed_strings([]).shape, (0, 256))
+    self.assertEqual(self.embedder.embed_strings([""]).tolist(), [[0.0] * 256])
+
+  def test_multiprocessing_matches_single_process(self):
+    # Arrange: Chunks of 3 strings so the 10 strings are spread over several workers
+    strings = [f"chunk number {i} about topic {i % 3}" for i in range(10)]
+    embedder = HashingEmbedder(dimension=256, processes=2, chunk_size=3)
+    self.addCleanup(embedder.close)
+
+    # Act
+    vectors = embedder.embed_strings(strings)
+
+    # Assert
+    self.assertIsNotNone(embedder.pool)
+    np.testing.assert_array_equal(vectors, self.embedder.embed_strings(strings))
+
+  def test_chunked_embedding_matches_one_chunk(self):
+    # Arrange: In-process, 10 strings in chunks of 3 are embedded over four slices of the output
+    strings = [f"chunk number {i} about topic {i % 3}" for i in range(10)]
+
+    # Act
+    vectors = HashingEmbedder(dimension=256, chunk_size=3).embed_strings(strings)
+
+    # Assert
+    self.assertEqual(vectors.dtype, np.float32)
+    np.testing.assert_array_equal(vectors, self.embedder.embed_strings(strings))
+
+  def test_invalid_ngram_range_raises_error(self):
+    with self.assertRaises(RuntimeError):
+      HashingEmbedder(ngram_range=(2, 1))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,6 +1,13 @@
 from typing import List
+import asyncio
+import base64
+import numpy as np
 import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
 from embedders.openai_embedder import OpenAIEmbedder
+from openai_clients.client_pool import close_clients
+from openai_clients.retry_policy import RetryPolicy
+from openai import RateLimitError, BadRequestError
 import dotenv
 import os
 
@@ -17,7 +24,7 @@ class TestOpenAIEmbedder(unittest.TestCase):
     # Act & Assert
     vectors = embedder.embed_strings(toEmbed)
     self.assertEqual(len(vectors), 3)
-    self.assertEqual(len(vectors[0]), 3072)
+    self.assertEqual(vectors.shape, (3, 3072))
 
   def test_embedding_0_strings(self):
     # Arrange
@@ -28,5 +35,126 @@ class TestOpenAIEmbedder(unittest.TestCase):
     vectors = embedder.embed_strings(toEmbed)
     self.assertEqual(len(vectors), 0)
 
+# Builds an OpenAI SDK error without an HTTP response, which is all the retry logic looks at
+def make_error(error_type):
+  return error_type.__new__(error_type)
+
+# Fake base64 embeddings response whose vectors are [index of the input within the request, input length]
+def fake_response(model, input, dimensions, encoding_format):
+  return MagicMock(data=[
+    MagicMock(index=i, embedding=base64.b64encode(np.array([i, len(s)], dtype=np.float32).tobytes()).decode())
+    for i, s in enumerate(input)
+  ])
+
+class TestOpenAIEmbedderBatching(unittest.TestCase):
+  def setUp(self):
+    openai_patcher = patch('openai_clients.client_pool.OpenAI')
+    async_openai_patcher = patch('openai_clients.client_pool.AsyncOpenAI')
+    sleep_patcher = patch('openai_clients.retry_policy.time.sleep')
+    close_clients()
+    self.addCleanup(close_clients)
+    self.mock_openai = openai_patcher.start()
+    self.mock_async_openai = async_openai_patcher.start()
+    self.mock_sleep = sleep_patcher.start()
+    self.addCleanup(openai_patcher.stop)
+    self.addCleanup(async_openai_patcher.stop)
+    self.addCleanup(sleep_patcher.stop)
+    self.create = self.mock_openai.return_value.embeddings.create
+    self.create.side_effect = fake_response
+    self.async_create = AsyncMock(side_effect=fake_response)
+    self.mock_async_openai.return_value.embeddings.create = self.async_create
+
+  def test_batches_are_bounded_by_input_count(self):
+    # Arrange
+    embedder = OpenAIEmbedder("key", dimension=2, max_batch_inputs=2)
+
+    # Act
+    vectors = embedder.embed_strings(["a", "bb", "ccc", "dddd", "eeeee"])
+
+    # Assert: 3 requests, results stitched back together in input order
+    self.assertEqual(self.create.call_count, 3)
+    self.assertEqual([v[1] for v in vectors], [1.0, 2.0, 3.0, 4.0, 5.0])
+
+  def test_batches_are_bounded_by_estimated_tokens(self):
+    # Arrange: Each 40 character string is estimated at 11 tokens
+    embedder = OpenAIEmbedder("key", dimension=2, max_batch_tokens=25)
+
+    # Act
+    batches = embedder.make_batches(["x" * 40] * 5)
+
+    # Assert
+    self.assertEqual([(start, end) for start, end, _ in batches], [(0, 2), (2, 4), (4, 5)])
+
+  def test_oversized_input_gets_its_own_batch(self):
+    embedder = OpenAIEmbedder("key", dimension=2, max_batch_tokens=10)
+    self.assertEqual([(start, end) for start, end, _ in embedder.make_batches(["x" * 400, "y"])], [(0, 1), (1, 2)])
+
+  def test_returns_contiguous_float32_matrix(self):
+    # Arrange
+    embedder = OpenAIEmbedder("key", dimension=2, max_batch_inputs=2)
+
+    # Act
+    vectors = embedder.embed_strings(["a", "bb", "ccc"])
+
+    # Assert: base64 was requested and decoded into one matrix
+    self.assertEqual(vectors.dtype, np.float32)
+    self.assertTrue(vectors.flags['C_CONTIGUOUS'])
+    self.assertEqual(vectors.tolist(), [[0.0, 1.0], [1.0, 2.0], [0.0, 3.0]])
+    self.assertEqual(self.create.call_args.kwargs['encoding_format'], "base64")
+
+  def test_generators_are_accepted(self):
+    embedder = OpenAIEmbedder("key", dimension=2)
+    self.assertEqual(len(embedder.embed_strings(s for s in ["a", "b"])), 2)
+
+  def test_rate_limited_batches_are_retried(self):
+    # Arrange
+    self.create.side_effect = [make_error(RateLimitError), fake_response(None, ["a"], None, "base64")]
+    embedder = OpenAIEmbedder("key", dimension=2)
+
+    # Act
+    vectors = embedder.embed_strings(["a"])
+
+    # Assert
+    self.assertEqual(self.create.call_count, 2)
+    self.assertEqual(vectors.tolist(), [[0.0, 1.0]])
+    self.mock_sleep.assert_called_once()
+
+  def test_client_errors_are_not_retried(self):
+    # Arrange
+    self.create.side_effect = make_error(BadRequestError)
+    embedder = OpenAIEmbedder("key", dimension=2)
+
+    # Act & Assert
+    with self.assertRaises(BadRequestError):
+      embedder.embed_strings(["a"])
+    self.assertEqual(self.create.call_count, 1)
+
+  def test_gives_up_after_max_retries(self):
+    # Arrange
+    self.create.side_effect = make_error(RateLimitError)
+    embedder = OpenAIEmbedder("key", dimension=2, retry_policy=RetryPolicy(max_retries=2))
+
+    # Act & Assert
+    with self.assertRaises(RateLimitError):
+      embedder.embed_strings(["a"])
+    self.assertEqual(self.create.call_count, 3)
+
+  def test_async_embedding_batches_and_preserves_order(self):
+    # Arrange
+    embedder = OpenAIEmbedder("key", dimension=2, max_batch_inputs=2)
+
+    # Act
+    vectors = asyncio.run(embedder.embed_strings_async(["a", "bb", "ccc"]))
+
+    # Assert: Native async client used, sync client untouched
+    self.assertEqual(self.async_create.await_count, 2)
+    self.create.assert_not_called()
+    self.assertEqual([v[1] for v in vectors], [1.0, 2.0, 3.0])
+
+  def test_async_embedding_0_strings(self):
+    embedder = OpenAIEmbedder("key", dimension=2)
+    self.assertEqual(asyncio.run(embedder.embed_strings_async([])).shape, (0, 2))
+    self.async_create.assert_not_called()
+
 if __name__ == "__main__":
   unittest.main()
\ No newline at end of file
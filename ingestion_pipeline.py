@@ -1,19 +1,39 @@
+from typing import List, Callable
 from chunk_storages.chunk_storage import ChunkStorage
 from embedders.embedder import Embedder
 from loader_chunkers.loader_chunker import LoaderChunker
 from vector_stores.vector_store import VectorStore
+from retrievers.bm25_index import BM25Index
+from rag_types.vector import Metadata
 
 
 class IngestionPipeline:
-  def __init__(self, loaderChunker: LoaderChunker, chunkStorage: ChunkStorage, embedder: Embedder, vectorStore: VectorStore):
+  # The optional lexicalIndex is kept in sync with the vector store, for lexical and hybrid retrieval
+  def __init__(self, loaderChunker: LoaderChunker, chunkStorage: ChunkStorage, embedder: Embedder, vectorStore: VectorStore,
+      lexicalIndex: BM25Index | None = None):
     self.loaderChunker = loaderChunker
     self.chunkStorage = chunkStorage
     self.embedder = embedder
     self.vectorStore = vectorStore
+    self.lexicalIndex = lexicalIndex
+    self.ingestListeners: List[Callable[[List[int]], None]] = []
 
-  # Ingests all files at a given path
-  def ingest(self, path: str):
+  # Registers a callback that receives the ids of every ingestion's new vectors once they are stored, e.g.
+  # CachingRetriever.invalidate so that no cached result outlives the data it was computed from
+  def add_ingest_listener(self, listener: Callable[[List[int]], None]):
+    self.ingestListeners.append(listener)
+
+  # Ingests all files at a given path. Every vector gets its chunk's metadata from the loader (e.g. the
+  # source file), plus the optional metadata of this ingestion (e.g. a tenant or ingestion batch), which
+  # wins on conflicting keys, so that searches can later be filtered on either
+  def ingest(self, path: str, metadata: Metadata | None = None):
     chunks = self.loaderChunker.load_and_chunk(path)
     ids = self.chunkStorage.store_chunks(chunks)
     vectors = self.embedder.embed_strings(chunk['search_text'] for chunk in chunks)
-    self.vectorStore.store_embeddings(ids, vectors)
+    vector_metadata: List[Metadata] = [chunk.get('metadata', {}) | (metadata or {}) for chunk in chunks]
+    self.vectorStore.store_embeddings(ids, vectors, vector_metadata if any(vector_metadata) else None)
+    self.vectorStore.flush()
+    if self.lexicalIndex is not None:
+      self.lexicalIndex.add_documents(ids, [chunk['search_text'] for chunk in chunks])
+    for listener in self.ingestListeners:
+      listener(ids)
@@ -1,14 +1,40 @@
-from typing import List, Any
+from typing import List, Any, Iterator, AsyncIterator
 from llms.llm import LLM
-from openai import OpenAI
+from llms.completion_cache import CompletionCache
+from openai import OpenAI, AsyncOpenAI
+from openai_clients.client_pool import get_client, get_async_client
+from openai_clients.rate_limiter import get_rate_limiter, estimate_tokens, INTERACTIVE
+from openai_clients.retry_policy import RetryPolicy, DEFAULT_RETRY_POLICY
+from metrics.model_calls import record_usage
 
 class ChatGPT(LLM):
-  def __init__(self, openai: OpenAI):
-    self.client = openai
+  # Given an openai_api_key and no clients, the pooled clients of openai_clients.client_pool are used, sharing
+  # their connections with the other components. Explicit clients take precedence; without any async client
+  # the async stream reads the synchronous one from a worker thread.
+  # With a cache, create_completion answers repeated requests without calling the model
+  def __init__(self, openai: OpenAI | None = None, model: str = "gpt-4.1", async_openai: AsyncOpenAI | None = None,
+      priority: int = INTERACTIVE, retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY, cache: CompletionCache | None = None,
+      openai_api_key: str | None = None):
+    if openai is None and openai_api_key is None:
+      raise RuntimeError("ChatGPT requires either an OpenAI client or an openai_api_key.")
+    self.openai_api_key = openai_api_key
+    self.client = openai if openai is not None else get_client(openai_api_key) # type: ignore
+    self.cache = cache
+    self.explicit_async_client = async_openai
+    self.model = model
+    self.rate_limiter = get_rate_limiter(model)
+    self.priority = priority
+    self.retry_policy = retry_policy
 
-  def create_completion(self, prompt: str,
-      system_message: str | None = None,
-      images_base64: List[str] | None = None) -> str:
+  # The async client to stream with: the one passed in, else the pooled client of the running event loop
+  @property
+  def async_client(self) -> AsyncOpenAI | None:
+    if self.explicit_async_client is not None or self.openai_api_key is None:
+      return self.explicit_async_client
+    return get_async_client(self.openai_api_key)
+
+  # Builds the chat messages for a prompt with an optional system message and images
+  def build_messages(self, prompt: str, system_message: str | None = None, images_base64: List[str] | None = None) -> List[dict[str, Any]]:
     message_content: List[dict[str, Any]] = [{"type": "text", "text": prompt}]
     
     # Append images to message content if we have any
@@ -23,16 +49,86 @@ class ChatGPT(LLM):
     messages: List[dict[str, Any]] = [{"role": "user", "content": message_content}]
     if system_message is not None:
       messages.append({"role": "system", "message": system_message})
+    return messages
+
+  # Estimated tokens of a request, budgeting roughly 1000 tokens per image
+  def estimate_tokens(self, prompt: str, system_message: str | None, images_base64: List[str] | None) -> int:
+    return estimate_tokens(prompt) + estimate_tokens(system_message or "") + 1000 * len(images_base64 or [])
+
+  def create_completion(self, prompt: str,
+      system_message: str | None = None,
+      images_base64: List[str] | None = None) -> str:
+    key = None
+    if self.cache is not None:
+      key = self.cache.key(self.model, prompt, system_message, images_base64)
+      cached = self.cache.get(key)
+      if cached is not None:
+        return cached
 
     # Call openai
     try:
-      response = self.client.chat.completions.create(
+      response = self.retry_policy.call(
+        lambda: self.client.chat.completions.create(
           model=self.model,
           # ignore typing issues here since it's just an integration and the typing is funny with openai sdk
-          messages=messages # type: ignore
-      )
+          messages=self.build_messages(prompt, system_message, images_base64) # type: ignore
+        ),
+        self.rate_limiter, self.estimate_tokens(prompt, system_message, images_base64), self.priority,
+        component="chat_gpt", model=self.model)
       if response.choices[0].message.content is None:
         raise RuntimeError("No content returned from OpenAI API")
-      return response.choices[0].message.content
+      completion = response.choices[0].message.content
     except:
-      raise RuntimeError("Something went wrong while calling the model with the openai SDK in an instance of ChatGPT")
\ No newline at end of file
+      raise RuntimeError("Something went wrong while calling the model with the openai SDK in an instance of ChatGPT")
+
+    if self.cache is not None and key is not None:
+      self.cache.put(key, completion)
+    return completion
+
+  # Streams the completion. Leaving the with block (also when the consumer closes the generator early)
+  # closes the HTTP response, which stops generation. Only Exception is caught, so GeneratorExit passes through
+  def _stream_deltas(self, prompt: str, system_message: str | None, images_base64: List[str] | None) -> Iterator[str]:
+    try:
+      # Only opening the stream is retried: once deltas have been yielded, a retry would repeat them
+      stream = self.retry_policy.call(
+        lambda: self.client.chat.completions.create(
+          model=self.model,
+          messages=self.build_messages(prompt, system_message, images_base64), # type: ignore
+          stream=True,
+          stream_options={"include_usage": True}
+        ),
+        self.rate_limiter, self.estimate_tokens(prompt, system_message, images_base64), self.priority,
+        component="chat_gpt", model=self.model)
+      with stream:
+        for chunk in stream:
+          if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+          elif not chunk.choices and chunk.usage is not None:
+            record_usage("chat_gpt", self.model, chunk.usage)
+    except Exception as e:
+      raise RuntimeError("Something went wrong while streaming from the model with the openai SDK in an instance of ChatGPT") from e
+
+  async def _stream_deltas_async(self, prompt: str, system_message: str | None, images_base64: List[str] | None) -> AsyncIterator[str]:
+    if self.async_client is None:
+      async for delta in super()._stream_deltas_async(prompt, system_message, images_base64):
+        yield delta
+      return
+
+    try:
+      stream = await self.retry_policy.call_async(
+        lambda: self.async_client.chat.completions.create( # type: ignore
+          model=self.model,
+          messages=self.build_messages(prompt, system_message, images_base64), # type: ignore
+          stream=True,
+          stream_options={"include_usage": True}
+        ),
+        self.rate_limiter, self.estimate_tokens(prompt, system_message, images_base64), self.priority,
+        component="chat_gpt", model=self.model)
+      async with stream:
+        async for chunk in stream:
+          if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+          elif not chunk.choices and chunk.usage is not None:
+            record_usage("chat_gpt", self.model, chunk.usage)
+    except Exception as e:
+      raise RuntimeError("Something went wrong while streaming from the model with the openai SDK in an instance of ChatGPT") from e
\ No newline at end of file
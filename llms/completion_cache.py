@@ -0,0 +1,78 @@
+from typing import List
+import hashlib
+import sqlite3
+import threading
+import time
+
+# Persistent cache of LLM completions, keyed by a hash of (model, system message, prompt, image digests).
+# Images are reduced to their own SHA-256 first, so the key stays small however large the base64 is.
+# Completions are stored in SQLite together with when they were written and last used: beyond max_entries the
+# least recently used are evicted, and entries older than ttl_seconds are treated as misses
+class CompletionCache:
+  def __init__(self, db_name: str, table_name: str = "completion_cache", max_entries: int = 100_000,
+      ttl_seconds: float | None = None):
+    if not db_name:
+      raise RuntimeError("CompletionCache requires a db_name.")
+    if not table_name:
+      raise RuntimeError("CompletionCache requires a table_name.")
+    if max_entries < 1:
+      raise RuntimeError("CompletionCache requires max_entries of at least 1.")
+
+    self.table_name = table_name
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+
+    self.hits = 0
+    self.misses = 0
+
+    # Ingestion summarizes from worker threads, so the connection is shared behind a lock
+    self.lock = threading.Lock()
+    self.conn = sqlite3.connect(db_name, check_same_thread=False)
+    self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table_name} (key TEXT PRIMARY KEY, completion TEXT, created REAL, last_used REAL)")
+    self.conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table_name}_last_used ON {self.table_name} (last_used)")
+    self.conn.commit()
+    self.size = self.conn.execute(f"SELECT COUNT(*) FROM {self.table_name}").fetchone()[0]
+
+  @staticmethod
+  def key(model: str, prompt: str, system_message: str | None = None, images_base64: List[str] | None = None) -> str:
+    image_digests = [hashlib.sha256(image.encode("utf-8")).hexdigest() for image in images_base64 or []]
+    # The system message is marked as present or not, so None and "" don't share a key
+    system = "\x01" + system_message if system_message is not None else "\x00"
+    parts = [model, system, prompt, *image_digests]
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+  # Returns the cached completion, or None (counting a miss) if there is none that is fresh
+  def get(self, key: str) -> str | None:
+    with self.lock:
+      row = self.conn.execute(f"SELECT completion, created FROM {self.table_name} WHERE key = ?", (key,)).fetchone()
+      now = time.time()
+      if row is not None and (self.ttl_seconds is None or now - row[1] <= self.ttl_seconds):
+        self.conn.execute(f"UPDATE {self.table_name} SET last_used = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+        self.hits += 1
+        return row[0]
+      self.misses += 1
+      return None
+
+  def put(self, key: str, completion: str):
+    with self.lock:
+      now = time.time()
+      exists = self.conn.execute(f"SELECT 1 FROM {self.table_name} WHERE key = ?", (key,)).fetchone() is not None
+      self.conn.execute(
+        f"INSERT OR REPLACE INTO {self.table_name} (key, completion, created, last_used) VALUES (?, ?, ?, ?)",
+        (key, completion, now, now)
+      )
+      if not exists:
+        self.size += 1
+      if self.size > self.max_entries:
+        self.conn.execute(
+          f"DELETE FROM {self.table_name} WHERE key IN (SELECT key FROM {self.table_name} ORDER BY last_used LIMIT ?)",
+          (self.size - self.max_entries,)
+        )
+        self.size = self.max_entries
+      self.conn.commit()
+
+  @property
+  def hit_rate(self) -> float:
+    total = self.hits + self.misses
+    return self.hits / total if total else 0.0
@@ -1,8 +1,96 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Iterator, AsyncIterator, Callable
+import asyncio
+import threading
+import time
+
+# Called with the seconds from the request to the first text delta, or to the end of the completion
+LatencyHook = Callable[[float], None]
+
+_END = object()
 
 class LLM(ABC):
   # Creates completion with optional system messages and images. Throws a runtime error if the completion fails for ANY reason
   @abstractmethod
   def create_completion(self, prompt: str, system_message: str | None = None, images_base64: List[str] | None = None):
-    pass
\ No newline at end of file
+    pass
+
+  # Yields the completion as text deltas as soon as they are generated, so an answer can be shown before its
+  # last token exists. on_first_token and on_complete receive the time to the first delta and to the end of
+  # the completion. Closing the generator early cancels the completion. The default yields the whole
+  # completion as a single delta; LLMs that can stream should override _stream_deltas
+  def stream_completion(self, prompt: str, system_message: str | None = None, images_base64: List[str] | None = None,
+      on_first_token: LatencyHook | None = None, on_complete: LatencyHook | None = None) -> Iterator[str]:
+    start = time.monotonic()
+    first = True
+    deltas = self._stream_deltas(prompt, system_message, images_base64)
+    try:
+      for delta in deltas:
+        if first:
+          first = False
+          if on_first_token is not None:
+            on_first_token(time.monotonic() - start)
+        yield delta
+    finally:
+      deltas.close() # type: ignore
+    if on_complete is not None:
+      on_complete(time.monotonic() - start)
+
+  def _stream_deltas(self, prompt: str, system_message: str | None, images_base64: List[str] | None) -> Iterator[str]:
+    yield self.create_completion(prompt, system_message, images_base64)
+
+  # Async counterpart of stream_completion. The default reads the synchronous stream from a worker thread one
+  # delta at a time, so it still streams; LLMs with a native async client should override _stream_deltas_async
+  async def stream_completion_async(self, prompt: str, system_message: str | None = None, images_base64: List[str] | None = None,
+      on_first_token: LatencyHook | None = None, on_complete: LatencyHook | None = None) -> AsyncIterator[str]:
+    start = time.monotonic()
+    first = True
+    deltas = self._stream_deltas_async(prompt, system_message, images_base64)
+    try:
+      async for delta in deltas:
+        if first:
+          first = False
+          if on_first_token is not None:
+            on_first_token(time.monotonic() - start)
+        yield delta
+    finally:
+      await deltas.aclose()
+    if on_complete is not None:
+      on_complete(time.monotonic() - start)
+
+  async def _stream_deltas_async(self, prompt: str, system_message: str | None, images_base64: List[str] | None) -> AsyncIterator[str]:
+    deltas = self._stream_deltas(prompt, system_message, images_base64)
+
+    # A generator can't be closed while another thread is inside next() on it, and a cancelled to_thread
+    # call keeps running. Whether a read is in progress and whether this generator is closing are only
+    # changed together under state_lock, so exactly one side closes the stream: the closer when no read is
+    # in progress, otherwise the reading thread as soon as its read returns, without making the cancellation
+    # wait for it
+    state_lock = threading.Lock()
+    reading = False
+    closing = False
+
+    def read():
+      nonlocal reading
+      with state_lock:
+        if closing:
+          return _END
+        reading = True
+      try:
+        return next(deltas, _END)
+      finally:
+        with state_lock:
+          reading = False
+          close = closing
+        if close:
+          deltas.close() # type: ignore
+
+    try:
+      while (delta := await asyncio.to_thread(read)) is not _END:
+        yield delta # type: ignore
+    finally:
+      with state_lock:
+        closing = True
+        close = not reading
+      if close:
+        deltas.close() # type: ignore
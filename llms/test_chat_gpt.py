@@ -1,6 +1,10 @@
+import asyncio
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, AsyncMock, patch
+import os
 from llms.chat_gpt import ChatGPT
+from llms.completion_cache import CompletionCache
+from openai_clients.client_pool import close_clients
 
 class TestChatGPT(unittest.TestCase):
     def setUp(self):
@@ -65,6 +69,138 @@ class TestChatGPT(unittest.TestCase):
             self.chat_gpt.create_completion("hello world")
         self.assertIn("Something went wrong", str(cm.exception))
 
+class TestChatGPTCompletionCache(unittest.TestCase):
+    def tearDown(self):
+        if os.path.exists("test_chat_gpt_cache.db"):
+            os.remove("test_chat_gpt_cache.db")
+
+    def test_repeated_completion_is_served_from_cache(self):
+        # Arrange
+        mock_client = MagicMock()
+        mock_client.chat.completions.create.return_value = MagicMock(choices=[MagicMock(message=MagicMock(content="response text"))])
+        chat_gpt = ChatGPT(mock_client, cache=CompletionCache("test_chat_gpt_cache.db"))
+
+        # Act
+        first = chat_gpt.create_completion("hello world", images_base64=["img"])
+        second = chat_gpt.create_completion("hello world", images_base64=["img"])
+        other = chat_gpt.create_completion("hello world", images_base64=["other img"])
+
+        # Assert: Only the new image needed a second call
+        self.assertEqual((first, second, other), ("response text",) * 3)
+        self.assertEqual(mock_client.chat.completions.create.call_count, 2)
+
+def fake_chunk(text):
+    return MagicMock(choices=[MagicMock(delta=MagicMock(content=text))])
+
+class FakeAsyncStream:
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.closed = True
+        return False
+
+    async def __aiter__(self):
+        for piece in self.pieces:
+            yield fake_chunk(piece)
+
+class TestChatGPTStreaming(unittest.TestCase):
+    def setUp(self):
+        self.mock_client = MagicMock()
+        self.stream = MagicMock()
+        self.stream.__enter__.return_value = self.stream
+        self.stream.__iter__.return_value = iter([fake_chunk("Hel"), fake_chunk(None), fake_chunk("lo"), fake_chunk(" world")])
+        self.mock_client.chat.completions.create.return_value = self.stream
+        self.chat_gpt = ChatGPT(self.mock_client)
+
+    def test_stream_completion_yields_deltas_and_reports_latency(self):
+        # Arrange
+        first_token, complete = [], []
+
+        # Act
+        deltas = list(self.chat_gpt.stream_completion("hello", on_first_token=first_token.append, on_complete=complete.append))
+
+        # Assert: Empty deltas are skipped and both hooks fire once
+        self.assertEqual(deltas, ["Hel", "lo", " world"])
+        self.assertEqual(len(first_token), 1)
+        self.assertEqual(len(complete), 1)
+        self.assertLessEqual(first_token[0], complete[0])
+        self.assertTrue(self.mock_client.chat.completions.create.call_args.kwargs["stream"])
+        self.assertEqual(self.mock_client.chat.completions.create.call_args.kwargs["model"], "gpt-4.1")
+
+    def test_closing_the_stream_early_closes_the_response(self):
+        # Arrange
+        complete = []
+        deltas = self.chat_gpt.stream_completion("hello", on_complete=complete.append)
+
+        # Act: Stop reading after the first delta
+        self.assertEqual(next(deltas), "Hel")
+        deltas.close()
+
+        # Assert: The HTTP response was closed and the completion never reported as complete
+        self.stream.__exit__.assert_called_once()
+        self.assertEqual(complete, [])
+
+    def test_stream_completion_raises_runtime_error_on_api_error(self):
+        self.mock_client.chat.completions.create.side_effect = Exception("API error")
+        with self.assertRaises(RuntimeError):
+            list(self.chat_gpt.stream_completion("hello"))
+
+    def test_stream_completion_async_with_async_client(self):
+        # Arrange
+        async_client = MagicMock()
+        stream = FakeAsyncStream(["a", "b", None, "c"])
+        async_client.chat.completions.create = AsyncMock(return_value=stream)
+        chat_gpt = ChatGPT(self.mock_client, async_openai=async_client)
+        first_token = []
+
+        async def collect():
+            return [delta async for delta in chat_gpt.stream_completion_async("hello", on_first_token=first_token.append)]
+
+        # Act & Assert
+        self.assertEqual(asyncio.run(collect()), ["a", "b", "c"])
+        self.assertEqual(len(first_token), 1)
+        self.assertTrue(stream.closed)
+
+    def test_stream_completion_async_without_async_client_streams_from_a_thread(self):
+        async def collect():
+            return [delta async for delta in self.chat_gpt.stream_completion_async("hello")]
+
+        self.assertEqual(asyncio.run(collect()), ["Hel", "lo", " world"])
+
+class TestChatGPTPooledClients(unittest.TestCase):
+    def setUp(self):
+        openai_patcher = patch('openai_clients.client_pool.OpenAI')
+        async_openai_patcher = patch('openai_clients.client_pool.AsyncOpenAI')
+        self.mock_openai = openai_patcher.start()
+        self.mock_async_openai = async_openai_patcher.start()
+        close_clients()
+        self.addCleanup(close_clients)
+        self.addCleanup(openai_patcher.stop)
+        self.addCleanup(async_openai_patcher.stop)
+
+    def test_api_key_uses_the_pooled_clients(self):
+        # Arrange
+        stream = FakeAsyncStream(["a", "b"])
+        self.mock_async_openai.return_value.chat.completions.create = AsyncMock(return_value=stream)
+        chat_gpt = ChatGPT(openai_api_key="key")
+
+        async def collect():
+            return [delta async for delta in chat_gpt.stream_completion_async("hello")]
+
+        # Act & Assert: The sync client comes from get_client, the async one from the running loop's pool
+        self.assertIs(chat_gpt.client, self.mock_openai.return_value)
+        self.assertEqual(asyncio.run(collect()), ["a", "b"])
+        self.mock_async_openai.assert_called_once()
+
+    def test_missing_client_and_api_key_raises_error(self):
+        with self.assertRaises(RuntimeError):
+            ChatGPT()
+
 # Edge cases to consider (do not write yet):
 # - Response.choices is empty
 # - Response.choices[0].message.content is None
@@ -0,0 +1,68 @@
+import os
+import time
+import unittest
+from llms.completion_cache import CompletionCache
+
+SQLITE_DB_NAME = 'test_completion_cache.db'
+
+class TestCompletionCache(unittest.TestCase):
+  def tearDown(self):
+    if os.path.exists(SQLITE_DB_NAME):
+      os.remove(SQLITE_DB_NAME)
+
+  def test_put_and_get(self):
+    # Arrange
+    cache = CompletionCache(SQLITE_DB_NAME)
+    key = cache.key("gpt-4.1", "prompt", "system", ["imageA"])
+
+    # Act
+    missed = cache.get(key)
+    cache.put(key, "completion")
+    hit = cache.get(key)
+
+    # Assert
+    self.assertIsNone(missed)
+    self.assertEqual(hit, "completion")
+    self.assertEqual((cache.hits, cache.misses), (1, 1))
+    self.assertEqual(cache.hit_rate, 0.5)
+
+  def test_key_covers_model_system_message_prompt_and_images(self):
+    key = CompletionCache.key("gpt-4.1", "prompt", None, ["imageA"])
+    self.assertEqual(key, CompletionCache.key("gpt-4.1", "prompt", None, ["imageA"]))
+    self.assertNotEqual(key, CompletionCache.key("gpt-4o", "prompt", None, ["imageA"]))
+    self.assertNotEqual(key, CompletionCache.key("gpt-4.1", "prompt", "", ["imageA"]))
+    self.assertNotEqual(key, CompletionCache.key("gpt-4.1", "other", None, ["imageA"]))
+    self.assertNotEqual(key, CompletionCache.key("gpt-4.1", "prompt", None, ["imageB"]))
+    self.assertNotEqual(key, CompletionCache.key("gpt-4.1", "prompt", None, ["imageA", "imageA"]))
+
+  def test_persists_across_instances(self):
+    CompletionCache(SQLITE_DB_NAME).put("k", "completion")
+    self.assertEqual(CompletionCache(SQLITE_DB_NAME).get("k"), "completion")
+
+  def test_least_recently_used_entries_are_evicted(self):
+    # Arrange
+    cache = CompletionCache(SQLITE_DB_NAME, max_entries=2)
+    cache.put("a", "A")
+    time.sleep(0.01)
+    cache.put("b", "B")
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+
+    # Act
+    cache.put("c", "C")
+
+    # Assert: "b" was the least recently used
+    self.assertIsNone(cache.get("b"))
+    self.assertEqual(cache.get("a"), "A")
+    self.assertEqual(cache.get("c"), "C")
+    self.assertEqual(cache.size, 2)
+
+  def test_expired_entries_are_misses(self):
+    cache = CompletionCache(SQLITE_DB_NAME, ttl_seconds=0.05)
+    cache.put("k", "completion")
+    time.sleep(0.1)
+    self.assertIsNone(cache.get("k"))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,72 @@
+import asyncio
+import contextlib
+import threading
+import time
+import unittest
+from typing import List, Iterator
+from llms.llm import LLM
+
+# LLM without async support that streams "first" at once and "second" only after a slow read
+class SlowStreamingLLM(LLM):
+  def __init__(self, delay: float):
+    self.delay = delay
+    self.closed = threading.Event()
+
+  def create_completion(self, prompt: str, system_message: str | None = None, images_base64: List[str] | None = None):
+    return "first second"
+
+  def _stream_deltas(self, prompt: str, system_message: str | None, images_base64: List[str] | None) -> Iterator[str]:
+    try:
+      yield "first"
+      time.sleep(self.delay)
+      yield "second"
+    finally:
+      self.closed.set()
+
+class TestLLMStreaming(unittest.TestCase):
+
+  def test_cancelling_mid_read_closes_the_stream_once_the_read_returns(self):
+    # Arrange: The second read takes 0.5s, far past the 0.2s timeout
+    llm = SlowStreamingLLM(delay=0.5)
+    received = []
+
+    async def consume():
+      async for delta in llm.stream_completion_async("q"):
+        received.append(delta)
+
+    async def cancel_mid_read():
+      start = time.monotonic()
+      with self.assertRaises(asyncio.TimeoutError):
+        await asyncio.wait_for(consume(), 0.2)
+      return time.monotonic() - start
+
+    # Act
+    elapsed = asyncio.run(cancel_mid_read())
+
+    # Assert: The cancellation doesn't wait for the read, and the stream is closed (rather than failing with
+    # "generator already executing") as soon as the read returns
+    self.assertLess(elapsed, 0.4)
+    self.assertEqual(received, ["first"])
+    self.assertTrue(llm.closed.wait(1.0))
+
+  def test_stream_is_closed_however_the_cancellation_lines_up_with_a_read(self):
+    # Cancel at many different points around the second read finishing; every stream must still be closed
+    async def cancel_after_first_delta(llm: SlowStreamingLLM, delay: float):
+      first = asyncio.Event()
+      async def consume():
+        async for _ in llm.stream_completion_async("q"):
+          first.set()
+      task = asyncio.create_task(consume())
+      await first.wait()
+      await asyncio.sleep(delay)
+      task.cancel()
+      with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+    for attempt in range(50):
+      llm = SlowStreamingLLM(delay=0.002)
+      asyncio.run(cancel_after_first_delta(llm, 0.0001 * attempt))
+      self.assertTrue(llm.closed.wait(1.0))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,18 +1,50 @@
 import json
+import math
+import multiprocessing
+import multiprocessing.connection
 import pickle
-from typing import List, Set
+import queue
+import threading
+import time
+from collections import deque
+from typing import List, Set, Dict, Tuple, Iterator
 from unstructured.documents.elements import Element
 from unstructured.partition.auto import partition
 from unstructured.chunking.title import chunk_by_title
 from pathlib import Path
-from openai import OpenAI
 from loader_chunkers.loader_chunker import LoaderChunker
+from llms.completion_cache import CompletionCache
+from openai_clients.client_pool import get_client
+from openai_clients.rate_limiter import get_rate_limiter, estimate_tokens, BATCH
+from openai_clients.retry_policy import RetryPolicy, DEFAULT_RETRY_POLICY
 from rag_types.chunk import Chunk, Content
+from rag_types.vector import Metadata
+
+# Longest the thread driving the worker processes waits before checking whether load_and_chunk has stopped
+DRIVER_POLL_SECONDS = 0.5
+
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".png", ".jpg", ".jpeg", ".txt", ".md"}
 
 class MultiModalLoaderChunker(LoaderChunker):
 
-  def __init__(self, openai_api_key):
-    self.client = OpenAI(api_key=openai_api_key)
+  # Summaries are ingestion work, so they wait for the shared rate limiter as BATCH calls and never hold up
+  # query-time rewrites. With a cache, re-ingesting unchanged content makes no vision-model calls.
+  # With workers > 1, files are partitioned and chunked in that many processes, and a file taking longer
+  # than file_timeout_seconds is abandoned. Timeouts need workers > 1, since a file being processed in this
+  # process can't be interrupted
+  def __init__(self, openai_api_key, model: str = "gpt-4.1", priority: int = BATCH, retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY,
+      cache: CompletionCache | None = None, workers: int = 1, file_timeout_seconds: float | None = None):
+    self.client = get_client(openai_api_key)
+    self.cache = cache
+    self.model = model
+    self.rate_limiter = get_rate_limiter(model)
+    self.priority = priority
+    self.retry_policy = retry_policy
+    self.workers = workers
+    self.file_timeout_seconds = file_timeout_seconds
+
+    # Name and reason of every file the last load_and_chunk call had to skip
+    self.failed_files: Dict[str, str] = {}
 
   # Generates an AI summary of a chunk containing images and tables that it can be searched by
   # (we will still return the original images, tables, and text: the summary is only used for
@@ -68,25 +100,41 @@ class MultiModalLoaderChunker(LoaderChunker):
       "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}
         })
     
-    # Send to AI and get response
-    response = self.client.chat.completions.create(
-        model="gpt-4.1",
+    # Identical content (e.g. an unchanged document being re-ingested) gets the summary it got before
+    key = None
+    if self.cache is not None:
+      key = self.cache.key(self.model, prompt_text, None, images)
+      cached = self.cache.get(key)
+      if cached is not None:
+        return cached
+
+    # Send to AI and get response. Images are budgeted at roughly 1000 tokens each
+    response = self.retry_policy.call(
+      lambda: self.client.chat.completions.create(
+        model=self.model,
         messages=[
             {"role": "user", "content": message_content}
         ]
-    )
-    
-    return response.choices[0].message.content
+      ),
+      self.rate_limiter, estimate_tokens(prompt_text) + 1000 * len(images), self.priority,
+      component="multimodal_loader_chunker", model=self.model)
+
+    summary = response.choices[0].message.content
+    if self.cache is not None and key is not None and summary is not None:
+      self.cache.put(key, summary)
+    return summary
 
   @property
   def supported_extensions(self) -> Set[str]:
-    return {".pdf", ".docx", ".png", ".jpg", ".jpeg", ".txt", ".md", ".pdf"}
+    return SUPPORTED_EXTENSIONS
   
-  # Loads files using unstructured, injecting kwargs based on the file type
-  def load(self, file: Path) -> List[Element]:
+  # Loads files using unstructured, injecting kwargs based on the file type. Static so that worker
+  # processes can call it without the OpenAI client
+  @staticmethod
+  def load(file: Path) -> List[Element]:
     suffix = file.suffix.lower()
 
-    if suffix not in self.supported_extensions:
+    if suffix not in SUPPORTED_EXTENSIONS:
       raise RuntimeError("Filetype: " + suffix + " is not supported by MultiModalLoaderChunker")
 
     kwargs = {"filename": str(file)}
@@ -116,7 +164,8 @@ class MultiModalLoaderChunker(LoaderChunker):
     return partition(**kwargs)
     
   # Extracts images and tables from CompositeElement chunks into custom dict
-  def extract_chunk_contents(self, composite_elements: List[Element]) -> List[Content]: 
+  @staticmethod
+  def extract_chunk_contents(composite_elements: List[Element]) -> List[Content]: 
     chunk_contents = []
 
     # Separate each element chunk into its content types
@@ -156,7 +205,8 @@ class MultiModalLoaderChunker(LoaderChunker):
 
     return chunk_contents
     
-  def create_chunks(self, chunk_contents: List[Content]) -> List[Chunk]:
+  # The optional metadata describes the file the contents came from and is attached to every chunk
+  def create_chunks(self, chunk_contents: List[Content], metadata: Metadata | None = None) -> List[Chunk]:
     chunks = []
 
     for i, content in enumerate(chunk_contents):
@@ -171,6 +221,8 @@ class MultiModalLoaderChunker(LoaderChunker):
 
       # Construct the lchunk object
       chunk: Chunk = {"search_text": search_text, "content": content}
+      if metadata is not None:
+        chunk["metadata"] = dict(metadata)
       chunks.append(chunk)
 
     return chunks
@@ -190,37 +242,200 @@ class MultiModalLoaderChunker(LoaderChunker):
         else:
           print("  skipped file " + entry.name + " because its filetype is not supported by MultiModalLoaderChunker")
     
+    # Files are processed, and their chunks returned, in name order whatever order they finish in
+    files.sort(key=lambda file: file.name)
+    self.failed_files = {}
+
     print("PROCESSING FILES")
-    for file in files:
-
-      # Load file with unstructured unless it is already cached
-      print(f"  LOADING {file.name}")
-      cache_file = file.parent / f"{file.stem}_elements.pkl"
-      
-      if cache_file.exists():
-        print(f"  -Loading cached elements for {file.name}")
-        with open(cache_file, 'rb') as f:
-          elements = pickle.load(f)
-      else:
-        print(f"  -Processing {file.name} elements (first time)")
-        elements = self.load(file)
-        
-        with open(cache_file, 'wb') as f:
-          pickle.dump(elements, f)
-      
-      # Use unstructured to create chunks from elements
-      print(f"  CHUNKING {file.name}")
-      composite_elements = chunk_by_title(elements, max_characters=2000, new_after_n_chars=1600, combine_text_under_n_chars=500)
-      print(f"  -Combined {len(elements)} elements into {len(composite_elements)} elementChunks")
-
-      # Extract text, images, and tables from unstructured elementChunks
-      print(f"  EXTRACTING tables, images, text from {file.name}'s elementChunks")
-      chunk_contents = self.extract_chunk_contents(composite_elements)
-
-      # Convert multimodal chunks to Chunks for storage
-      print(f"  CREATING chunk objects for {file.name}")
-      chunks = self.create_chunks(chunk_contents)
-      all_chunks += chunks
+    finished: Dict[int, List[Content] | None] = {}
+    next_file = 0
+    for i, chunk_contents in self._partition_files(files):
+      finished[i] = chunk_contents
+
+      # Summarize every file whose predecessors are all done, overlapping the summaries with partitioning
+      while next_file in finished:
+        chunk_contents = finished.pop(next_file)
+        if chunk_contents is not None:
+          # Convert multimodal chunks to Chunks for storage
+          file = files[next_file]
+          print(f"  CREATING chunk objects for {file.name}")
+          all_chunks += self.create_chunks(chunk_contents, {"source": file.name, "file_type": file.suffix.lower().lstrip(".")})
+        next_file += 1
+
+    if self.failed_files:
+      print(f"  SKIPPED {len(self.failed_files)} files that failed: {self.failed_files}")
 
     # Return all chunks
-    return all_chunks
\ No newline at end of file
+    return all_chunks
+
+  def _fail(self, file: Path, reason: str):
+    print(f"  FAILED {file.name}: {reason}")
+    self.failed_files[file.name] = reason
+
+  # Yields (index of the file, its chunk contents, or None if it failed) as files finish
+  def _partition_files(self, files: List[Path]) -> Iterator[Tuple[int, List[Content] | None]]:
+    if self.workers > 1 and len(files) > 1:
+      yield from self._partition_files_in_pool(files)
+      return
+
+    for i, file in enumerate(files):
+      try:
+        yield i, partition_and_chunk(file)
+      except Exception as e:
+        self._fail(file, repr(e))
+        yield i, None
+
+  # Runs partition_and_chunk in worker processes, yielding results as files finish. The processes are driven
+  # from a thread of their own, so the next file starts as soon as a worker frees up, also while the caller is
+  # still summarizing earlier files; results wait in a queue until the caller asks for them
+  def _partition_files_in_pool(self, files: List[Path]) -> Iterator[Tuple[int, List[Content] | None]]:
+    # The driver puts ("done", index, chunk contents), ("failed", index, reason) or ("error", exception) here
+    events: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    driver = threading.Thread(target=self._drive_workers, args=(files, events, stop), daemon=True)
+    driver.start()
+
+    try:
+      for _ in range(len(files)):
+        event = events.get()
+        if event[0] == "error":
+          raise event[1]
+        if event[0] == "failed":
+          self._fail(files[event[1]], event[2])
+          yield event[1], None
+        else:
+          yield event[1], event[2]
+    finally:
+      # Also reached when the caller stops early, in which case the driver terminates what is still running
+      stop.set()
+      driver.join()
+
+  # Keeps workers long-lived worker processes busy, handing each the next file as soon as it is free. A file
+  # that times out or crashes its process only costs that one worker, which is terminated and replaced; the
+  # files running on the other workers carry on undisturbed
+  def _drive_workers(self, files: List[Path], events: queue.Queue, stop: threading.Event):
+    pending = deque(range(len(files)))
+    workers = [_Worker() for _ in range(min(self.workers, len(files)))]
+
+    try:
+      while (pending or any(worker.file is not None for worker in workers)) and not stop.is_set():
+        for index, worker in enumerate(workers):
+          if worker.file is None and pending:
+            i = pending.popleft()
+            deadline = time.monotonic() + self.file_timeout_seconds if self.file_timeout_seconds is not None else math.inf
+            try:
+              worker.assign(i, files[i], deadline)
+            except OSError:
+              # The worker died while idle; it is replaced, and picks up the next file on the next pass
+              worker.stop()
+              workers[index] = _Worker()
+              events.put(("failed", i, "crashed its worker process"))
+        busy = [worker for worker in workers if worker.file is not None]
+        if not busy:
+          continue
+
+        # Wake up for a result, a worker dying, the nearest deadline, and regularly enough to notice that the
+        # caller has stopped
+        nearest = min(worker.deadline for worker in busy)
+        timeout = min(DRIVER_POLL_SECONDS, max(0.0, nearest - time.monotonic()))
+        multiprocessing.connection.wait([worker.connection for worker in busy] + [worker.process.sentinel for worker in busy], timeout)
+
+        now = time.monotonic()
+        for index, worker in enumerate(workers):
+          i = worker.file
+          if i is None:
+            continue
+          reason = None
+          if worker.connection.poll():
+            try:
+              status, payload = worker.connection.recv()
+              worker.file = None
+              events.put((status, i, payload))
+            except EOFError:
+              reason = "crashed its worker process"
+          elif not worker.process.is_alive():
+            reason = "crashed its worker process"
+          elif worker.deadline <= now:
+            reason = f"timed out after {self.file_timeout_seconds} seconds"
+
+          if reason is not None:
+            worker.stop()
+            workers[index] = _Worker()
+            events.put(("failed", i, reason))
+    except Exception as e:
+      events.put(("error", e))
+    finally:
+      for worker in workers:
+        worker.stop()
+
+# Loads, chunks and extracts the contents of one file. Module level so that worker processes can run it; the
+# partitioned elements are cached next to the file, so a file is only ever partitioned once
+def partition_and_chunk(file: Path) -> List[Content]:
+  # Load file with unstructured unless it is already cached
+  print(f"  LOADING {file.name}")
+  cache_file = file.parent / f"{file.stem}_elements.pkl"
+  
+  if cache_file.exists():
+    print(f"  -Loading cached elements for {file.name}")
+    with open(cache_file, 'rb') as f:
+      elements = pickle.load(f)
+  else:
+    print(f"  -Processing {file.name} elements (first time)")
+    elements = MultiModalLoaderChunker.load(file)
+    
+    with open(cache_file, 'wb') as f:
+      pickle.dump(elements, f)
+  
+  # Use unstructured to create chunks from elements
+  print(f"  CHUNKING {file.name}")
+  composite_elements = chunk_by_title(elements, max_characters=2000, new_after_n_chars=1600, combine_text_under_n_chars=500)
+  print(f"  -Combined {len(elements)} elements into {len(composite_elements)} elementChunks")
+
+  # Extract text, images, and tables from unstructured elementChunks
+  print(f"  EXTRACTING tables, images, text from {file.name}'s elementChunks")
+  return MultiModalLoaderChunker.extract_chunk_contents(composite_elements)
+
+# Runs in a worker process: partitions the files sent over connection one at a time and sends back
+# ("done", chunk contents) or ("failed", reason) for each, until it is sent None
+def _worker_loop(connection: multiprocessing.connection.Connection):
+  while (file := connection.recv()) is not None:
+    try:
+      result = ("done", partition_and_chunk(file))
+    except Exception as e:
+      result = ("failed", repr(e))
+    try:
+      connection.send(result)
+    except Exception as e:
+      # Contents that can't be pickled fail the file rather than the worker
+      connection.send(("failed", repr(e)))
+
+# A worker process with a pipe of its own, so that terminating it never leaves a shared queue half written.
+# file is the index of the file it is processing (None when idle) and deadline when that file times out
+class _Worker:
+  def __init__(self):
+    self.connection, child_connection = multiprocessing.Pipe()
+    self.process = multiprocessing.Process(target=_worker_loop, args=(child_connection,))
+    self.process.start()
+
+    # Only the worker keeps its end open, so the pipe reads as closed once the worker dies
+    child_connection.close()
+    self.file: int | None = None
+    self.deadline = math.inf
+
+  def assign(self, i: int, file: Path, deadline: float):
+    self.connection.send(file)
+    self.file = i
+    self.deadline = deadline
+
+  # An idle worker is asked to exit, a busy one (whose file can't be interrupted) is terminated
+  def stop(self):
+    if self.process.is_alive():
+      if self.file is None:
+        try:
+          self.connection.send(None)
+        except OSError:
+          self.process.terminate()
+      else:
+        self.process.terminate()
+    self.process.join()
+    self.connection.close()
\ No newline at end of file
@@ -5,6 +5,7 @@ from unittest.mock import Mock, patch, MagicMock
 from loader_chunkers.multimodal_loader_chunker import MultiModalLoaderChunker
 from rag_types.chunk import Content
 from pathlib import Path
+import tempfile
 
 dotenv.load_dotenv()
 
@@ -225,5 +226,30 @@ class TestMultiModalLoaderChunker(unittest.TestCase):
     self.assertEqual(result[0]['search_text'], 'Text 1')
     self.assertEqual(result[1]['search_text'], 'Text 2')
 
+class TestMultiModalLoaderChunkerWorkers(unittest.TestCase):
+  def setUp(self):
+    # Plain text files (no tables or images, so no summaries) plus one that can't be partitioned
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+    for name in ["c.txt", "a.txt", "b.txt"]:
+      (Path(self.directory.name) / name).write_text(f"Contents of {name}")
+    (Path(self.directory.name) / "broken.pdf").write_bytes(b"not a pdf")
+
+  def test_files_are_chunked_in_name_order_with_failures_isolated(self):
+    for workers in [1, 3]:
+      with self.subTest(workers=workers):
+        # Arrange
+        for cached in Path(self.directory.name).glob("*.pkl"):
+          cached.unlink()
+        chunker = MultiModalLoaderChunker("key", workers=workers, file_timeout_seconds=120)
+
+        # Act
+        chunks = chunker.load_and_chunk(self.directory.name)
+
+        # Assert
+        self.assertEqual([chunk['search_text'] for chunk in chunks], ["Contents of a.txt", "Contents of b.txt", "Contents of c.txt"])
+        self.assertEqual(chunks[0]['metadata'], {"source": "a.txt", "file_type": "txt"})
+        self.assertEqual(list(chunker.failed_files), ["broken.pdf"])
+
 if __name__ == "__main__":
   unittest.main()
\ No newline at end of file
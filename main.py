@@ -3,8 +3,10 @@ from chunk_storages.sqlite_chunk_storage import SQLiteChunkStorage
 from embedders.openai_embedder import OpenAIEmbedder
 from vector_stores.pinecone_vector_store import PineconeVectorStore
 from query_rewriters.multi_query_rewriter import MultiQueryRewriter
+from retrievers.semantic_retriever import SemanticRetriever
 
 from ingestion_pipeline import IngestionPipeline
+from query_pipeline import QueryPipeline
 
 import dotenv
 import os
@@ -32,5 +34,9 @@ index_name = os.environ['INDEX_NAME']
 
 # ingestionPipeline.ingest("./documents")
 
-rewriter = MultiQueryRewriter(openai_api_key, n=3)
-print(rewriter.rewrite_query("What's the deadliest heart condition?"))
\ No newline at end of file
+queryPipeline = QueryPipeline(
+  MultiQueryRewriter(openai_api_key, n=3),
+  SemanticRetriever(PineconeVectorStore(pinecone_api_key, index_name, dimension), OpenAIEmbedder(openai_api_key, dimension)),
+  SQLiteChunkStorage(db_name, table_name)
+)
+print(queryPipeline.query("What's the deadliest heart condition?"))
\ No newline at end of file
@@ -0,0 +1,55 @@
+from typing import Any, Dict, Tuple
+from metrics.registry import get_registry
+
+# Estimated USD per million (input, output) tokens. Models that are missing here are still measured, just
+# not costed
+PRICES_PER_MILLION_TOKENS: Dict[str, Tuple[float, float]] = {
+  "gpt-4.1": (2.00, 8.00),
+  "gpt-4.1-mini": (0.40, 1.60),
+  "gpt-4.1-nano": (0.10, 0.40),
+  "gpt-4o": (2.50, 10.00),
+  "gpt-4o-mini": (0.15, 0.60),
+  "text-embedding-3-large": (0.13, 0.0),
+  "text-embedding-3-small": (0.02, 0.0),
+}
+
+# Per-call measurements of every OpenAI-backed component, tagged by component and model:
+# - openai_request_duration_seconds: latency of each attempt (for streams, until the stream opened)
+# - openai_tokens_total: prompt, completion and embedding tokens, from the API's usage fields
+# - openai_cost_usd_total: cost estimated from those tokens
+# - openai_retries_total and openai_errors_total: retried attempts, and failed attempts by error type
+
+def record_request(component: str, model: str, seconds: float, error: Exception | None = None):
+  registry = get_registry()
+  outcome = "success" if error is None else "error"
+  registry.histogram("openai_request_duration_seconds", "Latency of OpenAI requests").observe(
+    seconds, component=component, model=model, outcome=outcome)
+  if error is not None:
+    registry.counter("openai_errors_total", "Failed OpenAI requests").inc(
+      component=component, model=model, error=type(error).__name__)
+
+def record_retry(component: str, model: str):
+  get_registry().counter("openai_retries_total", "Retried OpenAI requests").inc(component=component, model=model)
+
+# Records the usage of a response (or of the final chunk of a stream). Embedding responses report no
+# completion tokens, so their prompt tokens are counted as embedding tokens
+def record_usage(component: str, model: str, usage: Any):
+  prompt_tokens = getattr(usage, "prompt_tokens", None)
+  completion_tokens = getattr(usage, "completion_tokens", None)
+  if not isinstance(prompt_tokens, int):
+    return
+  if not isinstance(completion_tokens, int):
+    completion_tokens = None
+
+  tokens = get_registry().counter("openai_tokens_total", "Tokens used by OpenAI requests")
+  if completion_tokens is None:
+    tokens.inc(prompt_tokens, component=component, model=model, kind="embedding")
+  else:
+    tokens.inc(prompt_tokens, component=component, model=model, kind="prompt")
+    tokens.inc(completion_tokens, component=component, model=model, kind="completion")
+
+  if model in PRICES_PER_MILLION_TOKENS:
+    input_price, output_price = PRICES_PER_MILLION_TOKENS[model]
+    cost = (prompt_tokens * input_price + (completion_tokens or 0) * output_price) / 1_000_000
+    get_registry().counter("openai_cost_usd_total", "Estimated cost of OpenAI requests in USD").inc(
+      cost, component=component, model=model)
@@ -0,0 +1,168 @@
+from typing import Dict, List, Tuple, Iterable
+from collections import deque
+import json
+import math
+import threading
+import numpy as np
+
+# Label values of one series, as sorted (name, value) pairs so equal label sets share a series
+Labels = Tuple[Tuple[str, str], ...]
+
+# Upper bounds (seconds) of the latency histogram buckets, from fast cache-like calls to slow completions
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# How many recent observations each histogram series keeps for exact percentiles
+PERCENTILE_WINDOW = 10_000
+
+def _labels(labels: Dict[str, str]) -> Labels:
+  return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+# Label values escape backslashes, double quotes and newlines, as the Prometheus text format requires
+def _escape(value: str) -> str:
+  return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+  pairs = [f'{name}="{_escape(value)}"' for name, value in labels]
+  return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+  if math.isinf(value):
+    return "+Inf" if value > 0 else "-Inf"
+  return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+# Monotonically increasing total per label set (calls, tokens, dollars)
+class Counter:
+  def __init__(self, name: str, help: str):
+    self.name = name
+    self.help = help
+    self.values: Dict[Labels, float] = {}
+    self.lock = threading.Lock()
+
+  def inc(self, amount: float = 1.0, **labels: str):
+    key = _labels(labels)
+    with self.lock:
+      self.values[key] = self.values.get(key, 0.0) + amount
+
+  def value(self, **labels: str) -> float:
+    with self.lock:
+      return self.values.get(_labels(labels), 0.0)
+
+  def to_prometheus(self) -> List[str]:
+    lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+    with self.lock:
+      for labels, value in sorted(self.values.items()):
+        lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+    return lines
+
+  def to_dict(self) -> List[dict]:
+    with self.lock:
+      return [{"labels": dict(labels), "value": value} for labels, value in sorted(self.values.items())]
+
+class _HistogramSeries:
+  def __init__(self, buckets: int):
+    self.bucket_counts = np.zeros(buckets + 1, dtype=np.int64)
+    self.count = 0
+    self.sum = 0.0
+    self.recent: deque[float] = deque(maxlen=PERCENTILE_WINDOW)
+
+# Distribution of observations per label set. Cumulative buckets are exported for Prometheus, and the most
+# recent observations are kept for exact p50/p95/p99 in the JSON dump
+class Histogram:
+  def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+    self.name = name
+    self.help = help
+    self.buckets = np.asarray(sorted(buckets), dtype=np.float64)
+    self.series: Dict[Labels, _HistogramSeries] = {}
+    self.lock = threading.Lock()
+
+  def observe(self, value: float, **labels: str):
+    key = _labels(labels)
+    with self.lock:
+      series = self.series.get(key)
+      if series is None:
+        series = self.series[key] = _HistogramSeries(len(self.buckets))
+      series.bucket_counts[np.searchsorted(self.buckets, value, side="left")] += 1
+      series.count += 1
+      series.sum += value
+      series.recent.append(value)
+
+  # The given percentile (0-100) of the recent observations, or None if there are none
+  def percentile(self, percentile: float, **labels: str) -> float | None:
+    with self.lock:
+      series = self.series.get(_labels(labels))
+      if series is None or not series.recent:
+        return None
+      return float(np.percentile(np.fromiter(series.recent, dtype=np.float64, count=len(series.recent)), percentile))
+
+  def to_prometheus(self) -> List[str]:
+    lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+    with self.lock:
+      for labels, series in sorted(self.series.items()):
+        cumulative = np.cumsum(series.bucket_counts)
+        for bound, count in zip([*self.buckets, math.inf], cumulative):
+          lines.append(f"{self.name}_bucket{_format_labels([*labels, ('le', _format_value(bound))])} {int(count)}")
+        lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series.sum)}")
+        lines.append(f"{self.name}_count{_format_labels(labels)} {series.count}")
+    return lines
+
+  def to_dict(self) -> List[dict]:
+    with self.lock:
+      dumped = []
+      for labels, series in sorted(self.series.items()):
+        recent = np.fromiter(series.recent, dtype=np.float64, count=len(series.recent))
+        p50, p95, p99 = np.percentile(recent, [50, 95, 99]) if len(recent) else (None, None, None)
+        dumped.append({
+          "labels": dict(labels),
+          "count": series.count,
+          "sum": series.sum,
+          "p50": None if p50 is None else float(p50),
+          "p95": None if p95 is None else float(p95),
+          "p99": None if p99 is None else float(p99),
+          "buckets": {_format_value(bound): int(count) for bound, count in zip([*self.buckets, math.inf], np.cumsum(series.bucket_counts))}
+        })
+      return dumped
+
+# Named counters and histograms, created on first use and exported together
+class MetricsRegistry:
+  def __init__(self):
+    self.metrics: Dict[str, Counter | Histogram] = {}
+    self.lock = threading.Lock()
+
+  def counter(self, name: str, help: str) -> Counter:
+    with self.lock:
+      metric = self.metrics.setdefault(name, Counter(name, help))
+    if not isinstance(metric, Counter):
+      raise RuntimeError(f"Metric {name} is already registered as a {type(metric).__name__}")
+    return metric
+
+  def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+    with self.lock:
+      metric = self.metrics.setdefault(name, Histogram(name, help, buckets))
+    if not isinstance(metric, Histogram):
+      raise RuntimeError(f"Metric {name} is already registered as a {type(metric).__name__}")
+    return metric
+
+  # Prometheus text exposition format (version 0.0.4)
+  def to_prometheus(self) -> str:
+    with self.lock:
+      metrics = sorted(self.metrics.items())
+    return "\n".join(line for _, metric in metrics for line in metric.to_prometheus()) + "\n"
+
+  def to_dict(self) -> dict:
+    with self.lock:
+      metrics = sorted(self.metrics.items())
+    return {name: {"type": type(metric).__name__.lower(), "help": metric.help, "series": metric.to_dict()} for name, metric in metrics}
+
+  def to_json(self, indent: int | None = 2) -> str:
+    return json.dumps(self.to_dict(), indent=indent)
+
+  # Drops every series, e.g. between benchmark runs
+  def reset(self):
+    with self.lock:
+      self.metrics.clear()
+
+_registry = MetricsRegistry()
+
+# Returns the process-wide registry that the model calls are recorded in
+def get_registry() -> MetricsRegistry:
+  return _registry
@@ -0,0 +1,50 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from openai import RateLimitError
+from metrics.registry import get_registry
+from metrics.model_calls import record_usage
+from openai_clients.retry_policy import RetryPolicy
+
+def make_error(error_type):
+  return error_type.__new__(error_type)
+
+class TestModelCallMetrics(unittest.TestCase):
+  def setUp(self):
+    get_registry().reset()
+    self.addCleanup(get_registry().reset)
+    sleep_patcher = patch('openai_clients.retry_policy.time.sleep')
+    sleep_patcher.start()
+    self.addCleanup(sleep_patcher.stop)
+
+  def test_retry_policy_records_latency_usage_cost_retries_and_errors(self):
+    # Arrange: One rate limited attempt, then a completion that used 1000 prompt and 500 completion tokens
+    response = MagicMock(usage=MagicMock(prompt_tokens=1000, completion_tokens=500))
+    request = MagicMock(side_effect=[make_error(RateLimitError), response])
+
+    # Act
+    RetryPolicy().call(request, component="chat_gpt", model="gpt-4.1")
+
+    # Assert
+    registry = get_registry()
+    tokens = registry.counter("openai_tokens_total", "")
+    self.assertEqual(tokens.value(component="chat_gpt", model="gpt-4.1", kind="prompt"), 1000)
+    self.assertEqual(tokens.value(component="chat_gpt", model="gpt-4.1", kind="completion"), 500)
+    self.assertAlmostEqual(registry.counter("openai_cost_usd_total", "").value(component="chat_gpt", model="gpt-4.1"), 0.006)
+    self.assertEqual(registry.counter("openai_retries_total", "").value(component="chat_gpt", model="gpt-4.1"), 1)
+    self.assertEqual(registry.counter("openai_errors_total", "").value(component="chat_gpt", model="gpt-4.1", error="RateLimitError"), 1)
+
+    latency = registry.histogram("openai_request_duration_seconds", "")
+    self.assertIsNotNone(latency.percentile(50, component="chat_gpt", model="gpt-4.1", outcome="success"))
+    self.assertIn('openai_retries_total{component="chat_gpt",model="gpt-4.1"} 1', registry.to_prometheus())
+
+  def test_embedding_usage_is_counted_as_embedding_tokens(self):
+    record_usage("openai_embedder", "text-embedding-3-large", MagicMock(prompt_tokens=2000, completion_tokens=None))
+    tokens = get_registry().counter("openai_tokens_total", "")
+    self.assertEqual(tokens.value(component="openai_embedder", model="text-embedding-3-large", kind="embedding"), 2000)
+
+  def test_calls_without_a_component_are_not_recorded(self):
+    RetryPolicy().call(lambda: MagicMock(usage=MagicMock(prompt_tokens=1, completion_tokens=1)))
+    self.assertEqual(get_registry().to_dict(), {})
+
+if __name__ == "__main__":
+  unittest.main()
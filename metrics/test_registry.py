@@ -0,0 +1,68 @@
+import json
+import unittest
+from metrics.registry import MetricsRegistry
+
+class TestMetricsRegistry(unittest.TestCase):
+  def test_counter_prometheus_export(self):
+    # Arrange
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls")
+
+    # Act
+    calls.inc(component="a")
+    calls.inc(2, component="a")
+    calls.inc(component='quote"d')
+
+    # Assert
+    self.assertEqual(calls.value(component="a"), 3)
+    self.assertEqual(registry.to_prometheus(), "\n".join([
+      "# HELP calls_total Calls",
+      "# TYPE calls_total counter",
+      'calls_total{component="a"} 3',
+      'calls_total{component="quote\\"d"} 1',
+    ]) + "\n")
+
+  def test_histogram_buckets_are_cumulative_and_inclusive(self):
+    # Arrange
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+
+    # Act
+    for seconds in [0.05, 0.1, 0.5, 2.0]:
+      latency.observe(seconds, model="m")
+
+    # Assert
+    lines = registry.to_prometheus().splitlines()
+    self.assertIn('latency_seconds_bucket{model="m",le="0.1"} 2', lines)
+    self.assertIn('latency_seconds_bucket{model="m",le="1"} 3', lines)
+    self.assertIn('latency_seconds_bucket{model="m",le="+Inf"} 4', lines)
+    self.assertIn('latency_seconds_count{model="m"} 4', lines)
+    self.assertIn('latency_seconds_sum{model="m"} 2.65', lines)
+
+  def test_json_dump_has_percentiles(self):
+    # Arrange
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency")
+    for i in range(1, 101):
+      latency.observe(i / 100, model="m")
+
+    # Act
+    dumped = json.loads(registry.to_json())
+
+    # Assert
+    series = dumped["latency_seconds"]["series"][0]
+    self.assertEqual(dumped["latency_seconds"]["type"], "histogram")
+    self.assertEqual(series["labels"], {"model": "m"})
+    self.assertEqual(series["count"], 100)
+    self.assertAlmostEqual(series["p50"], 0.505)
+    self.assertAlmostEqual(series["p99"], 0.9901)
+    self.assertAlmostEqual(latency.percentile(95, model="m"), 0.9505)
+
+  def test_name_clash_raises_error(self):
+    registry = MetricsRegistry()
+    registry.counter("x", "X")
+    with self.assertRaises(RuntimeError):
+      registry.histogram("x", "X")
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,53 @@
+from typing import Dict
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+import asyncio
+import httpx
+import threading
+import weakref
+
+# Connection limits of the transport shared by every OpenAI-backed component. Keep-alive connections are
+# reused across embeddings, rewrites and summaries instead of every component paying for its own handshakes
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY_SECONDS = 60.0
+
+_clients: Dict[str, OpenAI] = {}
+# An async client's connections belong to the event loop they were opened on, so async clients are pooled per
+# loop. The loops are held weakly, so a finished loop's clients are dropped along with it
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AsyncOpenAI]]" = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+def _limits() -> httpx.Limits:
+  return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS)
+
+# Returns the process-wide client for the API key. Retries are left to the shared RetryPolicy, which waits on
+# the shared rate limiters between attempts, so the SDK's own retries are disabled
+def get_client(openai_api_key: str) -> OpenAI:
+  with _lock:
+    if openai_api_key not in _clients:
+      _clients[openai_api_key] = OpenAI(api_key=openai_api_key, max_retries=0, http_client=DefaultHttpxClient(limits=_limits()))
+    return _clients[openai_api_key]
+
+# Async counterpart of get_client, returning the client of the running event loop. Components call it every
+# time they make a request rather than keeping the client, so that each loop gets its own
+def get_async_client(openai_api_key: str) -> AsyncOpenAI:
+  try:
+    loop = asyncio.get_running_loop()
+  except RuntimeError:
+    raise RuntimeError("get_async_client must be called from a running event loop")
+  with _lock:
+    clients = _async_clients.setdefault(loop, {})
+    if openai_api_key not in clients:
+      clients[openai_api_key] = AsyncOpenAI(api_key=openai_api_key, max_retries=0,
+        http_client=DefaultAsyncHttpxClient(limits=_limits()))
+    return clients[openai_api_key]
+
+# Forgets every pooled client, closing the synchronous ones. The async clients are only dropped, since they
+# can only be closed from their event loop
+def close_clients():
+  with _lock:
+    for client in _clients.values():
+      client.close()
+    _clients.clear()
+    _async_clients.clear()
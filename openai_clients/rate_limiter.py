@@ -0,0 +1,128 @@
+from typing import Dict, List, Tuple
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+# Priority classes: waiting interactive calls (query rewrites, query embeddings) are always served before
+# waiting batch calls (ingestion embeddings and summaries)
+INTERACTIVE = 0
+BATCH = 1
+
+# How often a call that is queued behind another one checks whether it is its turn
+QUEUE_POLL_SECONDS = 0.01
+
+# Cheap token estimate (English averages about 4 characters per token) so budgeting needs no tokenizer
+def estimate_tokens(text: str) -> int:
+  return len(text) // 4 + 1
+
+# Token-bucket limiter for per-minute request and token quotas. Each bucket holds up to one minute of
+# budget and refills continuously, and acquire blocks until both buckets can cover the call. Waiting calls
+# are served in order of priority, then arrival, so a burst of batch work can't starve interactive calls
+class RateLimiter:
+  def __init__(self, requests_per_minute: int | None = None, tokens_per_minute: int | None = None):
+    self.lock = threading.Lock()
+    self.configure(requests_per_minute, tokens_per_minute)
+
+    # Heap of the (priority, ticket) of every waiting call; only the call at the top may spend budget
+    self.waiting: List[Tuple[int, int]] = []
+    self.tickets = itertools.count()
+
+  # Sets the per-minute budgets, starting with full buckets
+  def configure(self, requests_per_minute: int | None = None, tokens_per_minute: int | None = None):
+    with self.lock:
+      self.requests_per_minute = requests_per_minute
+      self.tokens_per_minute = tokens_per_minute
+      self.available_requests = float(requests_per_minute or 0)
+      self.available_tokens = float(tokens_per_minute or 0)
+      self.last_refill = time.monotonic()
+
+  @property
+  def limited(self) -> bool:
+    return bool(self.requests_per_minute or self.tokens_per_minute)
+
+  def _refill(self):
+    now = time.monotonic()
+    elapsed_minutes = (now - self.last_refill) / 60
+    self.last_refill = now
+    if self.requests_per_minute:
+      self.available_requests = min(self.requests_per_minute, self.available_requests + elapsed_minutes * self.requests_per_minute)
+    if self.tokens_per_minute:
+      self.available_tokens = min(self.tokens_per_minute, self.available_tokens + elapsed_minutes * self.tokens_per_minute)
+
+  def _enqueue(self, priority: int) -> Tuple[int, int]:
+    with self.lock:
+      entry = (priority, next(self.tickets))
+      heapq.heappush(self.waiting, entry)
+      return entry
+
+  # Removes a call that stopped waiting without being served (e.g. it was cancelled)
+  def _dequeue(self, entry: Tuple[int, int]):
+    with self.lock:
+      if entry in self.waiting:
+        self.waiting.remove(entry)
+        heapq.heapify(self.waiting)
+
+  # Spends the budget for one request of the given token count if it is this call's turn and the budget is
+  # available, and returns 0. Otherwise returns roughly how many seconds to wait before trying again. A single
+  # call larger than the whole per-minute token budget waits for a full bucket and is then let through
+  def _try_acquire(self, tokens: int, entry: Tuple[int, int]) -> float:
+    with self.lock:
+      if self.waiting[0] != entry:
+        return QUEUE_POLL_SECONDS
+
+      self._refill()
+      tokens_needed = min(tokens, self.tokens_per_minute) if self.tokens_per_minute else 0
+      request_ok = not self.requests_per_minute or self.available_requests >= 1
+      tokens_ok = not self.tokens_per_minute or self.available_tokens >= tokens_needed
+      if request_ok and tokens_ok:
+        if self.requests_per_minute:
+          self.available_requests -= 1
+        if self.tokens_per_minute:
+          self.available_tokens -= tokens_needed
+        heapq.heappop(self.waiting)
+        return 0.0
+
+      wait = 0.0
+      if self.requests_per_minute and not request_ok:
+        wait = max(wait, (1 - self.available_requests) * 60 / self.requests_per_minute)
+      if self.tokens_per_minute and not tokens_ok:
+        wait = max(wait, (tokens_needed - self.available_tokens) * 60 / self.tokens_per_minute)
+      return max(wait, 0.01)
+
+  # Blocks until one request of the given token count fits in the budget, then spends it
+  def acquire(self, tokens: int = 0, priority: int = INTERACTIVE):
+    if not self.limited:
+      return
+    entry = self._enqueue(priority)
+    try:
+      while (wait := self._try_acquire(tokens, entry)) > 0:
+        time.sleep(wait)
+    finally:
+      self._dequeue(entry)
+
+  # Async counterpart of acquire that yields to the event loop while waiting
+  async def acquire_async(self, tokens: int = 0, priority: int = INTERACTIVE):
+    if not self.limited:
+      return
+    entry = self._enqueue(priority)
+    try:
+      while (wait := self._try_acquire(tokens, entry)) > 0:
+        await asyncio.sleep(wait)
+    finally:
+      self._dequeue(entry)
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+# Returns the limiter shared by every call to the model. It is unlimited until configure_rate_limit is called
+def get_rate_limiter(model: str) -> RateLimiter:
+  with _limiters_lock:
+    if model not in _limiters:
+      _limiters[model] = RateLimiter()
+    return _limiters[model]
+
+# Sets the per-minute request and token budgets of a model, which every component calling it then shares
+def configure_rate_limit(model: str, requests_per_minute: int | None = None, tokens_per_minute: int | None = None):
+  get_rate_limiter(model).configure(requests_per_minute, tokens_per_minute)
@@ -0,0 +1,95 @@
+from typing import Any, Callable, Awaitable, TypeVar
+from openai import APIStatusError, APIConnectionError, RateLimitError
+from openai_clients.rate_limiter import RateLimiter, INTERACTIVE
+from metrics.model_calls import record_request, record_retry, record_usage
+import asyncio
+import random
+import time
+
+T = TypeVar("T")
+
+# Rate limits, dropped connections and server errors are worth retrying; other client errors are not
+def is_retryable(error: Exception) -> bool:
+  if isinstance(error, (RateLimitError, APIConnectionError)):
+    return True
+  return isinstance(error, APIStatusError) and error.status_code >= 500
+
+# The retry and backoff policy of every OpenAI-backed component. Each attempt first waits for its turn on
+# the model's rate limiter, so retries respect the shared budget instead of adding to a burst of 429s.
+# When the call names its component and model, every attempt's latency, usage, retry and error is recorded
+# in the metrics registry
+class RetryPolicy:
+  def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+    self.max_retries = max_retries
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+
+  # Full jitter backoff, but never retrying sooner than the server asked us to
+  def delay(self, error: Exception, attempt: int) -> float:
+    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+    retry_after = getattr(getattr(error, "response", None), "headers", {}).get("retry-after")
+    if retry_after is not None:
+      try:
+        delay = max(delay, float(retry_after))
+      except ValueError:
+        pass
+    return delay
+
+  # Makes the request, retrying transient failures. tokens is the estimated size of the request
+  def call(self, request: Callable[[], T], rate_limiter: RateLimiter | None = None, tokens: int = 0,
+      priority: int = INTERACTIVE, component: str | None = None, model: str | None = None) -> T:
+    attempt = 0
+    while True:
+      if rate_limiter is not None:
+        rate_limiter.acquire(tokens, priority)
+      start = time.monotonic()
+      try:
+        response = request()
+      except Exception as e:
+        self._record(component, model, start, error=e)
+        if not is_retryable(e) or attempt == self.max_retries:
+          raise
+        self._record_retry(component, model)
+        time.sleep(self.delay(e, attempt))
+        attempt += 1
+      else:
+        self._record(component, model, start, response=response)
+        return response
+
+  # Async counterpart of call; request creates a new awaitable for every attempt
+  async def call_async(self, request: Callable[[], Awaitable[T]], rate_limiter: RateLimiter | None = None, tokens: int = 0,
+      priority: int = INTERACTIVE, component: str | None = None, model: str | None = None) -> T:
+    attempt = 0
+    while True:
+      if rate_limiter is not None:
+        await rate_limiter.acquire_async(tokens, priority)
+      start = time.monotonic()
+      try:
+        response = await request()
+      except Exception as e:
+        self._record(component, model, start, error=e)
+        if not is_retryable(e) or attempt == self.max_retries:
+          raise
+        self._record_retry(component, model)
+        await asyncio.sleep(self.delay(e, attempt))
+        attempt += 1
+      else:
+        self._record(component, model, start, response=response)
+        return response
+
+  @staticmethod
+  def _record(component: str | None, model: str | None, start: float, response: Any = None, error: Exception | None = None):
+    if component is None or model is None:
+      return
+    record_request(component, model, time.monotonic() - start, error)
+    # Streams report their usage in their last chunk instead, which the component records
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+      record_usage(component, model, usage)
+
+  @staticmethod
+  def _record_retry(component: str | None, model: str | None):
+    if component is not None and model is not None:
+      record_retry(component, model)
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
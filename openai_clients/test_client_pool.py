@@ -0,0 +1,42 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+from openai_clients.client_pool import get_client, get_async_client, close_clients
+
+class TestClientPool(unittest.TestCase):
+  def setUp(self):
+    openai_patcher = patch('openai_clients.client_pool.OpenAI')
+    async_openai_patcher = patch('openai_clients.client_pool.AsyncOpenAI')
+    self.mock_openai = openai_patcher.start()
+    self.mock_async_openai = async_openai_patcher.start()
+    # Every construction returns a distinct client
+    self.mock_openai.side_effect = lambda **kwargs: MagicMock()
+    self.mock_async_openai.side_effect = lambda **kwargs: MagicMock()
+    close_clients()
+    self.addCleanup(close_clients)
+    self.addCleanup(openai_patcher.stop)
+    self.addCleanup(async_openai_patcher.stop)
+
+  def test_one_client_per_api_key(self):
+    self.assertIs(get_client("a"), get_client("a"))
+    self.assertIsNot(get_client("a"), get_client("b"))
+
+  def test_async_clients_are_pooled_per_event_loop(self):
+    # Arrange
+    async def twice():
+      return get_async_client("a"), get_async_client("a")
+
+    # Act: Each asyncio.run has its own event loop
+    first, again = asyncio.run(twice())
+    second, _ = asyncio.run(twice())
+
+    # Assert: Reused within a loop, but never handed to another loop
+    self.assertIs(first, again)
+    self.assertIsNot(first, second)
+
+  def test_async_client_outside_an_event_loop_raises_error(self):
+    with self.assertRaises(RuntimeError):
+      get_async_client("a")
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import patch
+import threading
+import time
+from openai_clients.rate_limiter import RateLimiter, INTERACTIVE, BATCH, get_rate_limiter, configure_rate_limit
+
+class TestRateLimiter(unittest.TestCase):
+  def setUp(self):
+    # Drive the limiter with a fake clock; sleeping advances it
+    self.now = 1000.0
+    monotonic_patcher = patch('openai_clients.rate_limiter.time.monotonic', side_effect=lambda: self.now)
+    sleep_patcher = patch('openai_clients.rate_limiter.time.sleep', side_effect=self.advance)
+    monotonic_patcher.start()
+    self.mock_sleep = sleep_patcher.start()
+    self.addCleanup(monotonic_patcher.stop)
+    self.addCleanup(sleep_patcher.stop)
+
+  def advance(self, seconds):
+    self.now += seconds
+
+  def test_unlimited_never_waits(self):
+    limiter = RateLimiter()
+    for _ in range(100):
+      limiter.acquire(10_000)
+    self.mock_sleep.assert_not_called()
+
+  def test_request_budget_forces_a_wait(self):
+    # Arrange: 60 requests per minute is one per second
+    limiter = RateLimiter(requests_per_minute=60)
+    for _ in range(60):
+      limiter.acquire()
+
+    # Act
+    limiter.acquire()
+
+    # Assert: The 61st request had to wait about a second for the bucket to refill
+    self.assertAlmostEqual(self.now - 1000.0, 1.0, places=1)
+
+  def test_token_budget_forces_a_wait(self):
+    # Arrange
+    limiter = RateLimiter(tokens_per_minute=600)
+    limiter.acquire(600)
+
+    # Act
+    limiter.acquire(300)
+
+    # Assert: 300 tokens at 10 tokens per second is 30 seconds
+    self.assertAlmostEqual(self.now - 1000.0, 30.0, places=1)
+
+class TestRateLimiterPriorities(unittest.TestCase):
+  def test_interactive_calls_go_ahead_of_waiting_batch_calls(self):
+    # Arrange: 600 requests per minute is one every 0.1s, and the bucket starts empty
+    limiter = RateLimiter(requests_per_minute=600)
+    for _ in range(600):
+      limiter.acquire()
+    served = []
+
+    def call(name, priority):
+      limiter.acquire(priority=priority)
+      served.append(name)
+
+    # Act: Two batch calls queue up first, then an interactive one arrives
+    threads = [threading.Thread(target=call, args=(f"batch{i}", BATCH)) for i in range(2)]
+    for thread in threads:
+      thread.start()
+      time.sleep(0.01)
+    interactive = threading.Thread(target=call, args=("interactive", INTERACTIVE))
+    interactive.start()
+    for thread in threads + [interactive]:
+      thread.join()
+
+    # Assert: The interactive call overtook both batch calls, which kept their arrival order
+    self.assertEqual(served, ["interactive", "batch0", "batch1"])
+    self.assertEqual(limiter.waiting, [])
+
+  def test_limiters_are_shared_per_model(self):
+    configure_rate_limit("test-model", requests_per_minute=10)
+    self.assertIs(get_rate_limiter("test-model"), get_rate_limiter("test-model"))
+    self.assertEqual(get_rate_limiter("test-model").requests_per_minute, 10)
+    self.assertIsNot(get_rate_limiter("test-model"), get_rate_limiter("other-model"))
+
+if __name__ == "__main__":
+  unittest.main()
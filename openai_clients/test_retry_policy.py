@@ -0,0 +1,53 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+from openai import RateLimitError, BadRequestError
+from openai_clients.retry_policy import RetryPolicy
+
+# Builds an OpenAI SDK error without an HTTP response, which is all the retry logic looks at
+def make_error(error_type):
+  return error_type.__new__(error_type)
+
+class TestRetryPolicy(unittest.TestCase):
+  def setUp(self):
+    sleep_patcher = patch('openai_clients.retry_policy.time.sleep')
+    self.mock_sleep = sleep_patcher.start()
+    self.addCleanup(sleep_patcher.stop)
+
+  def test_transient_errors_are_retried_after_acquiring_the_limiter(self):
+    # Arrange
+    request = MagicMock(side_effect=[make_error(RateLimitError), "ok"])
+    limiter = MagicMock()
+
+    # Act
+    result = RetryPolicy().call(request, limiter, tokens=10, priority=1)
+
+    # Assert: Every attempt waited for the limiter
+    self.assertEqual(result, "ok")
+    self.assertEqual(limiter.acquire.call_count, 2)
+    limiter.acquire.assert_called_with(10, 1)
+    self.mock_sleep.assert_called_once()
+
+  def test_client_errors_are_not_retried(self):
+    request = MagicMock(side_effect=make_error(BadRequestError))
+    with self.assertRaises(BadRequestError):
+      RetryPolicy().call(request)
+    self.assertEqual(request.call_count, 1)
+
+  def test_retry_after_header_is_respected(self):
+    error = make_error(RateLimitError)
+    error.response = MagicMock(headers={"retry-after": "7"})
+    self.assertGreaterEqual(RetryPolicy(base_delay=0.001).delay(error, 0), 7.0)
+
+  def test_async_call_gives_up_after_max_retries(self):
+    # Arrange
+    request = AsyncMock(side_effect=make_error(RateLimitError))
+
+    # Act & Assert
+    with patch('openai_clients.retry_policy.asyncio.sleep', new=AsyncMock()):
+      with self.assertRaises(RateLimitError):
+        asyncio.run(RetryPolicy(max_retries=2).call_async(request))
+    self.assertEqual(request.await_count, 3)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,142 @@
+from typing import List, Iterator
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import queue
+import threading
+import time
+from chunk_storages.chunk_storage import ChunkStorage
+from query_rewriters.query_rewriter import QueryRewriter, StreamCancellation
+from retrievers.retriever import Retriever
+from retrievers.fusion import rrf
+from retrievers.executor import LatencyTracker
+from rag_types.chunk import Chunk
+from rag_types.vector import SemanticCandidate
+
+logger = logging.getLogger(__name__)
+
+class QueryPipeline:
+  # Rewrite streams and retrievals run on separate long-lived pools, so a burst of slow LLM streams can never
+  # hold up the retrievals they feed.
+  # With skip_rewrite_score set, rewriting is gated: when the finalK best candidates of the original query all
+  # score at least skip_rewrite_score, the answer is already confident, so the rewrite still streaming
+  # alongside is cancelled (closing its stream mid-read) and the original query's candidates are returned
+  # straight away
+  def __init__(self, queryRewriter: QueryRewriter, retriever: Retriever, chunkStorage: ChunkStorage, finalK: int = 3,
+      max_concurrent_retrievals: int = 16, max_concurrent_rewrites: int = 8, skip_rewrite_score: float | None = None):
+    self.queryRewriter = queryRewriter
+    self.retriever = retriever
+    self.chunkStorage = chunkStorage
+    self.finalK = finalK
+    self.skip_rewrite_score = skip_rewrite_score
+
+    self.retrievalExecutor = ThreadPoolExecutor(max_workers=max_concurrent_retrievals)
+    self.rewriteExecutor = ThreadPoolExecutor(max_workers=max_concurrent_rewrites)
+
+    # Latency of the queries that were rewritten, used to estimate what skipping a rewrite saved
+    self.rewritten_latency = LatencyTracker(min_samples=1)
+    self.rewrites_skipped = 0
+    self.rewrites_completed = 0
+    self.seconds_saved = 0.0
+    self.lock = threading.Lock()
+
+  # Whether the original query's candidates are good enough to skip the rewrites
+  def _confident(self, candidates: List[SemanticCandidate]) -> bool:
+    if self.skip_rewrite_score is None or len(candidates) < self.finalK:
+      return False
+    return all(candidate['score'] >= self.skip_rewrite_score for candidate in candidates[:self.finalK])
+
+  # Yields the fused candidates every time another query's retrieval finishes. Retrieval of the original
+  # query starts before the rewriter is even called, and every rewrite is retrieved as soon as it streams in,
+  # so the first candidates arrive after one retrieval rather than after the whole LLM completion
+  def stream_candidates(self, query: str) -> Iterator[List[SemanticCandidate]]:
+    # Every retrieval puts ("original" or "result", candidates) or ("error", (kind, exception)) here; the
+    # rewrite stream finishes with ("rewritten", number of queries sent to retrieval). The candidates are each
+    # query's full unfused list (e.g. semanticK deep), so that the fusion below ranks over all of them
+    events: queue.Queue = queue.Queue()
+    cancellation = StreamCancellation()
+    start = time.monotonic()
+
+    def retrieve(text: str, kind: str = "result"):
+      try:
+        subresults = self.retriever.retrieve_subresults([text])
+        events.put((kind, subresults[0] if subresults else []))
+      except Exception as e:
+        events.put(("error", (kind, e)))
+
+    def rewrite():
+      sent = 1
+      stream = None
+      try:
+        stream = self.queryRewriter.stream_rewrite_query(query, cancellation)
+        for rewritten in stream:
+          # The gate closes the stream under the read in progress; a rewrite that still got out is dropped
+          if cancellation.cancelled:
+            break
+          self.retrievalExecutor.submit(retrieve, rewritten)
+          sent += 1
+      except Exception as e:
+        # The original query is still being answered, so a failed rewrite only costs recall. A stream closed by
+        # the gate isn't a failure
+        if not cancellation.cancelled:
+          logger.warning("QueryPipeline could not rewrite the query, continuing with %d queries: %r", sent, e)
+      finally:
+        # Closing the stream lets the rewriter release its connection when rewriting was cancelled
+        close = getattr(stream, "close", None) if stream is not None else None
+        if close is not None:
+          close()
+        events.put(("rewritten", sent))
+
+    self.retrievalExecutor.submit(retrieve, query, "original")
+    self.rewriteExecutor.submit(rewrite)
+
+    subresults: List[List[SemanticCandidate]] = []
+    failed = 0
+    expected = None
+    while expected is None or len(subresults) + failed < expected:
+      kind, value = events.get()
+      if kind == "rewritten":
+        expected = value
+      elif kind == "error":
+        # Without the original query's candidates there is nothing to answer with, but a failed rewrite's
+        # retrieval only costs recall, so it is dropped
+        failed_kind, error = value
+        if failed_kind == "original":
+          raise error
+        failed += 1
+        logger.warning("QueryPipeline dropped a rewritten query whose retrieval failed: %r", error)
+      else:
+        subresults.append(value)
+        if kind == "original" and self._confident(value):
+          try:
+            cancellation.cancel()
+          except Exception as e:
+            # The stream then only stops at its next rewrite, which is still dropped
+            logger.warning("QueryPipeline could not close a cancelled rewrite stream: %r", e)
+          self._record_skip(time.monotonic() - start)
+          yield value[:self.finalK]
+          return
+        yield rrf(subresults, self.finalK)
+
+    with self.lock:
+      self.rewrites_completed += 1
+    self.rewritten_latency.record(time.monotonic() - start)
+
+  def _record_skip(self, seconds: float):
+    # Saved latency is estimated as the median latency of rewritten queries minus this query's latency
+    typical = self.rewritten_latency.percentile(50)
+    with self.lock:
+      self.rewrites_skipped += 1
+      if typical is not None:
+        self.seconds_saved += max(0.0, typical - seconds)
+
+  @property
+  def skip_rate(self) -> float:
+    total = self.rewrites_skipped + self.rewrites_completed
+    return self.rewrites_skipped / total if total else 0.0
+
+  # Retrieves the chunks for a user query, best first
+  def query(self, query: str) -> List[Chunk]:
+    candidates: List[SemanticCandidate] = []
+    for candidates in self.stream_candidates(query):
+      pass
+    return self.chunkStorage.retrieve_chunks([candidate['id'] for candidate in candidates])
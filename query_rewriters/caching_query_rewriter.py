@@ -0,0 +1,92 @@
+from query_rewriters.query_rewriter import QueryRewriter, StreamCancellation
+from rag_types.query import normalize_query
+from typing import List, Iterator
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Wraps any QueryRewriter with a persistent cache. Rewrites are keyed by a hash of (model, n, normalized
+# query) and stored as JSON in SQLite, so a question asked again (even after a restart) costs no LLM round
+# trip. Entries older than ttl_seconds are treated as misses and overwritten
+class CachingQueryRewriter(QueryRewriter):
+  def __init__(self, rewriter: QueryRewriter, db_name: str, table_name: str = "rewrite_cache", ttl_seconds: float | None = None,
+      model: str | None = None, n: int | None = None):
+    if not db_name:
+      raise RuntimeError("CachingQueryRewriter requires a db_name.")
+    if not table_name:
+      raise RuntimeError("CachingQueryRewriter requires a table_name.")
+
+    self.rewriter = rewriter
+    self.table_name = table_name
+    self.ttl_seconds = ttl_seconds
+
+    # The model and number of rewrites are part of the key so that changing either never serves stale rewrites
+    self.model = model if model is not None else getattr(rewriter, "model", type(rewriter).__name__)
+    self.n = n if n is not None else getattr(rewriter, "n", None)
+
+    self.hits = 0
+    self.misses = 0
+
+    # Rewrites are requested from the query pipeline's worker threads, so the connection is shared behind a lock
+    self.lock = threading.Lock()
+    self.conn = sqlite3.connect(db_name, check_same_thread=False)
+    self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self.table_name} (key TEXT PRIMARY KEY, queries TEXT, created REAL)")
+    self.conn.commit()
+
+  def key(self, query: str) -> str:
+    return hashlib.sha256(f"{self.model}\x00{self.n}\x00{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+  # Returns the cached rewrites of the query, or None (counting a miss) if there are none that are fresh
+  def _lookup(self, query: str) -> List[str] | None:
+    with self.lock:
+      row = self.conn.execute(f"SELECT queries, created FROM {self.table_name} WHERE key = ?", (self.key(query),)).fetchone()
+      if row is not None and (self.ttl_seconds is None or time.time() - row[1] <= self.ttl_seconds):
+        self.hits += 1
+        return json.loads(row[0])
+      self.misses += 1
+      return None
+
+  def _store(self, query: str, queries: List[str]):
+    with self.lock:
+      self.conn.execute(
+        f"INSERT OR REPLACE INTO {self.table_name} (key, queries, created) VALUES (?, ?, ?)",
+        (self.key(query), json.dumps(queries), time.time())
+      )
+      self.conn.commit()
+
+  def rewrite_query(self, query: str) -> List[str]:
+    queries = self._lookup(query)
+    if queries is None:
+      # Rewritten outside the lock so other callers aren't blocked on the LLM
+      queries = self.rewriter.rewrite_query(query)
+      self._store(query, queries)
+    return queries
+
+  async def rewrite_query_async(self, query: str) -> List[str]:
+    queries = self._lookup(query)
+    if queries is None:
+      queries = await self.rewriter.rewrite_query_async(query)
+      self._store(query, queries)
+    return queries
+
+  # A miss streams from the wrapped rewriter and is only cached once the stream has been read to the end, so
+  # a stream cancelled part way through never leaves an incomplete entry behind
+  def stream_rewrite_query(self, query: str, cancellation: StreamCancellation | None = None) -> Iterator[str]:
+    queries = self._lookup(query)
+    if queries is not None:
+      yield from queries
+      return
+
+    queries = []
+    for rewritten in self.rewriter.stream_rewrite_query(query, cancellation):
+      queries.append(rewritten)
+      yield rewritten
+    if cancellation is None or not cancellation.cancelled:
+      self._store(query, queries)
+
+  @property
+  def hit_rate(self) -> float:
+    total = self.hits + self.misses
+    return self.hits / total if total else 0.0
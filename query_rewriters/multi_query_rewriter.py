@@ -1,14 +1,61 @@
-from query_rewriters.query_rewriter import QueryRewriter
-from typing import List
-from openai import OpenAI
+from query_rewriters.query_rewriter import QueryRewriter, StreamCancellation
+from typing import List, Any, Iterator, AsyncIterator
+from openai_clients.client_pool import get_client, get_async_client
+from openai import AsyncOpenAI
+from openai_clients.rate_limiter import get_rate_limiter, estimate_tokens, INTERACTIVE
+from openai_clients.retry_policy import RetryPolicy, DEFAULT_RETRY_POLICY
+from metrics.model_calls import record_usage
+
+QUERY_DELIMITER = "|--|"
+
+# Splits a streamed completion into queries as it arrives. Each fed piece of text is only searched together
+# with the few trailing characters that could be the start of a delimiter, so the work per token stays
+# constant however long the completion gets
+class DelimitedQueryParser:
+  def __init__(self, delimiter: str = QUERY_DELIMITER):
+    self.delimiter = delimiter
+    self.buffer = ""
+
+  # Adds streamed text and returns the queries it completed
+  def feed(self, text: str) -> List[str]:
+    # Only the end of the previous buffer can hold the start of a delimiter that this text finishes
+    search_from = max(0, len(self.buffer) - len(self.delimiter) + 1)
+    self.buffer += text
+
+    queries = []
+    start = 0
+    end = self.buffer.find(self.delimiter, search_from)
+    while end != -1:
+      queries.append(self.buffer[start:end].strip())
+      start = end + len(self.delimiter)
+      end = self.buffer.find(self.delimiter, start)
+    self.buffer = self.buffer[start:]
+    return [query for query in queries if query]
+
+  # Returns the last query once the stream has ended
+  def finish(self) -> List[str]:
+    query, self.buffer = self.buffer.strip(), ""
+    return [query] if query else []
 
 class MultiQueryRewriter(QueryRewriter):
-  def __init__(self, openai_api_key, n: int = 3):
-    self.client = OpenAI(api_key=openai_api_key)
+  # Rewrites are on the query path, so they wait for the shared rate limiter as INTERACTIVE calls by default
+  def __init__(self, openai_api_key, n: int = 3, model: str = "gpt-4.1", priority: int = INTERACTIVE,
+      retry_policy: RetryPolicy = DEFAULT_RETRY_POLICY):
+    self.openai_api_key = openai_api_key
+    self.client = get_client(openai_api_key)
     self.n = n
+    self.model = model
+    self.rate_limiter = get_rate_limiter(model)
+    self.priority = priority
+    self.retry_policy = retry_policy
 
-  # Writes multiple variations of a query with better wording
-  def rewrite_query(self, query: str) -> List[str]:
+  # The pooled async client of the running event loop
+  @property
+  def async_client(self) -> AsyncOpenAI:
+    return get_async_client(self.openai_api_key)
+
+  # Builds the chat messages asking the LLM for n variations of the query
+  def build_messages(self, query: str) -> List[dict[str, Any]]:
     # System prompt explaining what the LLM is
     system_prompt = """You are a retrieval assistant for a Retrieval-Augmented Generation (RAG) system.
     Your task is to generate multiple alternative search queries that preserve the original intent while improving retrieval coverage.
@@ -38,18 +85,102 @@ class MultiQueryRewriter(QueryRewriter):
     Return only the queries, separated by |--|, and nothing else.
     """
 
-    # Send to AI and get response
-    response = self.client.chat.completions.create(
-        model="gpt-4.1",
-        messages=[
-          {"role": "system", "content": system_prompt},
-          {"role": "user", "content": user_prompt}
-        ]
-    )
+    return [
+      {"role": "system", "content": system_prompt},
+      {"role": "user", "content": user_prompt}
+    ]
 
-    # Split and return
-    if response.choices[0].message.content is None:
+  # Estimated tokens of a request: the prompt plus roughly 50 tokens of output per rewritten query
+  def estimate_tokens(self, messages: List[dict[str, Any]]) -> int:
+    return sum(estimate_tokens(message["content"]) for message in messages) + 50 * self.n
+
+  # Splits the LLM's response into the individual queries
+  def parse_queries(self, content: str | None) -> List[str]:
+    if content is None:
       raise RuntimeError("response.choices[0].message.content received from the LLM was None")
-    queries = response.choices[0].message.content.split("|--|")
+    queries = content.split(QUERY_DELIMITER)
     queries = [query.strip() for query in queries]
-    return queries
\ No newline at end of file
+    return queries
+
+  # Writes multiple variations of a query with better wording
+  def rewrite_query(self, query: str) -> List[str]:
+    # Send to AI and get response
+    messages = self.build_messages(query)
+    response = self.retry_policy.call(
+      lambda: self.client.chat.completions.create(
+        model=self.model,
+        messages=messages # type: ignore
+      ),
+      self.rate_limiter, self.estimate_tokens(messages), self.priority, component="multi_query_rewriter", model=self.model)
+
+    # Split and return
+    return self.parse_queries(response.choices[0].message.content)
+
+  # Streams the completion and yields each query as soon as the delimiter after it arrives
+  def stream_rewrite_query(self, query: str, cancellation: StreamCancellation | None = None) -> Iterator[str]:
+    if cancellation is not None and cancellation.cancelled:
+      return
+
+    # Only opening the stream is retried: once queries have been yielded, a retry would repeat them
+    messages = self.build_messages(query)
+    stream = self.retry_policy.call(
+      lambda: self.client.chat.completions.create(
+        model=self.model,
+        messages=messages, # type: ignore
+        stream=True,
+        stream_options={"include_usage": True}
+      ),
+      self.rate_limiter, self.estimate_tokens(messages), self.priority, component="multi_query_rewriter", model=self.model)
+
+    parser = DelimitedQueryParser()
+    with stream:
+      if cancellation is not None:
+        cancellation.register(stream.close)
+      try:
+        for chunk in stream:
+          if chunk.choices:
+            yield from parser.feed(chunk.choices[0].delta.content or "")
+          elif chunk.usage is not None:
+            record_usage("multi_query_rewriter", self.model, chunk.usage)
+      except Exception:
+        # Cancelling closes the response under the read in progress, which fails it; that just ends the stream
+        if cancellation is not None and cancellation.cancelled:
+          return
+        raise
+    # A cancelled stream's unterminated last query may be cut short, so it is dropped
+    if cancellation is not None and cancellation.cancelled:
+      return
+    yield from parser.finish()
+
+  # Async counterpart of stream_rewrite_query, streaming through the async client
+  async def stream_rewrite_query_async(self, query: str) -> AsyncIterator[str]:
+    messages = self.build_messages(query)
+    stream = await self.retry_policy.call_async(
+      lambda: self.async_client.chat.completions.create(
+        model=self.model,
+        messages=messages, # type: ignore
+        stream=True,
+        stream_options={"include_usage": True}
+      ),
+      self.rate_limiter, self.estimate_tokens(messages), self.priority, component="multi_query_rewriter", model=self.model)
+
+    parser = DelimitedQueryParser()
+    async with stream:
+      async for chunk in stream:
+        if chunk.choices:
+          for rewritten in parser.feed(chunk.choices[0].delta.content or ""):
+            yield rewritten
+        elif chunk.usage is not None:
+          record_usage("multi_query_rewriter", self.model, chunk.usage)
+    for rewritten in parser.finish():
+      yield rewritten
+
+  async def rewrite_query_async(self, query: str) -> List[str]:
+    messages = self.build_messages(query)
+    response = await self.retry_policy.call_async(
+      lambda: self.async_client.chat.completions.create(
+        model=self.model,
+        messages=messages # type: ignore
+      ),
+      self.rate_limiter, self.estimate_tokens(messages), self.priority, component="multi_query_rewriter", model=self.model)
+    return self.parse_queries(response.choices[0].message.content)
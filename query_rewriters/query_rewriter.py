@@ -1,7 +1,105 @@
 from abc import ABC, abstractmethod
-from typing import List, Set
+from typing import List, Set, Dict, Iterator, AsyncIterator, Callable
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+import asyncio
+import threading
+
+# How many queries the batch methods rewrite at once
+DEFAULT_MAX_CONCURRENT_REWRITES = 8
+
+# Workers of the process-wide rewrite pool. Rewrites wait on LLM round trips, so this is sized for
+# concurrency rather than for cores; each batch still only uses max_concurrency of them
+SHARED_REWRITE_WORKERS = 32
+
+_shared_rewrite_executor: ThreadPoolExecutor | None = None
+_shared_rewrite_executor_lock = threading.Lock()
+
+# Returns the long-lived pool shared by every rewriter's batch calls, kept apart from the retrieval pool so
+# slow LLM calls never hold up retrievals
+def get_shared_rewrite_executor() -> ThreadPoolExecutor:
+  global _shared_rewrite_executor
+  with _shared_rewrite_executor_lock:
+    if _shared_rewrite_executor is None:
+      _shared_rewrite_executor = ThreadPoolExecutor(max_workers=SHARED_REWRITE_WORKERS, thread_name_prefix="rewrite")
+    return _shared_rewrite_executor
+
+# Lets a consumer cancel a rewrite stream from another thread. The rewriter registers a function closing
+# whatever it reads from (e.g. the HTTP response), and cancel() calls it straight away, so a read in progress
+# ends now rather than when the next query arrives. A function registered after cancel() is called at once
+class StreamCancellation:
+  def __init__(self):
+    self.cancelled = False
+    self.closers: List[Callable[[], None]] = []
+    self.lock = threading.Lock()
+
+  def register(self, close: Callable[[], None]):
+    with self.lock:
+      if not self.cancelled:
+        self.closers.append(close)
+        return
+    close()
+
+  def cancel(self):
+    with self.lock:
+      if self.cancelled:
+        return
+      self.cancelled = True
+      closers, self.closers = self.closers, []
+    for close in closers:
+      close()
 
 class QueryRewriter(ABC):
   @abstractmethod
   def rewrite_query(self, query: str) -> List[str]:
-    pass
\ No newline at end of file
+    pass
+
+  # Async counterpart of rewrite_query. The default runs the synchronous method in a worker thread;
+  # rewriters with a native async client should override it
+  async def rewrite_query_async(self, query: str) -> List[str]:
+    return await asyncio.to_thread(self.rewrite_query, query)
+
+  # Yields the rewritten queries one by one as they become available, so retrieval can start on the first
+  # rewrite before the last one exists. Cancelling cancellation ends the stream, mid-read where the rewriter
+  # can close what it reads from. The default yields them all once rewrite_query returns, so it has nothing
+  # to close and just stops
+  def stream_rewrite_query(self, query: str, cancellation: StreamCancellation | None = None) -> Iterator[str]:
+    for rewritten in self.rewrite_query(query):
+      if cancellation is not None and cancellation.cancelled:
+        return
+      yield rewritten
+
+  # Async counterpart of stream_rewrite_query. The default yields the queries of rewrite_query_async
+  async def stream_rewrite_query_async(self, query: str) -> AsyncIterator[str]:
+    for rewritten in await self.rewrite_query_async(query):
+      yield rewritten
+
+  # Rewrites many user queries concurrently on the shared rewrite pool, at most max_concurrency at a time,
+  # returning their rewrites in the order of the queries. Every rewrite goes through this rewriter's single
+  # client, so its connection pool is shared by the whole batch
+  def rewrite_queries(self, queries: List[str], max_concurrency: int = DEFAULT_MAX_CONCURRENT_REWRITES) -> List[List[str]]:
+    if len(queries) <= 1:
+      return [self.rewrite_query(query) for query in queries]
+
+    executor = get_shared_rewrite_executor()
+    results: List[List[str]] = [[] for _ in queries]
+    running: Dict[Future, int] = {}
+    for i, query in enumerate(queries):
+      # Another query is only submitted once one of the batch's rewrites has finished
+      if len(running) >= max_concurrency:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+          results[running.pop(future)] = future.result()
+      running[executor.submit(self.rewrite_query, query)] = i
+    for future, i in running.items():
+      results[i] = future.result()
+    return results
+
+  # Async counterpart of rewrite_queries
+  async def rewrite_queries_async(self, queries: List[str], max_concurrency: int = DEFAULT_MAX_CONCURRENT_REWRITES) -> List[List[str]]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def rewrite(query: str) -> List[str]:
+      async with semaphore:
+        return await self.rewrite_query_async(query)
+
+    return list(await asyncio.gather(*(rewrite(query) for query in queries)))
\ No newline at end of file
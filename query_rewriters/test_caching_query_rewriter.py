@@ -0,0 +1,84 @@
+import os
+import time
+import unittest
+from unittest.mock import MagicMock
+from query_rewriters.caching_query_rewriter import CachingQueryRewriter
+from query_rewriters.query_rewriter import StreamCancellation
+
+SQLITE_DB_NAME = 'test_rewrite_cache.db'
+
+class TestCachingQueryRewriter(unittest.TestCase):
+  def setUp(self):
+    self.rewriter = MagicMock(model="gpt-4.1", n=2)
+    self.rewriter.rewrite_query.side_effect = lambda query: [f"{query} a", f"{query} b"]
+    self.rewriter.stream_rewrite_query.side_effect = lambda query, cancellation=None: iter([f"{query} a", f"{query} b"])
+
+  def tearDown(self):
+    if os.path.exists(SQLITE_DB_NAME):
+      os.remove(SQLITE_DB_NAME)
+
+  def test_repeated_query_is_served_from_cache(self):
+    # Arrange
+    cache = CachingQueryRewriter(self.rewriter, SQLITE_DB_NAME)
+
+    # Act
+    first = cache.rewrite_query("Heart  Disease")
+    second = cache.rewrite_query("heart disease")
+
+    # Assert: The normalized query is only rewritten once
+    self.assertEqual(first, second)
+    self.assertEqual(self.rewriter.rewrite_query.call_count, 1)
+    self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+  def test_cache_persists_across_instances(self):
+    CachingQueryRewriter(self.rewriter, SQLITE_DB_NAME).rewrite_query("q")
+    cached = CachingQueryRewriter(self.rewriter, SQLITE_DB_NAME).rewrite_query("q")
+    self.assertEqual(cached, ["q a", "q b"])
+    self.assertEqual(self.rewriter.rewrite_query.call_count, 1)
+
+  def test_model_and_n_are_part_of_the_key(self):
+    CachingQueryRewriter(self.rewriter, SQLITE_DB_NAME).rewrite_query("q")
+    CachingQueryRewriter(self.rewriter, SQLITE_DB_NAME, n=5).rewrite_query("q")
+    CachingQueryRewriter(self.rewriter, SQLITE_DB_NAME, model="other").rewrite_query("q")
+    self.assertEqual(self.rewriter.rewrite_query.call_count, 3)
+
+  def test_expired_entries_are_rewritten(self):
+    cache = CachingQueryRewriter(self.rewriter, SQLITE_DB_NAME, ttl_seconds=0.05)
+    cache.rewrite_query("q")
+    time.sleep(0.1)
+    cache.rewrite_query("q")
+    self.assertEqual(self.rewriter.rewrite_query.call_count, 2)
+
+  def test_only_completed_streams_are_cached(self):
+    # Arrange
+    cache = CachingQueryRewriter(self.rewriter, SQLITE_DB_NAME)
+
+    # Act: Abandon the first stream after one rewrite, then read a second one fully
+    stream = cache.stream_rewrite_query("q")
+    next(stream)
+    stream.close()
+    streamed = list(cache.stream_rewrite_query("q"))
+    cached = list(cache.stream_rewrite_query("q"))
+
+    # Assert
+    self.assertEqual(streamed, ["q a", "q b"])
+    self.assertEqual(cached, ["q a", "q b"])
+    self.assertEqual(self.rewriter.stream_rewrite_query.call_count, 2)
+
+  def test_cancelled_streams_are_not_cached(self):
+    # Arrange: The wrapped stream ends early once cancelled, as a closed response does
+    cache = CachingQueryRewriter(self.rewriter, SQLITE_DB_NAME)
+    cancellation = StreamCancellation()
+    self.rewriter.stream_rewrite_query.side_effect = lambda query, cancellation=None: iter([f"{query} a"])
+
+    # Act
+    cancellation.cancel()
+    list(cache.stream_rewrite_query("q", cancellation))
+
+    # Assert
+    self.assertEqual(cache.misses, 1)
+    list(cache.stream_rewrite_query("q"))
+    self.assertEqual(cache.misses, 2)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,168 @@
+from typing import List
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+from query_rewriters.multi_query_rewriter import MultiQueryRewriter, DelimitedQueryParser
+from query_rewriters.query_rewriter import StreamCancellation
+from openai_clients.client_pool import close_clients
+
+# Fake streamed chat completion chunk carrying the given text
+def fake_chunk(text: str | None):
+  return MagicMock(choices=[MagicMock(delta=MagicMock(content=text))])
+
+# Fake sync stream (an iterable context manager) over the given pieces of text
+def fake_stream(pieces: List[str | None]):
+  stream = MagicMock()
+  stream.__iter__.return_value = iter([fake_chunk(piece) for piece in pieces])
+  return stream
+
+# Fake async stream over the given pieces of text
+class FakeAsyncStream:
+  def __init__(self, pieces: List[str | None]):
+    self.pieces = pieces
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, *args):
+    return False
+
+  async def __aiter__(self):
+    for piece in self.pieces:
+      yield fake_chunk(piece)
+
+class TestDelimitedQueryParser(unittest.TestCase):
+  def test_yields_each_query_once_its_delimiter_arrives(self):
+    parser = DelimitedQueryParser()
+    self.assertEqual(parser.feed("first que"), [])
+    self.assertEqual(parser.feed("ry |--| second"), ["first query"])
+    self.assertEqual(parser.feed(" |--| third |--|"), ["second", "third"])
+    self.assertEqual(parser.finish(), [])
+
+  def test_delimiter_split_across_pieces(self):
+    parser = DelimitedQueryParser()
+    queries = []
+    for piece in ["a |", "-", "-", "| b |-", "-| c"]:
+      queries += parser.feed(piece)
+    queries += parser.finish()
+    self.assertEqual(queries, ["a", "b", "c"])
+
+  def test_skips_empty_queries(self):
+    parser = DelimitedQueryParser()
+    self.assertEqual(parser.feed("|--| |--|a|--|"), ["a"])
+    self.assertEqual(parser.finish(), [])
+
+class TestMultiQueryRewriterStreaming(unittest.TestCase):
+  def setUp(self):
+    openai_patcher = patch('openai_clients.client_pool.OpenAI')
+    async_openai_patcher = patch('openai_clients.client_pool.AsyncOpenAI')
+    close_clients()
+    self.addCleanup(close_clients)
+    self.client = openai_patcher.start().return_value
+    self.async_client = async_openai_patcher.start().return_value
+    self.addCleanup(openai_patcher.stop)
+    self.addCleanup(async_openai_patcher.stop)
+    self.rewriter = MultiQueryRewriter("key", n=3)
+
+  def test_stream_rewrite_query(self):
+    # Arrange: The last chunk carries no content, as the final chunk of a real stream does
+    self.client.chat.completions.create.return_value = fake_stream(["one |-", "-| two", " |--| three", None])
+
+    # Act
+    stream = self.rewriter.stream_rewrite_query("q")
+
+    # Assert: The first query is available before the rest of the stream is read
+    self.assertEqual(next(stream), "one")
+    self.assertEqual(list(stream), ["two", "three"])
+    self.assertTrue(self.client.chat.completions.create.call_args.kwargs['stream'])
+
+  def test_cancelling_closes_the_response_mid_read(self):
+    # Arrange: After the first query the response stalls until it is closed, and then the read fails
+    closed = threading.Event()
+    def chunks():
+      yield fake_chunk("one |--| tw")
+      closed.wait(5)
+      raise RuntimeError("response closed")
+    response = MagicMock()
+    response.__iter__.return_value = chunks()
+    response.close.side_effect = closed.set
+    self.client.chat.completions.create.return_value = response
+    cancellation = StreamCancellation()
+    stream = self.rewriter.stream_rewrite_query("q", cancellation)
+    self.assertEqual(next(stream), "one")
+
+    # Act
+    threading.Timer(0.05, cancellation.cancel).start()
+    start = time.monotonic()
+    rest = list(stream)
+
+    # Assert: The stream ends as soon as it is cancelled, without the cut off "tw" or an error
+    self.assertLess(time.monotonic() - start, 1.0)
+    self.assertEqual(rest, [])
+
+  def test_stream_rewrite_query_async(self):
+    # Arrange
+    self.async_client.chat.completions.create = AsyncMock(return_value=FakeAsyncStream(["one |--| tw", "o |--| three"]))
+
+    async def collect():
+      return [query async for query in self.rewriter.stream_rewrite_query_async("q")]
+
+    # Act & Assert
+    self.assertEqual(asyncio.run(collect()), ["one", "two", "three"])
+
+  def test_rewrite_queries_runs_concurrently_and_keeps_order(self):
+    # Arrange: Every completion takes 0.2s and echoes its query
+    def create(model, messages):
+      time.sleep(0.2)
+      query = messages[1]['content'].split("Original query:")[1].split("Output:")[0].strip()
+      return MagicMock(choices=[MagicMock(message=MagicMock(content=f"{query} a|--|{query} b"))])
+    self.client.chat.completions.create.side_effect = create
+
+    # Act
+    start = time.monotonic()
+    rewrites = self.rewriter.rewrite_queries(["x", "y", "z", "w"])
+    elapsed = time.monotonic() - start
+
+    # Assert
+    self.assertEqual(rewrites, [["x a", "x b"], ["y a", "y b"], ["z a", "z b"], ["w a", "w b"]])
+    self.assertLess(elapsed, 0.6)
+
+  def test_rewrite_queries_limits_concurrency_on_the_shared_pool(self):
+    # Arrange: Track how many completions run at once
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+    threads = set()
+    def create(model, messages):
+      with lock:
+        threads.add(threading.current_thread().name)
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+      time.sleep(0.05)
+      with lock:
+        running[0] -= 1
+      return MagicMock(choices=[MagicMock(message=MagicMock(content="a|--|b"))])
+    self.client.chat.completions.create.side_effect = create
+
+    # Act
+    rewrites = self.rewriter.rewrite_queries(["q1", "q2", "q3", "q4", "q5"], max_concurrency=2)
+
+    # Assert: The rewrites run on the shared pool, never more than 2 at a time
+    self.assertEqual(len(rewrites), 5)
+    self.assertEqual(peak[0], 2)
+    self.assertTrue(all(name.startswith("rewrite") for name in threads))
+
+  def test_rewrite_queries_async_keeps_order(self):
+    async def create(model, messages):
+      query = messages[1]['content'].split("Original query:")[1].split("Output:")[0].strip()
+      await asyncio.sleep(0.01 if query == "x" else 0)
+      return MagicMock(choices=[MagicMock(message=MagicMock(content=f"{query}1|--|{query}2"))])
+    self.async_client.chat.completions.create = create
+
+    rewrites = asyncio.run(self.rewriter.rewrite_queries_async(["x", "y"]))
+    self.assertEqual(rewrites, [["x1", "x2"], ["y1", "y2"]])
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,4 +1,5 @@
-from typing import TypedDict, List
+from typing import TypedDict, List, NotRequired
+from rag_types.vector import Metadata
 
 class Content(TypedDict):
     """
@@ -10,4 +11,6 @@ class Content(TypedDict):
 
 class Chunk(TypedDict):
   search_text: str
-  content: Content
\ No newline at end of file
+  content: Content
+  # What the loader knows about where the chunk came from (e.g. its source file), copied onto its vector
+  metadata: NotRequired[Metadata]
\ No newline at end of file
@@ -0,0 +1,4 @@
+# Returns the text that caches key a user query on: lowercased with whitespace collapsed, so that queries
+# differing only in case or spacing share an entry
+def normalize_query(query: str) -> str:
+  return " ".join(query.lower().split())
@@ -1,5 +1,29 @@
-from typing import TypedDict
+from typing import TypedDict, Dict, List, Any
+import numpy as np
 
 class SemanticCandidate(TypedDict):
   id: int
-  score: float
\ No newline at end of file
+  score: float
+
+# Metadata attached to a stored vector. Values may be strings, numbers, booleans or lists of strings
+Metadata = Dict[str, str | int | float | bool | List[str]]
+
+# A Pinecone-style filter expression, e.g. {"tenant": "acme", "year": {"$gte": 2020}} or
+# {"$or": [{"source": "a.pdf"}, {"source": {"$in": ["b.pdf", "c.pdf"]}}]}
+MetadataFilter = Dict[str, Any]
+
+# A batch of embeddings, preferably an (n, dimension) float32 ndarray. Lists of lists are still accepted
+# at the edges (tests, callers that build vectors by hand) and converted once on the way in
+Vectors = np.ndarray | List[List[float]]
+
+# A single embedding, as a float32 ndarray or a list of floats
+VectorLike = np.ndarray | List[float]
+
+# Returns the vectors as a C-contiguous float32 matrix, without copying when they already are one
+def as_matrix(vectors: Vectors, dimension: int | None = None) -> np.ndarray:
+  matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+  if len(matrix) == 0:
+    matrix = matrix.reshape(0, dimension if dimension is not None else 0)
+  if matrix.ndim != 2 or (dimension is not None and matrix.shape[1] != dimension):
+    raise RuntimeError(f"Expected a matrix of vectors with dimension {dimension}" if dimension is not None else "Expected a matrix of vectors")
+  return matrix
@@ -0,0 +1,353 @@
+from typing import List, Dict, Tuple, Iterable
+from collections import Counter, OrderedDict
+import math
+import re
+import sqlite3
+import threading
+import numpy as np
+from rag_types.vector import SemanticCandidate
+from retrievers.fusion import top_k_stable
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Postings per compressed block. Each block records its first and last id and its largest term frequency,
+# so a search can tell which blocks might hold a candidate without decoding them
+BLOCK_SIZE = 128
+
+def tokenize(text: str) -> List[str]:
+  return TOKEN_PATTERN.findall(text.lower())
+
+# Smallest unsigned integer width (in bytes) that holds every value
+def _width(values: np.ndarray) -> int:
+  largest = int(values.max()) if len(values) else 0
+  for width in (1, 2, 4):
+    if largest < 1 << (8 * width):
+      return width
+  return 8
+
+# Compresses one block of postings: the ids as deltas from the block's first id, and the term frequencies,
+# each packed at the narrowest byte width that fits. Decoding is two np.frombuffer calls and a cumsum
+def encode_block(ids: np.ndarray, tfs: np.ndarray) -> Tuple[int, int, int, int, int, int, bytes]:
+  deltas = np.diff(ids)
+  id_width, tf_width = _width(deltas), _width(tfs)
+  data = deltas.astype(f"<u{id_width}").tobytes() + tfs.astype(f"<u{tf_width}").tobytes()
+  return int(ids[0]), int(ids[-1]), len(ids), int(tfs.max()), id_width, tf_width, data
+
+def decode_block(first_id: int, count: int, id_width: int, tf_width: int, data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+  deltas = np.frombuffer(data, dtype=f"<u{id_width}", count=count - 1).astype(np.int64)
+  ids = np.empty(count, dtype=np.int64)
+  ids[0] = first_id
+  np.cumsum(deltas, out=ids[1:])
+  ids[1:] += first_id
+  tfs = np.frombuffer(data, dtype=f"<u{tf_width}", count=count, offset=(count - 1) * id_width).astype(np.float64)
+  return ids, tfs
+
+# Block directory of one term, loaded from SQLite and kept in memory
+class _TermBlocks:
+  def __init__(self, rows: List[tuple]):
+    self.numbers = np.array([row[0] for row in rows], dtype=np.int64)
+    self.first_ids = np.array([row[1] for row in rows], dtype=np.int64)
+    self.last_ids = np.array([row[2] for row in rows], dtype=np.int64)
+    self.counts = np.array([row[3] for row in rows], dtype=np.int64)
+    self.max_tf = max((row[4] for row in rows), default=0)
+    self.df = int(self.counts.sum())
+
+# Persistent BM25 index over chunk search text, keyed by the ids the chunk storage hands out. Posting lists
+# live in SQLite as compressed blocks. Decoded blocks and block directories are cached in memory, so repeated
+# lookups never touch the disk. Searches use MaxScore pruning: query terms are taken in decreasing order of
+# their best possible score, and once the remaining terms together can no longer beat the current kth best
+# score, documents that only contain those terms are never considered. For those terms, only the blocks that
+# could hold an existing candidate are decoded.
+# Searches only hold the lock for SQLite reads and cache updates, so their decoding and scoring run in parallel
+class BM25Index:
+  def __init__(self, db_name: str, table_name: str = "bm25", k1: float = 1.2, b: float = 0.75, max_cached_blocks: int = 100000,
+      max_cached_terms: int = 10000):
+    if not db_name:
+      raise RuntimeError("BM25Index requires a db_name.")
+    if not table_name:
+      raise RuntimeError("BM25Index requires a table_name.")
+
+    self.table_name = table_name
+    self.k1 = k1
+    self.b = b
+    self.max_cached_blocks = max_cached_blocks
+    self.max_cached_terms = max_cached_terms
+
+    # Searches run on retriever worker threads, so the connection and caches are shared behind a lock. It is
+    # reentrant because add_documents holds it while reading the postings it merges into
+    self.lock = threading.RLock()
+    self.conn = sqlite3.connect(db_name, check_same_thread=False)
+    self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name}_documents (id INTEGER PRIMARY KEY, length INTEGER)")
+    self.conn.execute(
+      f"CREATE TABLE IF NOT EXISTS {table_name}_blocks (term TEXT, block INTEGER, first_id INTEGER, last_id INTEGER, "
+      "count INTEGER, max_tf INTEGER, id_width INTEGER, tf_width INTEGER, data BLOB, PRIMARY KEY (term, block))"
+    )
+    self.conn.commit()
+
+    # Document lengths are small enough to keep entirely in memory, sorted by id
+    rows = self.conn.execute(f"SELECT id, length FROM {table_name}_documents ORDER BY id").fetchall()
+    self.doc_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    self.doc_lengths = np.array([row[1] for row in rows], dtype=np.float64)
+
+    self.term_blocks: Dict[str, _TermBlocks] = {}
+    self.block_cache: OrderedDict[Tuple[str, int], Tuple[np.ndarray, np.ndarray]] = OrderedDict()
+    self.postings_cache: OrderedDict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = OrderedDict()
+    self.length_norms: np.ndarray | None = None
+
+    # Bumped by every add_documents. Decoded data is only cached if nothing was added while it was being
+    # decoded, and a search that overlapped an add is run again
+    self.generation = 0
+
+  def __len__(self) -> int:
+    return len(self.doc_ids)
+
+  # Indexes the texts under the given ids. Ids are expected to be new (chunk storage ids never repeat)
+  def add_documents(self, ids: List[int], texts: Iterable[str]):
+    texts = list(texts)
+    if len(ids) != len(texts):
+      raise RuntimeError("The number of ids must match the number of texts")
+    if len(ids) == 0:
+      return
+
+    new_ids = np.asarray(ids, dtype=np.int64)
+    postings: Dict[str, Tuple[List[int], List[int]]] = {}
+    lengths = []
+    for id, text in zip(new_ids.tolist(), texts):
+      tokens = tokenize(text)
+      lengths.append(len(tokens))
+      for term, tf in Counter(tokens).items():
+        term_ids, term_tfs = postings.setdefault(term, ([], []))
+        term_ids.append(id)
+        term_tfs.append(tf)
+
+    with self.lock:
+      if len(np.unique(new_ids)) != len(new_ids) or np.isin(new_ids, self.doc_ids).any():
+        raise RuntimeError("BM25Index documents can only be added once per id")
+
+      self.conn.executemany(f"INSERT INTO {self.table_name}_documents (id, length) VALUES (?, ?)", zip(new_ids.tolist(), lengths))
+      for term, (term_ids, term_tfs) in postings.items():
+        order = np.argsort(term_ids, kind="stable")
+        self._append_postings(term, np.asarray(term_ids, dtype=np.int64)[order], np.asarray(term_tfs, dtype=np.int64)[order])
+      self.conn.commit()
+
+      doc_ids = np.concatenate([self.doc_ids, new_ids])
+      doc_lengths = np.concatenate([self.doc_lengths, np.asarray(lengths, dtype=np.float64)])
+      order = np.argsort(doc_ids, kind="stable")
+      self.doc_ids, self.doc_lengths = doc_ids[order], doc_lengths[order]
+      self.length_norms = None
+
+      # Cached postings hold positions into doc_ids, which the new documents may have shifted
+      self.postings_cache.clear()
+      self.generation += 1
+
+  # Appends sorted postings to a term. They normally follow the term's existing ids, in which case only its
+  # last, partly filled block is rewritten; otherwise the whole list is merged and rewritten
+  def _append_postings(self, term: str, ids: np.ndarray, tfs: np.ndarray):
+    blocks = self._blocks(term)
+    first_block = len(blocks.numbers)
+    if first_block and ids[0] <= blocks.last_ids[-1]:
+      old_ids, old_tfs = self._decode(term, blocks.numbers)
+      ids, tfs = np.concatenate([old_ids, ids]), np.concatenate([old_tfs.astype(np.int64), tfs])
+      order = np.argsort(ids, kind="stable")
+      ids, tfs, first_block = ids[order], tfs[order], 0
+    elif first_block and blocks.counts[-1] < BLOCK_SIZE:
+      old_ids, old_tfs = self._decode(term, blocks.numbers[-1:])
+      ids, tfs = np.concatenate([old_ids, ids]), np.concatenate([old_tfs.astype(np.int64), tfs])
+      first_block -= 1
+
+    self.conn.execute(f"DELETE FROM {self.table_name}_blocks WHERE term = ? AND block >= ?", (term, first_block))
+    self.conn.executemany(
+      f"INSERT INTO {self.table_name}_blocks (term, block, first_id, last_id, count, max_tf, id_width, tf_width, data) "
+      "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+      [
+        (term, first_block + n, *encode_block(ids[start:start + BLOCK_SIZE], tfs[start:start + BLOCK_SIZE]))
+        for n, start in enumerate(range(0, len(ids), BLOCK_SIZE))
+      ]
+    )
+
+    # Drop everything cached about the term, it is reloaded on the next search
+    self.term_blocks.pop(term, None)
+    for number in range(first_block, max(len(blocks.numbers), first_block + math.ceil(len(ids) / BLOCK_SIZE))):
+      self.block_cache.pop((term, number), None)
+
+  def _blocks(self, term: str) -> _TermBlocks:
+    with self.lock:
+      blocks = self.term_blocks.get(term)
+      if blocks is None:
+        rows = self.conn.execute(
+          f"SELECT block, first_id, last_id, count, max_tf FROM {self.table_name}_blocks WHERE term = ? ORDER BY block", (term,)
+        ).fetchall()
+        blocks = self.term_blocks[term] = _TermBlocks(rows)
+      return blocks
+
+  # Decodes the given blocks of a term into one sorted (ids, tfs) pair, going to SQLite only for cache misses.
+  # The missing blocks are decoded outside the lock
+  def _decode(self, term: str, numbers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    decoded: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+    missing = []
+    with self.lock:
+      generation = self.generation
+      for number in numbers.tolist():
+        cached = self.block_cache.get((term, number))
+        if cached is None:
+          missing.append(number)
+        else:
+          self.block_cache.move_to_end((term, number))
+          decoded[number] = cached
+
+      rows = []
+      if missing:
+        placeholders = ",".join("?" for _ in missing)
+        rows = self.conn.execute(
+          f"SELECT block, first_id, count, id_width, tf_width, data FROM {self.table_name}_blocks "
+          f"WHERE term = ? AND block IN ({placeholders})", [term, *missing]
+        ).fetchall()
+
+    if rows:
+      fresh = {number: decode_block(first_id, count, id_width, tf_width, data)
+        for number, first_id, count, id_width, tf_width, data in rows}
+      decoded |= fresh
+      with self.lock:
+        if generation == self.generation:
+          for number, block in fresh.items():
+            self.block_cache[(term, number)] = block
+          while len(self.block_cache) > self.max_cached_blocks:
+            self.block_cache.popitem(last=False)
+
+    blocks = [decoded[number] for number in numbers.tolist()]
+    if not blocks:
+      return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    return np.concatenate([ids for ids, _ in blocks]), np.concatenate([tfs for _, tfs in blocks])
+
+  # Every block of a term decoded into sorted ids, tfs and the ids' positions in doc_ids, cached as a whole
+  # for the terms that are scanned in full
+  def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    with self.lock:
+      postings = self.postings_cache.get(term)
+      if postings is not None:
+        self.postings_cache.move_to_end(term)
+        return postings
+      generation, doc_ids = self.generation, self.doc_ids
+
+    ids, tfs = self._decode(term, self._blocks(term).numbers)
+    postings = (ids, tfs, np.searchsorted(doc_ids, ids))
+    with self.lock:
+      if generation == self.generation:
+        self.postings_cache[term] = postings
+        while len(self.postings_cache) > self.max_cached_terms:
+          self.postings_cache.popitem(last=False)
+    return postings
+
+  # BM25 length normalization of every document, in doc_ids order
+  def _length_norms(self) -> np.ndarray:
+    if self.length_norms is None or len(self.length_norms) != len(self.doc_ids):
+      average_length = max(float(self.doc_lengths.mean()), 1e-9)
+      self.length_norms = 1 - self.b + self.b * self.doc_lengths / average_length
+    return self.length_norms
+
+  def _idf(self, df: int, document_count: int) -> float:
+    return math.log(1 + (document_count - df + 0.5) / (df + 0.5))
+
+  def _term_weight(self, tfs: np.ndarray, length_norms: np.ndarray) -> np.ndarray:
+    return tfs * (self.k1 + 1) / (tfs + self.k1 * length_norms)
+
+  # BM25 contribution of a term to each candidate (sorted ids), decoding only the blocks whose id range
+  # covers a candidate
+  def _score_candidates(self, term: str, idf: float, candidates: np.ndarray, length_norms: np.ndarray) -> np.ndarray:
+    blocks = self._blocks(term)
+    block_of = np.searchsorted(blocks.last_ids, candidates)
+    inside = block_of < len(blocks.numbers)
+    inside[inside] = blocks.first_ids[block_of[inside]] <= candidates[inside]
+    needed = np.unique(block_of[inside])
+    if len(needed) == len(blocks.numbers):
+      ids, tfs, _ = self._postings(term)
+    else:
+      ids, tfs = self._decode(term, blocks.numbers[needed])
+
+    scores = np.zeros(len(candidates))
+    if len(ids):
+      positions = np.minimum(np.searchsorted(ids, candidates), len(ids) - 1)
+      found = ids[positions] == candidates
+      scores[found] = idf * self._term_weight(tfs[positions[found]], length_norms[found])
+    return scores
+
+  # Returns the k best documents for the query by BM25 score
+  def search(self, query: str, k: int) -> List[SemanticCandidate]:
+    if k < 1:
+      raise RuntimeError("K must be at least 1 for lexical search")
+
+    # doc_ids and the length norms are replaced rather than modified by add_documents, so a search can keep
+    # using the ones it started with. Documents added mid-search can still leave it with a mix of old and new
+    # postings, which is rare enough that the search is simply run again
+    while True:
+      with self.lock:
+        generation = self.generation
+        doc_ids = self.doc_ids
+        all_norms = self._length_norms() if len(doc_ids) else None
+      try:
+        results = self._search(query, k, doc_ids, all_norms)
+      except Exception:
+        if generation == self.generation:
+          raise
+        continue
+      if generation == self.generation:
+        return results
+
+  def _search(self, query: str, k: int, doc_ids: np.ndarray, all_norms: np.ndarray | None) -> List[SemanticCandidate]:
+    if all_norms is None:
+      return []
+    shortest_norm = float(all_norms.min())
+
+    # Upper bound of each term's contribution, from its largest term frequency in the shortest document
+    terms = []
+    for term in dict.fromkeys(tokenize(query)):
+      blocks = self._blocks(term)
+      if blocks.df:
+        idf = self._idf(blocks.df, len(doc_ids))
+        upper_bound = idf * float(self._term_weight(np.array([blocks.max_tf]), np.array([shortest_norm]))[0])
+        terms.append((upper_bound, term, idf))
+    terms.sort(key=lambda t: t[0], reverse=True)
+    if not terms:
+      return []
+
+    # MaxScore, first phase: the terms with the highest upper bounds are "essential" and every document
+    # containing one is a candidate. Their summed contributions are lower bounds of the candidates' final
+    # scores, so the kth of them is a safe threshold. Terms are added until the remaining ones together
+    # could no longer lift a document that contains none of the essential terms to that threshold
+    remaining = sum(upper_bound for upper_bound, _, _ in terms)
+    threshold = 0.0
+    essential_ids: List[np.ndarray] = []
+    essential_scores: List[np.ndarray] = []
+    essential = 0
+    while essential < len(terms) and remaining >= threshold:
+      upper_bound, term, idf = terms[essential]
+      ids, tfs, positions = self._postings(term)
+      essential_ids.append(ids)
+      essential_scores.append(idf * self._term_weight(tfs, all_norms[positions]))
+      essential += 1
+      remaining -= upper_bound
+
+      # A single posting list is already sorted and unique
+      if essential == 1:
+        candidates, scores = ids, essential_scores[0]
+      else:
+        candidates, inverse = np.unique(np.concatenate(essential_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(essential_scores))
+      threshold = self._kth(scores, k)
+
+    # Second phase: the other terms are only looked up for candidates that can still reach the threshold,
+    # which is raised (and the candidates pruned again) after every term
+    length_norms = all_norms[np.searchsorted(doc_ids, candidates)]
+    for upper_bound, term, idf in terms[essential:]:
+      keep = scores + remaining >= threshold
+      candidates, scores, length_norms = candidates[keep], scores[keep], length_norms[keep]
+      scores += self._score_candidates(term, idf, candidates, length_norms)
+      remaining -= upper_bound
+      threshold = self._kth(scores, k)
+
+    top = top_k_stable(scores, k)
+    return [{"id": int(candidates[i]), "score": float(scores[i])} for i in top if scores[i] > 0]
+
+  @staticmethod
+  def _kth(scores: np.ndarray, k: int) -> float:
+    return float(np.partition(scores, len(scores) - k)[len(scores) - k]) if len(scores) >= k else 0.0
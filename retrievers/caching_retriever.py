@@ -0,0 +1,153 @@
+from typing import List, Dict, Any, Tuple
+from collections import OrderedDict
+import json
+import threading
+import time
+import numpy as np
+from rag_types.vector import SemanticCandidate, MetadataFilter
+from rag_types.query import normalize_query
+from retrievers.retriever import Retriever
+from retrievers.semantic_retriever import SemanticRetriever
+from vector_stores.numpy_vector_store import NumpyVectorStore, normalize_rows
+
+# How many of the nearest cached queries are checked for a usable near-duplicate
+NEAR_DUPLICATE_CANDIDATES = 5
+
+class _Entry:
+  def __init__(self, key: Tuple[Any, ...], filter_key: str, slot: int, result: List[SemanticCandidate]):
+    self.key = key
+    self.filter_key = filter_key
+    self.slot = slot
+    self.result = result
+    self.created = time.monotonic()
+
+# Result cache in front of a SemanticRetriever. Repeated questions are answered from an in-memory LRU keyed
+# on the normalized queries. Rephrasings are answered when the embedding of their queries is within
+# similarity_threshold (cosine) of a cached one, found through a small NumpyVectorStore holding one vector per
+# cached entry. Only a real miss pays for the vector search. Entries expire after ttl_seconds, and invalidate()
+# (typically registered with IngestionPipeline.add_ingest_listener) drops everything once new vectors are written
+class CachingRetriever(Retriever):
+  def __init__(self, retriever: SemanticRetriever, max_entries: int = 1000, similarity_threshold: float = 0.95,
+      ttl_seconds: float | None = None):
+    if max_entries < 1:
+      raise RuntimeError("CachingRetriever requires max_entries of at least 1.")
+
+    self.retriever = retriever
+    self.max_entries = max_entries
+    self.similarity_threshold = similarity_threshold
+    self.ttl_seconds = ttl_seconds
+
+    self.entries: OrderedDict[Tuple[Any, ...], _Entry] = OrderedDict()
+
+    # Every entry owns a slot of the near-duplicate index, tagged with its filter and creation time so that
+    # lookups only rank live entries for the same filter. A freed slot is zeroed until the next entry takes it
+    self.index: NumpyVectorStore | None = None
+    self.entry_of_slot: Dict[int, _Entry] = {}
+    self.free_slots = list(range(max_entries - 1, -1, -1))
+
+    # Bumped by invalidate(), so results computed before an ingestion are never cached after it
+    self.generation = 0
+
+    self.exact_hits = 0
+    self.near_hits = 0
+    self.misses = 0
+    self.lock = threading.Lock()
+
+  def retrieve_candidates(self, queries: List[str], filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
+    if len(queries) == 0:
+      raise RuntimeError("No queries were provided to the CachingRetriever's retrieve_candidates method")
+
+    filter_key = json.dumps(filter, sort_keys=True)
+    key = (filter_key, *(normalize_query(query) for query in queries))
+
+    with self.lock:
+      generation = self.generation
+      entry = self._live(self.entries.get(key))
+      if entry is not None:
+        self.entries.move_to_end(key)
+        self.exact_hits += 1
+        return [dict(candidate) for candidate in entry.result] # type: ignore
+
+    # The queries are embedded once, for both the near-duplicate lookup and a possible search
+    query_vectors = np.asarray(self.retriever.embedder.embed_strings(queries), dtype=np.float32)
+    signature = normalize_rows(query_vectors.mean(axis=0, keepdims=True))[0]
+
+    with self.lock:
+      entry = self._nearest(signature, filter_key)
+      if entry is not None:
+        self.entries.move_to_end(entry.key)
+        self.near_hits += 1
+        return [dict(candidate) for candidate in entry.result] # type: ignore
+      self.misses += 1
+
+    result = self.retriever.retrieve_for_vectors(query_vectors, filter)
+
+    with self.lock:
+      if generation == self.generation:
+        self._insert(key, filter_key, signature, result)
+    return result
+
+  # Returns the entry if it exists and has not expired, dropping it if it has
+  def _live(self, entry: _Entry | None) -> _Entry | None:
+    if entry is None:
+      return None
+    if self.ttl_seconds is not None and time.monotonic() - entry.created > self.ttl_seconds:
+      self._remove(entry)
+      return None
+    return entry
+
+  # The most similar live entry for the same filter, if it is within the similarity threshold. Freed slots,
+  # expired entries and other filters are filtered out before the top candidates are taken
+  def _nearest(self, signature: np.ndarray, filter_key: str) -> _Entry | None:
+    if self.index is None or not self.entries:
+      return None
+    live_filter: MetadataFilter = {"filter": filter_key}
+    if self.ttl_seconds is not None:
+      live_filter["created"] = {"$gte": time.monotonic() - self.ttl_seconds}
+    for candidate in self.index.semantic_search(signature, NEAR_DUPLICATE_CANDIDATES, live_filter):
+      if candidate['score'] < self.similarity_threshold:
+        break
+      entry = self._live(self.entry_of_slot.get(candidate['id']))
+      if entry is not None and entry.filter_key == filter_key:
+        return entry
+    return None
+
+  def _insert(self, key: Tuple[Any, ...], filter_key: str, signature: np.ndarray, result: List[SemanticCandidate]):
+    if key in self.entries:
+      self._remove(self.entries[key])
+    while not self.free_slots:
+      self._remove(next(iter(self.entries.values())))
+
+    if self.index is None:
+      self.index = NumpyVectorStore(dimension=len(signature), initial_capacity=self.max_entries)
+    slot = self.free_slots.pop()
+    entry = _Entry(key, filter_key, slot, [dict(candidate) for candidate in result]) # type: ignore
+    self.index.store_embeddings([slot], signature.reshape(1, -1), [{"filter": filter_key, "created": entry.created}])
+    self.entries[key] = entry
+    self.entry_of_slot[slot] = entry
+
+  def _remove(self, entry: _Entry):
+    del self.entries[entry.key]
+    del self.entry_of_slot[entry.slot]
+    self.free_slots.append(entry.slot)
+    if self.index is not None:
+      self.index.store_embeddings([entry.slot], np.zeros((1, self.index.dimension), dtype=np.float32), [None]) # type: ignore
+
+  # Drops every cached result. The ids of the new vectors are accepted (so this can be registered as an
+  # ingestion listener) but not needed: any new vector can change any cached ranking
+  def invalidate(self, ids: List[int] | None = None):
+    with self.lock:
+      self.entries.clear()
+      self.entry_of_slot.clear()
+      self.free_slots = list(range(self.max_entries - 1, -1, -1))
+      self.index = None
+      self.generation += 1
+
+  @property
+  def hits(self) -> int:
+    return self.exact_hits + self.near_hits
+
+  @property
+  def hit_rate(self) -> float:
+    total = self.hits + self.misses
+    return self.hits / total if total else 0.0
@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+import numpy as np
+
+# Workers of the process-wide retrieval pool. Sub-queries are I/O bound (vector store round trips), so this
+# is sized for concurrency rather than for cores
+SHARED_EXECUTOR_WORKERS = 32
+
+_shared_executor: ThreadPoolExecutor | None = None
+_shared_executor_lock = threading.Lock()
+
+# Returns the long-lived pool shared by every retriever, so no call pays for creating and tearing down threads
+def get_shared_executor() -> ThreadPoolExecutor:
+  global _shared_executor
+  with _shared_executor_lock:
+    if _shared_executor is None:
+      _shared_executor = ThreadPoolExecutor(max_workers=SHARED_EXECUTOR_WORKERS, thread_name_prefix="retrieval")
+    return _shared_executor
+
+# Sliding window of recent call latencies, used to decide when a straggling call is worth hedging
+class LatencyTracker:
+  def __init__(self, window: int = 1000, min_samples: int = 20):
+    self.samples: deque[float] = deque(maxlen=window)
+    self.min_samples = min_samples
+    self.lock = threading.Lock()
+
+  def record(self, seconds: float):
+    with self.lock:
+      self.samples.append(seconds)
+
+  # The given percentile (0-100) of the recorded latencies, or None until there are enough samples to trust it
+  def percentile(self, percentile: float) -> float | None:
+    with self.lock:
+      if len(self.samples) < self.min_samples:
+        return None
+      return float(np.percentile(np.fromiter(self.samples, dtype=np.float64, count=len(self.samples)), percentile))
@@ -0,0 +1,102 @@
+from typing import List, Dict, Any, Callable
+import numpy as np
+from rag_types.vector import SemanticCandidate
+
+# Rank fusion for the candidate lists of multi-query and hybrid retrieval. The candidates of all lists are
+# flattened into arrays once, every id is mapped to a dense position, and the fused scores are accumulated
+# with a single bincount. The finalK best are then picked with a partition (O(n) plus O(k log k)) rather than
+# by sorting every candidate. The candidate returned for an id carries the best original score that id had
+# in any list. Zero lists fuse to nothing, and a single list is simply truncated
+
+class _Candidates:
+  def __init__(self, subresults: List[List[SemanticCandidate]], weights: List[float] | None):
+    if weights is not None and len(weights) != len(subresults):
+      raise RuntimeError("Fusion needs exactly one weight per candidate list")
+
+    lengths = np.array([len(subresult) for subresult in subresults], dtype=np.int64)
+    total = int(lengths.sum())
+    self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    # Dense position of every id, in first-seen order, and the position of each candidate's id
+    position_of_id: Dict[Any, int] = {}
+    self.positions = np.fromiter(
+      (position_of_id.setdefault(candidate['id'], len(position_of_id)) for subresult in subresults for candidate in subresult),
+      dtype=np.int64, count=total)
+    self.ids = list(position_of_id)
+    self.scores = np.fromiter((candidate['score'] for subresult in subresults for candidate in subresult),
+      dtype=np.float64, count=total)
+
+    # Which list each candidate came from, its rank within that list and that list's weight
+    self.list_of = np.repeat(np.arange(len(subresults)), lengths)
+    self.ranks = np.arange(total) - np.repeat(self.offsets[:-1], lengths)
+    self.weights = np.ones(total) if weights is None else np.asarray(weights, dtype=np.float64)[self.list_of]
+
+  # Sums each candidate's contribution into its id
+  def accumulate(self, contributions: np.ndarray) -> np.ndarray:
+    return np.bincount(self.positions, weights=contributions, minlength=len(self.ids))
+
+  # Number of lists each id appears in
+  def appearances(self) -> np.ndarray:
+    return np.bincount(self.positions, minlength=len(self.ids))
+
+  # The finalK ids with the highest fused score, each with its best original score
+  def top(self, fused: np.ndarray, finalK: int) -> List[SemanticCandidate]:
+    best = np.full(len(self.ids), -np.inf)
+    np.maximum.at(best, self.positions, self.scores)
+    return [{"id": self.ids[i], "score": float(best[i])} for i in top_k_stable(fused, finalK)]
+
+# Indices of the k largest values, best first, with ties kept in index (first-seen) order. Everything above
+# the kth value is taken, then as many of the values equal to it as still fit
+def top_k_stable(values: np.ndarray, k: int) -> np.ndarray:
+  if k >= len(values):
+    return np.argsort(-values, kind="stable")
+  if k <= 0:
+    return np.empty(0, dtype=np.int64)
+  threshold = np.partition(values, len(values) - k)[len(values) - k]
+  above = np.flatnonzero(values > threshold)
+  selected = np.concatenate([above, np.flatnonzero(values == threshold)[:k - len(above)]])
+  return selected[np.argsort(-values[selected], kind="stable")]
+
+# Reciprocal rank fusion: every list adds weight / (c + rank) to each of its candidates, so only ranks
+# matter and lists whose scores live on different scales (cosine, BM25) can be mixed freely
+def rrf(subresults: List[List[SemanticCandidate]], finalK: int, c: int = 60, weights: List[float] | None = None) -> List[SemanticCandidate]:
+  candidates = _Candidates(subresults, weights)
+  return candidates.top(candidates.accumulate(candidates.weights / (c + candidates.ranks + 1)), finalK)
+
+# Min-max normalizes the scores of one list to [0, 1], so lists on different scales can be summed. A list
+# whose scores are all equal normalizes to all ones
+def normalize_scores(scores: np.ndarray) -> np.ndarray:
+  if len(scores) == 0:
+    return scores
+  low, high = scores.min(), scores.max()
+  if high == low:
+    return np.ones_like(scores)
+  return (scores - low) / (high - low)
+
+def _comb(candidates: _Candidates) -> np.ndarray:
+  normalized = np.empty_like(candidates.scores)
+  for start, end in zip(candidates.offsets[:-1], candidates.offsets[1:]):
+    normalized[start:end] = normalize_scores(candidates.scores[start:end])
+  return candidates.accumulate(normalized * candidates.weights)
+
+# CombSUM: the (weighted) sum of each id's normalized scores over the lists it appears in
+def comb_sum(subresults: List[List[SemanticCandidate]], finalK: int, weights: List[float] | None = None) -> List[SemanticCandidate]:
+  candidates = _Candidates(subresults, weights)
+  return candidates.top(_comb(candidates), finalK)
+
+# CombMNZ: CombSUM multiplied by the number of lists the id appears in, which rewards agreement between lists
+def comb_mnz(subresults: List[List[SemanticCandidate]], finalK: int, weights: List[float] | None = None) -> List[SemanticCandidate]:
+  candidates = _Candidates(subresults, weights)
+  return candidates.top(_comb(candidates) * candidates.appearances(), finalK)
+
+FUSIONS: Dict[str, Callable[..., List[SemanticCandidate]]] = {
+  "rrf": rrf,
+  "comb_sum": comb_sum,
+  "comb_mnz": comb_mnz,
+}
+
+# Fuses with the named method ("rrf", "comb_sum" or "comb_mnz")
+def fuse(subresults: List[List[SemanticCandidate]], finalK: int, method: str = "rrf", weights: List[float] | None = None) -> List[SemanticCandidate]:
+  if method not in FUSIONS:
+    raise RuntimeError(f"Unknown fusion method {method}, expected one of {', '.join(FUSIONS)}")
+  return FUSIONS[method](subresults, finalK, weights=weights)
@@ -0,0 +1,51 @@
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from rag_types.vector import SemanticCandidate
+from retrievers.retriever import Retriever
+from retrievers.fusion import fuse
+
+# Runs several retrievers (typically a SemanticRetriever and a LexicalRetriever) concurrently on the same
+# queries and fuses their candidate lists, by default with weighted RRF so that cosine and BM25 scores
+# never have to be compared directly
+class HybridRetriever(Retriever):
+  def __init__(self, retrievers: List[Retriever], finalK: int = 3, weights: List[float] | None = None, method: str = "rrf"):
+    if len(retrievers) == 0:
+      raise RuntimeError("HybridRetriever requires at least one retriever.")
+    if weights is not None and len(weights) != len(retrievers):
+      raise RuntimeError("HybridRetriever needs exactly one weight per retriever.")
+
+    self.retrievers = retrievers
+    self.finalK = finalK
+    self.weights = weights
+    self.method = method
+
+    # One long-lived thread per retriever, reused by every call
+    self.executor = ThreadPoolExecutor(max_workers=len(retrievers))
+
+  def retrieve_candidates(self, queries: List[str]) -> List[SemanticCandidate]:
+    if len(queries) == 0:
+      raise RuntimeError("No queries were provided to the HybridRetriever's retrieve_candidates method")
+
+    futures = [self.executor.submit(retriever.retrieve_candidates, queries) for retriever in self.retrievers]
+    return fuse([future.result() for future in futures], self.finalK, self.method, self.weights)
+
+  # Each query's candidates fused across the retrievers, keeping every candidate any of them found
+  def retrieve_subresults(self, queries: List[str]) -> List[List[SemanticCandidate]]:
+    if len(queries) == 0:
+      raise RuntimeError("No queries were provided to the HybridRetriever's retrieve_subresults method")
+
+    futures = [self.executor.submit(retriever.retrieve_subresults, queries) for retriever in self.retrievers]
+    per_retriever = [future.result() for future in futures]
+    fused = []
+    for i in range(len(queries)):
+      lists = [subresults[i] for subresults in per_retriever]
+      fused.append(fuse(lists, sum(len(candidates) for candidates in lists), self.method, self.weights))
+    return fused
+
+  async def retrieve_candidates_async(self, queries: List[str]) -> List[SemanticCandidate]:
+    if len(queries) == 0:
+      raise RuntimeError("No queries were provided to the HybridRetriever's retrieve_candidates_async method")
+
+    subresults = await asyncio.gather(*(retriever.retrieve_candidates_async(queries) for retriever in self.retrievers))
+    return fuse(list(subresults), self.finalK, self.method, self.weights)
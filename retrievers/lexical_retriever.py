@@ -0,0 +1,28 @@
+from typing import List
+from rag_types.vector import SemanticCandidate
+from retrievers.retriever import Retriever, rrf
+from retrievers.bm25_index import BM25Index
+
+# Retrieves chunks by BM25 over their search text. It needs no embedding call, so exact-term queries
+# (identifiers, codes, table values) are answered locally in well under a millisecond
+class LexicalRetriever(Retriever):
+  def __init__(self, index: BM25Index, lexicalK: int = 10, finalK: int = 3):
+    self.index = index
+    self.perQueryK = lexicalK
+    self.finalK = finalK
+
+  def retrieve_candidates(self, queries: List[str]) -> List[SemanticCandidate]:
+    if len(queries) == 0:
+      raise RuntimeError("No queries were provided to the LexicalRetriever's retrieve_candidates method")
+
+    subresults = self.retrieve_subresults(queries)
+
+    # Perform RRF if there is more than one subresult
+    if len(subresults) == 1:
+      return subresults[0][:self.finalK]
+    else:
+      return rrf(subresults, self.finalK)
+
+  # Each query's top lexicalK, unfused
+  def retrieve_subresults(self, queries: List[str]) -> List[List[SemanticCandidate]]:
+    return [self.index.search(query, self.perQueryK) for query in queries]
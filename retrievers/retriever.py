@@ -1,30 +1,21 @@
 from abc import ABC, abstractmethod
 from typing import List
 from rag_types.vector import SemanticCandidate
-
-def rrf(subresults: List[List[SemanticCandidate]], finalK: int, c: int = 60) -> List[SemanticCandidate]:
-  if len(subresults) <= 1:
-    raise RuntimeError("We need at least 2 subresults to perform RRF")
-  
-  scores = {}
-
-  # Iterate through every candidate in every subresult
-  for subresult in subresults:
-    for rank, candidate in enumerate(subresult):
-      # Compute RRF score addition
-      additional_score = 1 / (c + rank + 1)
-
-      if candidate['id'] not in scores:
-        scores[candidate['id']] = [additional_score, candidate]
-      else:
-        scores[candidate['id']][0] += additional_score
-  
-  # Take the candidates with the finalK highest RRF scores
-  scored = [(tup[0], tup[1]) for tup in scores.values()]
-  scored.sort(key = lambda x: x[0], reverse = True)
-  return [candidate for _, candidate in scored[:finalK]]
+from retrievers.fusion import rrf # Re-exported: rrf used to live here
+import asyncio
 
 class Retriever(ABC):
   @abstractmethod
   def retrieve_candidates(self, queries: List[str]) -> List[SemanticCandidate]:
-    pass
\ No newline at end of file
+    pass
+
+  # One candidate list per query, unfused and as deep as the retriever searches each query, for callers that
+  # fuse across queries themselves (e.g. the QueryPipeline). The default retrieves each query on its own,
+  # so it is only finalK deep; retrievers with a per-query depth should override it
+  def retrieve_subresults(self, queries: List[str]) -> List[List[SemanticCandidate]]:
+    return [self.retrieve_candidates([query]) for query in queries]
+
+  # Async counterpart of retrieve_candidates. The default runs the synchronous method in a worker thread;
+  # retrievers built on async components should override it
+  async def retrieve_candidates_async(self, queries: List[str]) -> List[SemanticCandidate]:
+    return await asyncio.to_thread(self.retrieve_candidates, queries)
\ No newline at end of file
@@ -1,32 +1,200 @@
-from typing import List
-from rag_types.vector import SemanticCandidate
+from typing import List, Dict, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+import itertools
+import threading
+import time
+from rag_types.vector import SemanticCandidate, MetadataFilter, Vectors, VectorLike
 from retrievers.retriever import Retriever, rrf
+from retrievers.executor import get_shared_executor, LatencyTracker
 from vector_stores.vector_store import VectorStore
 from embedders.embedder import Embedder
-from concurrent.futures import ThreadPoolExecutor
-import itertools
+
+# Shortest wait before checking again whether queued sub-queries have started, so that a near-zero hedge delay
+# doesn't spin while they wait for a thread
+HEDGE_POLL_SECONDS = 0.005
 
 class SemanticRetriever(Retriever):
-  def __init__(self, vectorDb: VectorStore, embedder: Embedder, semanticK: int = 10, finalK: int = 3):
+  # With deadline_seconds set, a call returns whatever sub-queries finished in time, fused. With hedge_percentile
+  # set (e.g. 95), a sub-query still running after that percentile of recent sub-query latencies is sent again,
+  # and whichever copy answers first is used. At most max_in_flight_hedges hedges (counting abandoned stragglers
+  # that are still running) occupy the executor at once. Either option runs every sub-query as its own task on
+  # executor (the process-wide retrieval pool by default); without them the vector store gets one batched call
+  def __init__(self, vectorDb: VectorStore, embedder: Embedder, semanticK: int = 10, finalK: int = 3,
+      deadline_seconds: float | None = None, hedge_percentile: float | None = None, executor: ThreadPoolExecutor | None = None,
+      max_in_flight_hedges: int = 4):
     self.vectorDb = vectorDb
     self.embedder = embedder
     self.perQueryK = semanticK
     self.finalK = finalK
 
-  def retrieve_candidates(self, queries: List[str]) -> List[SemanticCandidate]:
+    self.deadline_seconds = deadline_seconds
+    self.hedge_percentile = hedge_percentile
+    self.executor = executor if executor is not None else get_shared_executor()
+    self.latencies = LatencyTracker()
+    self.deadlines_missed = 0
+    self.hedges_sent = 0
+
+    self.max_in_flight_hedges = max_in_flight_hedges
+    self.in_flight_hedges = 0
+    self.abandoned_stragglers = 0
+    self.lock = threading.Lock()
+
+  # Retrieves candidates for the queries, optionally restricted to vectors whose metadata matches filter
+  def retrieve_candidates(self, queries: List[str], filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
     # Check for no queries (makes no sense.. we can't retrieve for nothing)
     N = len(queries)
     if N == 0:
       raise RuntimeError("No queries were provided to the SemanticRetriever's retrieve_candidates method")
 
-    # Embed each query for vector search
+    # Embed each query for vector search (the deadline covers the embedding too)
+    start = time.monotonic()
+    queryVectors = self.embedder.embed_strings(queries)
+    return self.retrieve_for_vectors(queryVectors, filter, start)
+
+  # Retrieval for queries that are already embedded (e.g. by a cache in front of this retriever)
+  def retrieve_for_vectors(self, queryVectors: Vectors, filter: MetadataFilter | None = None, start: float | None = None) -> List[SemanticCandidate]:
+    return self._fuse(self._subresults_for_vectors(queryVectors, filter, start))
+
+  # Each query's top semanticK, unfused and in query order. A query that missed the deadline gets an empty list
+  def retrieve_subresults(self, queries: List[str], filter: MetadataFilter | None = None) -> List[List[SemanticCandidate]]:
+    if len(queries) == 0:
+      raise RuntimeError("No queries were provided to the SemanticRetriever's retrieve_subresults method")
+
+    start = time.monotonic()
     queryVectors = self.embedder.embed_strings(queries)
+    return self._subresults_for_vectors(queryVectors, filter, start)
+
+  def _subresults_for_vectors(self, queryVectors: Vectors, filter: MetadataFilter | None, start: float | None) -> List[List[SemanticCandidate]]:
+    if self.deadline_seconds is not None or self.hedge_percentile is not None:
+      return self._search_with_deadline(queryVectors, filter, time.monotonic() if start is None else start)
+
+    # Do retrieval for every query in one batched call (the vector store decides how to parallelize it)
+    return self.vectorDb.semantic_search_batch(queryVectors, self.perQueryK, filter)
+
+  # Runs one attempt of a sub-query. Its start time is recorded in started, so that hedging is judged on how
+  # long the attempt has actually been running rather than on time it spent queued behind other work
+  def _timed_search(self, queryVector: VectorLike, filter: MetadataFilter | None, started: Dict[int, float], attempt: int) -> List[SemanticCandidate]:
+    start = time.monotonic()
+    started[attempt] = start
+    result = self.vectorDb.semantic_search(queryVector, self.perQueryK, filter)
+    self.latencies.record(time.monotonic() - start)
+    return result
+
+  # Reserves one of the max_in_flight_hedges slots, which running hedges and abandoned stragglers share
+  def _reserve_hedge(self) -> bool:
+    with self.lock:
+      if self.in_flight_hedges + self.abandoned_stragglers >= self.max_in_flight_hedges:
+        return False
+      self.in_flight_hedges += 1
+      return True
+
+  def _release_hedge(self, _: Future):
+    with self.lock:
+      self.in_flight_hedges -= 1
+
+  # Gives up on an attempt. A queued attempt is cancelled outright, but a running one can't be stopped and
+  # keeps its thread until it returns, so it is counted against the hedge budget until then
+  def _abandon(self, future: Future):
+    if future.cancel():
+      return
+    with self.lock:
+      self.abandoned_stragglers += 1
+    future.add_done_callback(self._release_straggler)
+
+  def _release_straggler(self, _: Future):
+    with self.lock:
+      self.abandoned_stragglers -= 1
+
+  # Runs one task per sub-query on the shared executor and collects results until all are in or the deadline
+  # passes. An attempt that has been running for longer than the configured percentile of recent latencies is
+  # hedged once, as long as the hedge budget allows. Attempts still running at the deadline are abandoned
+  # (their results are discarded) and their sub-queries come back as empty lists
+  def _search_with_deadline(self, queryVectors: Vectors, filter: MetadataFilter | None, start: float) -> List[List[SemanticCandidate]]:
+    deadline = None if self.deadline_seconds is None else start + self.deadline_seconds
+    hedge_delay = None if self.hedge_percentile is None else self.latencies.percentile(self.hedge_percentile)
+
+    results: List[List[SemanticCandidate] | None] = [None] * len(queryVectors)
+    started: Dict[int, float] = {}
+    attempts = itertools.count()
+    pending: Dict[Future, Tuple[int, int]] = {} # attempt future -> (sub-query, attempt)
+    hedges: Set[Future] = set()
+    hedged: Set[int] = set()
+
+    # Losing hedges are just cancelled, they already hold a hedge slot until they finish
+    def discard(future: Future):
+      if future in hedges:
+        future.cancel()
+      else:
+        self._abandon(future)
+
+    def submit(i: int) -> Future:
+      attempt = next(attempts)
+      future = self.executor.submit(self._timed_search, queryVectors[i], filter, started, attempt)
+      pending[future] = (i, attempt)
+      return future
+
+    for i in range(len(queryVectors)):
+      submit(i)
+
+    while pending:
+      # Wake up for the deadline and for the next attempt that may need a hedge. An attempt that hasn't
+      # started yet can't need one sooner than hedge_delay from now
+      now = time.monotonic()
+      wakeups = [] if deadline is None else [deadline]
+      if hedge_delay is not None and self.in_flight_hedges + self.abandoned_stragglers < self.max_in_flight_hedges:
+        wakeups += [started[attempt] + hedge_delay if attempt in started else now + max(hedge_delay, HEDGE_POLL_SECONDS)
+          for i, attempt in pending.values() if i not in hedged]
+      done, _ = wait(pending, timeout=max(0.0, min(wakeups) - now) if wakeups else None, return_when=FIRST_COMPLETED)
+
+      for future in done:
+        i, _ = pending.pop(future)
+        error = future.exception()
+        if error is None and results[i] is None:
+          results[i] = future.result()
+        elif error is not None and all(other != i for other, _ in pending.values()) and results[i] is None:
+          # Only fail when no other copy of this sub-query can still answer it
+          raise error
+
+      # Drop the copies of sub-queries that have already been answered
+      for future in [future for future, (i, _) in pending.items() if results[i] is not None]:
+        del pending[future]
+        discard(future)
+
+      now = time.monotonic()
+      if deadline is not None and now >= deadline and pending:
+        self.deadlines_missed += 1
+        break
+      if hedge_delay is None:
+        continue
+      for i, attempt in list(pending.values()):
+        attempt_start = started.get(attempt)
+        if i in hedged or attempt_start is None or now - attempt_start < hedge_delay:
+          continue
+        if not self._reserve_hedge():
+          break
+        hedged.add(i)
+        hedge = submit(i)
+        hedges.add(hedge)
+        hedge.add_done_callback(self._release_hedge)
+        self.hedges_sent += 1
+
+    for future in pending:
+      discard(future)
+    return [result if result is not None else [] for result in results]
+
+  # Same as retrieve_candidates, but awaits the embedder and vector store instead of blocking a thread
+  async def retrieve_candidates_async(self, queries: List[str], filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
+    if len(queries) == 0:
+      raise RuntimeError("No queries were provided to the SemanticRetriever's retrieve_candidates_async method")
 
-    # For each query, do retrieval (in parallel to reduce number of network RTT's)
-    with ThreadPoolExecutor(max_workers=N) as ex:
-      subresults = list(ex.map(self.vectorDb.semantic_search, queryVectors, itertools.repeat(self.perQueryK)))
+    queryVectors = await self.embedder.embed_strings_async(queries)
+    subresults = await self.vectorDb.semantic_search_batch_async(queryVectors, self.perQueryK, filter)
+    return self._fuse(subresults)
 
-    # Perform RRF if there is more than one subresult
+  def _fuse(self, subresults: List[List[SemanticCandidate]]) -> List[SemanticCandidate]:
+    # Perform RRF if there is more than one subresult (a deadline can leave none at all)
+    if len(subresults) == 0:
+      return []
     if len(subresults) == 1:
       return subresults[0][:self.finalK]
     else:
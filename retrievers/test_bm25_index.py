@@ -0,0 +1,114 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import random
+import tempfile
+import unittest
+import numpy as np
+from retrievers.bm25_index import BM25Index, BLOCK_SIZE, encode_block, decode_block, tokenize
+
+# Exhaustive BM25 over every document, the ground truth for the pruned search
+def brute_force_bm25(documents, query, k, k1=1.2, b=0.75):
+  tokens = {id: tokenize(text) for id, text in documents.items()}
+  average_length = np.mean([len(t) for t in tokens.values()])
+  df = Counter(term for t in tokens.values() for term in set(t))
+  scored = []
+  for id, doc_tokens in tokens.items():
+    tf = Counter(doc_tokens)
+    score = 0.0
+    for term in dict.fromkeys(tokenize(query)):
+      if tf[term]:
+        idf = math.log(1 + (len(documents) - df[term] + 0.5) / (df[term] + 0.5))
+        score += idf * tf[term] * (k1 + 1) / (tf[term] + k1 * (1 - b + b * len(doc_tokens) / average_length))
+    if score > 0:
+      scored.append((-score, id))
+  scored.sort()
+  return [id for _, id in scored[:k]]
+
+class TestBM25Index(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+    self.db_name = os.path.join(self.directory.name, "bm25.db")
+
+    # Zipf-like vocabulary so some terms have long posting lists spanning many blocks
+    rng = random.Random(0)
+    vocabulary = [f"term{i}" for i in range(300)]
+    weights = [1 / (i + 1) for i in range(300)]
+    self.documents = {id: " ".join(rng.choices(vocabulary, weights=weights, k=rng.randint(3, 30))) for id in range(1, 2001)}
+
+  def test_block_round_trip(self):
+    ids = np.array([3, 4, 300, 70000, 70001], dtype=np.int64)
+    tfs = np.array([1, 2, 1, 900, 1], dtype=np.int64)
+    first_id, _, count, max_tf, id_width, tf_width, data = encode_block(ids, tfs)
+    decoded_ids, decoded_tfs = decode_block(first_id, count, id_width, tf_width, data)
+    self.assertEqual(decoded_ids.tolist(), ids.tolist())
+    self.assertEqual(decoded_tfs.tolist(), tfs.tolist())
+    self.assertEqual(max_tf, 900)
+    self.assertLess(len(data), ids.nbytes + tfs.nbytes)
+
+  def test_pruned_search_matches_exhaustive_bm25(self):
+    # Arrange: Ingest in several batches, as separate ingestions would
+    index = BM25Index(self.db_name)
+    ids = list(self.documents)
+    for start in range(0, len(ids), 500):
+      index.add_documents(ids[start:start + 500], [self.documents[id] for id in ids[start:start + 500]])
+
+    # Act & Assert
+    for query in ["term0 term1 term250", "term299", "term5 term6 term7 term0", "missing words"]:
+      for k in (1, 10):
+        self.assertEqual([c['id'] for c in index.search(query, k)], brute_force_bm25(self.documents, query, k), query)
+
+  def test_out_of_order_ids_are_merged(self):
+    # Arrange: Later batches use lower ids than earlier ones
+    index = BM25Index(self.db_name)
+    ids = list(self.documents)[::-1]
+    for start in range(0, len(ids), 700):
+      index.add_documents(ids[start:start + 700], [self.documents[id] for id in ids[start:start + 700]])
+
+    # Act & Assert
+    self.assertEqual([c['id'] for c in index.search("term3 term40", 5)], brute_force_bm25(self.documents, "term3 term40", 5))
+    self.assertGreater(index._blocks("term0").df, BLOCK_SIZE)
+
+  def test_searches_concurrent_with_ingestion_stay_exact(self):
+    # Arrange: Half the documents indexed up front, the rest added while searches are running
+    index = BM25Index(self.db_name)
+    ids = list(self.documents)
+    index.add_documents(ids[:1000], [self.documents[id] for id in ids[:1000]])
+    queries = ["term0 term1 term250", "term5 term6 term7 term0", "term299"]
+
+    def search_repeatedly():
+      for _ in range(20):
+        for query in queries:
+          index.search(query, 10)
+
+    # Act
+    with ThreadPoolExecutor(max_workers=4) as executor:
+      searches = [executor.submit(search_repeatedly) for _ in range(4)]
+      for start in range(1000, len(ids), 100):
+        index.add_documents(ids[start:start + 100], [self.documents[id] for id in ids[start:start + 100]])
+      for search in searches:
+        search.result()
+
+    # Assert: Nothing decoded mid-ingestion was cached, so the final results are exact
+    for query in queries:
+      self.assertEqual([c['id'] for c in index.search(query, 10)], brute_force_bm25(self.documents, query, 10), query)
+
+  def test_index_persists_across_instances(self):
+    BM25Index(self.db_name).add_documents([7, 8], ["invoice INV-2291 overdue", "quarterly revenue table"])
+    results = BM25Index(self.db_name).search("INV-2291", 3)
+    self.assertEqual([c['id'] for c in results], [7])
+
+  def test_ids_can_only_be_added_once(self):
+    index = BM25Index(self.db_name)
+    index.add_documents([1], ["hello"])
+    with self.assertRaises(RuntimeError):
+      index.add_documents([1], ["hello again"])
+
+  def test_empty_index_returns_nothing(self):
+    self.assertEqual(BM25Index(self.db_name).search("anything", 3), [])
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+from retrievers.caching_retriever import CachingRetriever
+from retrievers.semantic_retriever import SemanticRetriever
+
+# Embeds each query as a fixed unit vector from this table, so similarity between queries is controlled
+VECTORS = {
+  "what is rag": [1.0, 0.0, 0.0],
+  "what's rag": [0.99, 0.14, 0.0],
+  "how do i bake bread": [0.0, 0.0, 1.0],
+}
+
+class TestCachingRetriever(unittest.TestCase):
+
+  def setUp(self):
+    self.embedder = MagicMock()
+    self.embedder.embed_strings.side_effect = lambda queries: np.array([VECTORS[q.lower()] for q in queries], dtype=np.float32)
+    self.vector_db = MagicMock()
+    self.vector_db.semantic_search_batch.side_effect = lambda vectors, k, filter: [[{"id": int(v.argmax()), "score": 1.0}] for v in vectors]
+    self.retriever = SemanticRetriever(self.vector_db, self.embedder, semanticK=5, finalK=3)
+
+  def test_exact_repeats_skip_embedding_and_search(self):
+    # Arrange
+    cache = CachingRetriever(self.retriever)
+    first = cache.retrieve_candidates(["What is RAG"])
+
+    # Act: Same question with different casing and spacing
+    second = cache.retrieve_candidates(["  what   is rag "])
+
+    # Assert
+    self.assertEqual(second, first)
+    self.assertEqual(self.embedder.embed_strings.call_count, 1)
+    self.assertEqual(self.vector_db.semantic_search_batch.call_count, 1)
+    self.assertEqual((cache.exact_hits, cache.near_hits, cache.misses), (1, 0, 1))
+
+  def test_near_duplicates_within_threshold_are_served_from_cache(self):
+    # Arrange
+    cache = CachingRetriever(self.retriever, similarity_threshold=0.95)
+    cache.retrieve_candidates(["what is rag"])
+
+    # Act
+    cache.retrieve_candidates(["what's rag"])
+    cache.retrieve_candidates(["how do I bake bread"])
+
+    # Assert: The rephrasing is embedded but not searched, the unrelated question is a miss
+    self.assertEqual(self.embedder.embed_strings.call_count, 3)
+    self.assertEqual(self.vector_db.semantic_search_batch.call_count, 2)
+    self.assertEqual((cache.exact_hits, cache.near_hits, cache.misses), (0, 1, 2))
+    self.assertAlmostEqual(cache.hit_rate, 1 / 3)
+
+  def test_near_duplicates_need_the_same_filter(self):
+    cache = CachingRetriever(self.retriever)
+    cache.retrieve_candidates(["what is rag"], filter={"tenant": "acme"})
+    cache.retrieve_candidates(["what's rag"], filter={"tenant": "globex"})
+    self.assertEqual(cache.near_hits, 0)
+    self.assertEqual(self.vector_db.semantic_search_batch.call_count, 2)
+
+  def test_entries_expire_after_ttl(self):
+    cache = CachingRetriever(self.retriever, ttl_seconds=10)
+    with patch('retrievers.caching_retriever.time.monotonic', return_value=100.0):
+      cache.retrieve_candidates(["what is rag"])
+    with patch('retrievers.caching_retriever.time.monotonic', return_value=111.0):
+      cache.retrieve_candidates(["what is rag"])
+    self.assertEqual(cache.misses, 2)
+
+  def test_dead_entries_and_other_filters_do_not_crowd_out_a_near_duplicate(self):
+    # Arrange: More expired and other-filter entries than the lookup checks, all closer than the live one
+    cache = CachingRetriever(self.retriever, ttl_seconds=50)
+    with patch('retrievers.caching_retriever.time.monotonic', return_value=100.0):
+      for tenant in range(6):
+        cache.retrieve_candidates(["what's rag"], filter={"tenant": tenant})
+    with patch('retrievers.caching_retriever.time.monotonic', return_value=200.0):
+      for tenant in range(6, 12):
+        cache.retrieve_candidates(["what's rag"], filter={"tenant": tenant})
+      cache.retrieve_candidates(["what is rag"], filter={"tenant": "acme"})
+
+      # Act
+      cache.retrieve_candidates(["what's rag"], filter={"tenant": "acme"})
+
+    # Assert
+    self.assertEqual(cache.near_hits, 1)
+
+  def test_least_recently_used_entries_are_evicted(self):
+    # Arrange
+    cache = CachingRetriever(self.retriever, max_entries=1)
+    cache.retrieve_candidates(["what is rag"])
+
+    # Act
+    cache.retrieve_candidates(["how do I bake bread"])
+    cache.retrieve_candidates(["what is rag"])
+
+    # Assert
+    self.assertEqual(cache.misses, 3)
+    self.assertEqual(len(cache.entries), 1)
+
+  def test_invalidate_drops_everything(self):
+    cache = CachingRetriever(self.retriever)
+    cache.retrieve_candidates(["what is rag"])
+    cache.invalidate([42])
+    cache.retrieve_candidates(["what is rag"])
+    self.assertEqual(cache.misses, 2)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+from retrievers.executor import get_shared_executor, LatencyTracker
+
+class TestExecutor(unittest.TestCase):
+
+  def test_shared_executor_is_reused(self):
+    self.assertIs(get_shared_executor(), get_shared_executor())
+
+  def test_percentile_needs_enough_samples(self):
+    tracker = LatencyTracker(min_samples=3)
+    tracker.record(1.0)
+    self.assertIsNone(tracker.percentile(50))
+    tracker.record(2.0)
+    tracker.record(3.0)
+    self.assertEqual(tracker.percentile(50), 2.0)
+
+  def test_window_drops_old_samples(self):
+    tracker = LatencyTracker(window=2, min_samples=1)
+    for seconds in [10.0, 1.0, 1.0]:
+      tracker.record(seconds)
+    self.assertEqual(tracker.percentile(100), 1.0)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,69 @@
+from typing import List
+import unittest
+import numpy as np
+
+from rag_types.vector import SemanticCandidate
+from retrievers.fusion import rrf, comb_sum, comb_mnz, fuse, normalize_scores
+
+class TestFusion(unittest.TestCase):
+  def test_rrf_keeps_best_original_score_per_id(self):
+    # Arrange: id 1 scores 0.4 in one list and 0.9 in the other
+    subresults: List[List[SemanticCandidate]] = [
+      [{'id': 1, 'score': 0.4}, {'id': 2, 'score': 0.3}],
+      [{'id': 1, 'score': 0.9}],
+    ]
+
+    # Act & Assert
+    ranked = rrf(subresults, finalK = 2)
+    self.assertEqual(ranked, [{'id': 1, 'score': 0.9}, {'id': 2, 'score': 0.3}])
+
+  def test_rrf_weights_favour_a_list(self):
+    # Arrange
+    subresults: List[List[SemanticCandidate]] = [
+      [{'id': 1, 'score': 1.0}],
+      [{'id': 2, 'score': 1.0}],
+    ]
+
+    # Act & Assert: Unweighted ties keep first-seen order, a heavier second list wins
+    self.assertEqual([c['id'] for c in rrf(subresults, finalK = 2)], [1, 2])
+    self.assertEqual([c['id'] for c in rrf(subresults, finalK = 2, weights = [1.0, 2.0])], [2, 1])
+
+  def test_weights_must_match_lists(self):
+    with self.assertRaises(RuntimeError):
+      rrf([[], []], finalK = 1, weights = [1.0])
+
+  def test_ties_at_the_cutoff_keep_first_seen_order(self):
+    subresults: List[List[SemanticCandidate]] = [[{'id': i, 'score': 1.0}] for i in range(5)]
+    self.assertEqual([c['id'] for c in rrf(subresults, finalK = 3)], [0, 1, 2])
+
+  def test_string_ids_are_supported(self):
+    ranked = rrf([[{'id': "a", 'score': 0.5}], [{'id': "b", 'score': 0.4}, {'id': "a", 'score': 0.6}]], finalK = 1)
+    self.assertEqual(ranked, [{'id': "a", 'score': 0.6}])
+
+  def test_normalize_scores(self):
+    self.assertEqual(normalize_scores(np.array([2.0, 4.0, 3.0])).tolist(), [0.0, 1.0, 0.5])
+    self.assertEqual(normalize_scores(np.array([5.0])).tolist(), [1.0])
+
+  def test_comb_sum_and_comb_mnz(self):
+    # Arrange: Cosine-scale and BM25-scale lists. Id 3 is mediocre in both, id 1 and id 4 are each top of one list
+    subresults: List[List[SemanticCandidate]] = [
+      [{'id': 1, 'score': 0.9}, {'id': 3, 'score': 0.6}, {'id': 2, 'score': 0.5}],
+      [{'id': 4, 'score': 30.0}, {'id': 3, 'score': 20.0}, {'id': 5, 'score': 10.0}],
+    ]
+
+    # Act
+    summed = comb_sum(subresults, finalK = 2)
+    mnz = comb_mnz(subresults, finalK = 2)
+
+    # Assert: Normalized sums are 1 for ids 1 and 4 and 0.75 for id 3, but CombMNZ doubles id 3's for agreeing
+    self.assertEqual([c['id'] for c in summed], [1, 4])
+    self.assertEqual([c['id'] for c in mnz], [3, 1])
+
+  def test_fuse_dispatches_by_name(self):
+    subresults: List[List[SemanticCandidate]] = [[{'id': 1, 'score': 1.0}], [{'id': 2, 'score': 2.0}]]
+    self.assertEqual(fuse(subresults, 2, method = "comb_sum"), comb_sum(subresults, 2))
+    with self.assertRaises(RuntimeError):
+      fuse(subresults, 2, method = "borda")
+
+if __name__ == '__main__':
+  unittest.main()
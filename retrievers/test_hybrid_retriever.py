@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, AsyncMock, patch
+from pinecone import QueryResponse, ScoredVector
+from retrievers.hybrid_retriever import HybridRetriever
+from retrievers.semantic_retriever import SemanticRetriever
+from vector_stores.pinecone_vector_store import PineconeVectorStore
+
+class TestHybridRetriever(unittest.TestCase):
+
+  def test_results_of_every_retriever_are_fused(self):
+    # Arrange
+    semantic = MagicMock()
+    lexical = MagicMock()
+    semantic.retrieve_candidates.return_value = [{"id": 1, "score": 0.9}, {"id": 2, "score": 0.8}]
+    lexical.retrieve_candidates.return_value = [{"id": 2, "score": 12.0}, {"id": 3, "score": 7.0}]
+    retriever = HybridRetriever([semantic, lexical], finalK=2)
+
+    # Act
+    results = retriever.retrieve_candidates(["query"])
+
+    # Assert: Id 2 is in both lists and wins, keeping its best original score
+    semantic.retrieve_candidates.assert_called_once_with(["query"])
+    lexical.retrieve_candidates.assert_called_once_with(["query"])
+    self.assertEqual(results, [{"id": 2, "score": 12.0}, {"id": 1, "score": 0.9}])
+
+  def test_weights_favour_a_retriever(self):
+    semantic = MagicMock()
+    lexical = MagicMock()
+    semantic.retrieve_candidates.return_value = [{"id": 1, "score": 0.9}]
+    lexical.retrieve_candidates.return_value = [{"id": 3, "score": 7.0}]
+    retriever = HybridRetriever([semantic, lexical], finalK=1, weights=[1.0, 3.0])
+    self.assertEqual([c['id'] for c in retriever.retrieve_candidates(["query"])], [3])
+
+  @patch('vector_stores.pinecone_vector_store.Pinecone')
+  def test_string_ids_from_pinecone_fuse_with_integer_ids(self, mock_pinecone):
+    # Arrange: Pinecone answers with string ids, the lexical side with ints
+    mock_pinecone.return_value.list_indexes.return_value = [{"name": "test-index"}]
+    mock_pinecone.return_value.Index.return_value.query.return_value = QueryResponse(
+      matches=[ScoredVector(id="1", score=0.9), ScoredVector(id="2", score=0.8)], namespace="")
+    embedder = MagicMock()
+    embedder.embed_strings.return_value = [[1.0, 0.0]]
+    semantic = SemanticRetriever(PineconeVectorStore("key", "test-index", 2), embedder, finalK=2)
+    lexical = MagicMock()
+    lexical.retrieve_candidates.return_value = [{"id": 2, "score": 12.0}, {"id": 3, "score": 7.0}]
+    retriever = HybridRetriever([semantic, lexical], finalK=2)
+
+    # Act
+    results = retriever.retrieve_candidates(["query"])
+
+    # Assert: Id 2 is recognised as the same candidate on both sides
+    self.assertEqual(results, [{"id": 2, "score": 12.0}, {"id": 1, "score": 0.9}])
+
+  def test_async_retrieval_awaits_every_retriever(self):
+    semantic = MagicMock()
+    lexical = MagicMock()
+    semantic.retrieve_candidates_async = AsyncMock(return_value=[{"id": 1, "score": 0.9}])
+    lexical.retrieve_candidates_async = AsyncMock(return_value=[{"id": 1, "score": 3.0}])
+    retriever = HybridRetriever([semantic, lexical], finalK=3)
+    self.assertEqual(asyncio.run(retriever.retrieve_candidates_async(["query"])), [{"id": 1, "score": 3.0}])
+
+  def test_subresults_are_fused_per_query_without_truncation(self):
+    # Arrange
+    semantic = MagicMock()
+    lexical = MagicMock()
+    semantic.retrieve_subresults.return_value = [[{"id": 1, "score": 0.9}, {"id": 2, "score": 0.8}], [{"id": 5, "score": 0.7}]]
+    lexical.retrieve_subresults.return_value = [[{"id": 2, "score": 12.0}, {"id": 3, "score": 7.0}], []]
+    retriever = HybridRetriever([semantic, lexical], finalK=1)
+
+    # Act
+    subresults = retriever.retrieve_subresults(["q1", "q2"])
+
+    # Assert: One list per query, holding every candidate either retriever found for it
+    self.assertEqual([[c['id'] for c in candidates] for candidates in subresults], [[2, 1, 3], [5]])
+
+  def test_no_queries_throws_error(self):
+    with self.assertRaises(RuntimeError):
+      HybridRetriever([MagicMock()]).retrieve_candidates([])
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,25 @@
+import os
+import tempfile
+import unittest
+from retrievers.bm25_index import BM25Index
+from retrievers.lexical_retriever import LexicalRetriever
+
+class TestLexicalRetriever(unittest.TestCase):
+
+  def test_exact_identifiers_are_found(self):
+    with tempfile.TemporaryDirectory() as directory:
+      # Arrange
+      index = BM25Index(os.path.join(directory, "bm25.db"))
+      index.add_documents([1, 2, 3], ["error code E1234 on startup", "the printer is out of paper", "E9999 is unrelated"])
+      retriever = LexicalRetriever(index, lexicalK=5, finalK=1)
+
+      # Act & Assert
+      self.assertEqual([c['id'] for c in retriever.retrieve_candidates(["what does E1234 mean"])], [1])
+      self.assertEqual([c['id'] for c in retriever.retrieve_candidates(["E1234", "printer paper"])], [1])
+
+  def test_no_queries_throws_error(self):
+    with self.assertRaises(RuntimeError):
+      LexicalRetriever(None).retrieve_candidates([]) # type: ignore
+
+if __name__ == "__main__":
+  unittest.main()
@@ -25,14 +25,11 @@ class TestRRF(unittest.TestCase):
     ranked = rrf(subresults, finalK = 3)
     self.assertEqual(ranked, [])
 
-  def test_rrf_requires_multiple_subresults(self):
-    # Should throw an error with only one subarray
-    with self.assertRaises(RuntimeError):
-      rrf([[]], finalK = 2)
-
-    # Should throw an error with NO subarrays
-    with self.assertRaises(RuntimeError):
-      rrf([], finalK = 2)
+  def test_rrf_handles_one_or_zero_subresults(self):
+    # A single list is returned as is (truncated), and no lists fuse to nothing
+    single: List[SemanticCandidate] = [{'id': 1, 'score': 0.9}, {'id': 2, 'score': 0.8}, {'id': 3, 'score': 0.7}]
+    self.assertEqual(rrf([single], finalK = 2), single[:2])
+    self.assertEqual(rrf([], finalK = 2), [])
 
   def test_rrf_handles_empty_lists_and_truncates(self):
     # Arrange: When one list is empty, we should get all results from the other,
@@ -1,5 +1,9 @@
+import asyncio
+import threading
+import time
 import unittest
-from unittest.mock import MagicMock, patch, call
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, AsyncMock, patch
 
 from retrievers.semantic_retriever import SemanticRetriever
 
@@ -10,7 +14,7 @@ class TestSemanticRetriever(unittest.TestCase):
     embedder = MagicMock()
     vector_db = MagicMock()
     embedder.embed_strings.return_value = []
-    vector_db.semantic_search.return_value = []
+    vector_db.semantic_search_batch.return_value = []
 
     # Act (call with ONE query)
     retriever = SemanticRetriever(vector_db, embedder, semanticK=3, finalK=2)
@@ -20,7 +24,7 @@ class TestSemanticRetriever(unittest.TestCase):
 
     # Assert: none of the subfunctions should have been called
     embedder.embed_strings.assert_not_called()
-    vector_db.semantic_search.assert_not_called()
+    vector_db.semantic_search_batch.assert_not_called()
     mock_rrf.assert_not_called()
 
   def test_single_query_returns_top_k_without_rrf(self):
@@ -28,11 +32,11 @@ class TestSemanticRetriever(unittest.TestCase):
     embedder = MagicMock()
     vector_db = MagicMock()
     embedder.embed_strings.return_value = ["vec1"]
-    vector_db.semantic_search.return_value = [
+    vector_db.semantic_search_batch.return_value = [[
       {"id": 1, "score": 1.2},
       {"id": 2, "score": 1.2},
       {"id": 3, "score": 1.2},
-    ]
+    ]]
 
     # Act (call with ONE query)
     retriever = SemanticRetriever(vector_db, embedder, semanticK=3, finalK=2)
@@ -43,8 +47,8 @@ class TestSemanticRetriever(unittest.TestCase):
     # Assert
     mock_rrf.assert_not_called() # should get no RRF with one query
     embedder.embed_strings.assert_called_once_with(["q1"]) # should embed the query
-    vector_db.semantic_search.assert_called_once_with("vec1", 3) # should perform one semantic
-    # search for the one query with k = 3
+    vector_db.semantic_search_batch.assert_called_once_with(["vec1"], 3, None) # should perform one batched
+    # semantic search for the one query with k = 3
     self.assertEqual(result, [{"id": 1, "score": 1.2}, {"id": 2, "score": 1.2},]) # should simply
     # truncate to the top finalK = 2 because we only have one subquery
 
@@ -55,7 +59,7 @@ class TestSemanticRetriever(unittest.TestCase):
     embedder.embed_strings.return_value = ["v1", "v2"]
     result_q1 = [{"id": 1, "score": 1.2}, {"id": 2, "score": 1.2},]
     result_q2 = [{"id": 3, "score": 1.2}, {"id": 4, "score": 1.2}]
-    vector_db.semantic_search.side_effect = [result_q1, result_q2] # first call returns result_q1, second result_q2
+    vector_db.semantic_search_batch.return_value = [result_q1, result_q2] # one subresult per query
 
     # Act
     retriever = SemanticRetriever(vector_db, embedder, semanticK=2, finalK=1)
@@ -64,9 +68,9 @@ class TestSemanticRetriever(unittest.TestCase):
     with patch('retrievers.semantic_retriever.rrf', return_value=rrf_result) as mock_rrf:
       result = retriever.retrieve_candidates(["q1", "q2"]) # 2 queries
 
-    # Assert: Ensure we get 2 queries embedding, and the 2 embeddings passed into semantic search
+    # Assert: Ensure we get 2 queries embedding, and the 2 embeddings passed into one batched semantic search
     embedder.embed_strings.assert_called_once_with(["q1", "q2"])
-    vector_db.semantic_search.assert_has_calls([call("v1", 2), call("v2", 2)])
+    vector_db.semantic_search_batch.assert_called_once_with(["v1", "v2"], 2, None)
     mock_rrf.assert_called_once_with([result_q1, result_q2], 1) # And ensure rrf is called
     self.assertEqual(result, rrf_result)
 
@@ -78,7 +82,7 @@ class TestSemanticRetriever(unittest.TestCase):
     result_q1 = []
     result_q2 = [{"id": 1, "score": 1.1}]
     result_q3 = []
-    vector_db.semantic_search.side_effect = [result_q1, result_q2, result_q3]
+    vector_db.semantic_search_batch.return_value = [result_q1, result_q2, result_q3]
 
     # Act: semanticK=1, finalK=2, call with 3 queries
     retriever = SemanticRetriever(vector_db, embedder, semanticK=1, finalK=2)
@@ -91,6 +95,146 @@ class TestSemanticRetriever(unittest.TestCase):
     mock_rrf.assert_called_once_with([result_q1, result_q2, result_q3], 2)
     self.assertEqual(result, rrf_result)
 
+  def test_filter_is_passed_to_vector_store(self):
+    # Arrange
+    embedder = MagicMock()
+    vector_db = MagicMock()
+    embedder.embed_strings.return_value = ["v1"]
+    vector_db.semantic_search_batch.return_value = [[{"id": 1, "score": 1.0}]]
+    retriever = SemanticRetriever(vector_db, embedder, semanticK=2, finalK=1)
+
+    # Act
+    retriever.retrieve_candidates(["q1"], filter={"tenant": "acme"})
+
+    # Assert
+    vector_db.semantic_search_batch.assert_called_once_with(["v1"], 2, {"tenant": "acme"})
+
+  def test_async_retrieval_awaits_embedder_and_vector_store(self):
+    # Arrange
+    embedder = MagicMock()
+    vector_db = MagicMock()
+    embedder.embed_strings_async = AsyncMock(return_value=["v1", "v2"])
+    result_q1 = [{"id": 1, "score": 1.2}]
+    result_q2 = [{"id": 2, "score": 1.1}]
+    vector_db.semantic_search_batch_async = AsyncMock(return_value=[result_q1, result_q2])
+    retriever = SemanticRetriever(vector_db, embedder, semanticK=2, finalK=1)
+    rrf_result = [{"id": 1, "score": 1.2}]
+
+    # Act
+    with patch('retrievers.semantic_retriever.rrf', return_value=rrf_result) as mock_rrf:
+      result = asyncio.run(retriever.retrieve_candidates_async(["q1", "q2"]))
+
+    # Assert: the sync methods are never used
+    embedder.embed_strings_async.assert_awaited_once_with(["q1", "q2"])
+    vector_db.semantic_search_batch_async.assert_awaited_once_with(["v1", "v2"], 2, None)
+    embedder.embed_strings.assert_not_called()
+    mock_rrf.assert_called_once_with([result_q1, result_q2], 1)
+    self.assertEqual(result, rrf_result)
+
+  def test_async_no_queries_throws_error(self):
+    retriever = SemanticRetriever(MagicMock(), MagicMock())
+    with self.assertRaises(RuntimeError):
+      asyncio.run(retriever.retrieve_candidates_async([]))
+
+
+# Vector store whose searches take a scripted amount of time per query vector (one delay per call, in order)
+class SlowVectorStore:
+  def __init__(self, delays):
+    self.delays = {query: list(times) for query, times in delays.items()}
+    self.lock = threading.Lock()
+    self.calls = 0
+
+  def semantic_search(self, query, k, filter=None):
+    with self.lock:
+      self.calls += 1
+      delay = self.delays[query].pop(0) if len(self.delays[query]) > 1 else self.delays[query][0]
+    time.sleep(delay)
+    return [{"id": query, "score": 1.0}]
+
+class TestSemanticRetrieverDeadlines(unittest.TestCase):
+
+  def setUp(self):
+    self.embedder = MagicMock()
+    self.embedder.embed_strings.side_effect = lambda queries: list(queries)
+
+  def test_deadline_returns_fused_partial_results(self):
+    # Arrange: q2 takes far longer than the deadline
+    store = SlowVectorStore({"q1": [0.0], "q2": [2.0]})
+    retriever = SemanticRetriever(store, self.embedder, finalK=2, deadline_seconds=0.2)
+
+    # Act
+    start = time.monotonic()
+    result = retriever.retrieve_candidates(["q1", "q2"])
+
+    # Assert: Only q1's result, well before q2 would have finished
+    self.assertLess(time.monotonic() - start, 1.0)
+    self.assertEqual(result, [{"id": "q1", "score": 1.0}])
+    self.assertEqual(retriever.deadlines_missed, 1)
+
+  def test_all_results_are_fused_when_in_time(self):
+    store = SlowVectorStore({"q1": [0.0], "q2": [0.01]})
+    retriever = SemanticRetriever(store, self.embedder, finalK=2, deadline_seconds=5)
+    self.assertEqual(sorted(c['id'] for c in retriever.retrieve_candidates(["q1", "q2"])), ["q1", "q2"])
+    self.assertEqual(retriever.deadlines_missed, 0)
+
+  def test_stragglers_are_hedged_after_percentile_delay(self):
+    # Arrange: Recent latencies are ~10ms, and the first attempt of q1 straggles for 2s but a retry is fast
+    store = SlowVectorStore({"q1": [2.0, 0.0]})
+    retriever = SemanticRetriever(store, self.embedder, hedge_percentile=95)
+    for _ in range(50):
+      retriever.latencies.record(0.01)
+
+    # Act
+    start = time.monotonic()
+    result = retriever.retrieve_candidates(["q1"])
+
+    # Assert
+    self.assertLess(time.monotonic() - start, 1.0)
+    self.assertEqual(result, [{"id": "q1", "score": 1.0}])
+    self.assertEqual(retriever.hedges_sent, 1)
+    self.assertEqual(store.calls, 2)
+
+  def test_queued_sub_queries_are_not_hedged(self):
+    # Arrange: One worker, so q2 queues behind q1. Each takes 0.15s, under the 0.2s hedge delay, although q2
+    # only finishes 0.3s after it was submitted
+    store = SlowVectorStore({"q1": [0.15], "q2": [0.15]})
+    executor = ThreadPoolExecutor(max_workers=1)
+    self.addCleanup(executor.shutdown)
+    retriever = SemanticRetriever(store, self.embedder, finalK=2, hedge_percentile=95, executor=executor)
+    for _ in range(50):
+      retriever.latencies.record(0.2)
+
+    # Act
+    result = retriever.retrieve_candidates(["q1", "q2"])
+
+    # Assert
+    self.assertEqual(sorted(c['id'] for c in result), ["q1", "q2"])
+    self.assertEqual(retriever.hedges_sent, 0)
+    self.assertEqual(store.calls, 2)
+
+  def test_hedges_are_capped_including_abandoned_stragglers(self):
+    # Arrange: Every first attempt straggles. q1's hedge answers at once, but its abandoned first attempt keeps
+    # running for 0.5s and holds the only hedge slot, so q2 and q3 are left to finish on their own
+    store = SlowVectorStore({"q1": [0.5, 0.0], "q2": [0.3, 0.0], "q3": [0.3, 0.0]})
+    retriever = SemanticRetriever(store, self.embedder, finalK=3, hedge_percentile=95, max_in_flight_hedges=1)
+    for _ in range(50):
+      retriever.latencies.record(0.01)
+
+    # Act
+    result = retriever.retrieve_candidates(["q1", "q2", "q3"])
+
+    # Assert
+    self.assertEqual(sorted(c['id'] for c in result), ["q1", "q2", "q3"])
+    self.assertEqual(retriever.hedges_sent, 1)
+    self.assertEqual(retriever.abandoned_stragglers, 1)
+
+  def test_no_hedging_until_latencies_are_known(self):
+    store = SlowVectorStore({"q1": [0.05]})
+    retriever = SemanticRetriever(store, self.embedder, hedge_percentile=95)
+    retriever.retrieve_candidates(["q1"])
+    self.assertEqual(retriever.hedges_sent, 0)
+    self.assertEqual(store.calls, 1)
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,161 @@
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+from query_pipeline import QueryPipeline
+from retrievers.semantic_retriever import SemanticRetriever
+
+# Rewriter that streams its rewrites slowly. Like a real stream, cancelling closes it under the wait in progress
+class SlowRewriter:
+  def __init__(self, rewrites, delay):
+    self.rewrites = rewrites
+    self.delay = delay
+    self.started = threading.Event()
+    self.finished = threading.Event()
+
+  def stream_rewrite_query(self, query, cancellation=None):
+    self.started.set()
+    closed = threading.Event()
+    if cancellation is not None:
+      cancellation.register(closed.set)
+    try:
+      for rewritten in self.rewrites:
+        if closed.wait(self.delay):
+          return
+        yield rewritten
+    finally:
+      self.finished.set()
+
+class TestQueryPipeline(unittest.TestCase):
+
+  def setUp(self):
+    # Every query retrieves a single candidate whose id is the query text
+    self.retriever = MagicMock()
+    self.retriever.retrieve_subresults.side_effect = lambda queries: [[{"id": queries[0], "score": 1.0}]]
+    self.chunk_storage = MagicMock()
+    self.chunk_storage.retrieve_chunks.side_effect = lambda ids: [{"search_text": id} for id in ids]
+
+  def test_original_query_is_retrieved_before_rewrites_finish(self):
+    # Arrange
+    rewriter = SlowRewriter(["r1", "r2"], delay=0.3)
+    pipeline = QueryPipeline(rewriter, self.retriever, self.chunk_storage, finalK=5)
+
+    # Act
+    start = time.monotonic()
+    stream = pipeline.stream_candidates("q")
+    first = next(stream)
+    first_latency = time.monotonic() - start
+    rest = list(stream)
+
+    # Assert: The first candidates come from the original query, long before the rewriter is done
+    self.assertEqual(first, [{"id": "q", "score": 1.0}])
+    self.assertLess(first_latency, 0.3)
+    self.assertEqual(len(rest), 2)
+    self.assertEqual(sorted(c['id'] for c in rest[-1]), ["q", "r1", "r2"])
+
+  def test_query_fuses_and_returns_chunks_in_rank_order(self):
+    # Arrange: "shared" is retrieved for every query so it ranks first
+    self.retriever.retrieve_subresults.side_effect = lambda queries: [[{"id": "shared", "score": 0.5}, {"id": queries[0], "score": 0.9}]]
+    rewriter = MagicMock()
+    rewriter.stream_rewrite_query.return_value = iter(["r1", "r2"])
+    pipeline = QueryPipeline(rewriter, self.retriever, self.chunk_storage, finalK=2)
+
+    # Act
+    chunks = pipeline.query("q")
+
+    # Assert
+    self.assertEqual(self.retriever.retrieve_subresults.call_count, 3)
+    self.assertEqual(chunks[0], {"search_text": "shared"})
+    self.assertEqual(len(chunks), 2)
+
+  def test_queries_are_fused_over_their_full_depth(self):
+    # Arrange: Each query's best candidate is its own, but "shared" is third for both, past the retriever's finalK
+    vector_db = MagicMock()
+    vector_db.semantic_search_batch.side_effect = lambda queries, k, filter: [
+      [{"id": f"{query}-a", "score": 0.9}, {"id": f"{query}-b", "score": 0.8}, {"id": "shared", "score": 0.7}][:k] for query in queries]
+    embedder = MagicMock()
+    embedder.embed_strings.side_effect = lambda queries: list(queries)
+    retriever = SemanticRetriever(vector_db, embedder, semanticK=3, finalK=1)
+    rewriter = MagicMock()
+    rewriter.stream_rewrite_query.return_value = iter(["r1"])
+    pipeline = QueryPipeline(rewriter, retriever, self.chunk_storage, finalK=1)
+
+    # Act
+    chunks = pipeline.query("q")
+
+    # Assert: "shared" was only visible because the pipeline fused semanticK deep lists
+    self.assertEqual(chunks, [{"search_text": "shared"}])
+
+  def test_failed_rewrite_still_answers_the_original_query(self):
+    rewriter = MagicMock()
+    rewriter.stream_rewrite_query.side_effect = RuntimeError("LLM unavailable")
+    pipeline = QueryPipeline(rewriter, self.retriever, self.chunk_storage)
+    self.assertEqual(pipeline.query("q"), [{"search_text": "q"}])
+
+  def test_failed_rewrite_retrieval_is_dropped(self):
+    # Arrange: Retrieval fails only for the rewritten query r1
+    def retrieve(queries):
+      if queries[0] == "r1":
+        raise RuntimeError("vector store timeout")
+      return [[{"id": queries[0], "score": 1.0}]]
+    self.retriever.retrieve_subresults.side_effect = retrieve
+    rewriter = MagicMock()
+    rewriter.stream_rewrite_query.return_value = iter(["r1", "r2"])
+    pipeline = QueryPipeline(rewriter, self.retriever, self.chunk_storage, finalK=5)
+
+    # Act
+    with self.assertLogs("query_pipeline", level="WARNING"):
+      chunks = pipeline.query("q")
+
+    # Assert
+    self.assertEqual(sorted(chunk["search_text"] for chunk in chunks), ["q", "r2"])
+    self.assertEqual(pipeline.rewrites_completed, 1)
+
+  def test_original_query_retrieval_errors_are_raised(self):
+    self.retriever.retrieve_subresults.side_effect = RuntimeError("vector store down")
+    rewriter = MagicMock()
+    rewriter.stream_rewrite_query.return_value = iter([])
+    pipeline = QueryPipeline(rewriter, self.retriever, self.chunk_storage)
+    with self.assertRaises(RuntimeError):
+      pipeline.query("q")
+
+  def test_confident_original_query_skips_rewriting(self):
+    # Arrange: The rewriter would take 0.5s per rewrite, but the original query scores above the threshold
+    self.retriever.retrieve_subresults.side_effect = lambda queries: [[{"id": queries[0], "score": 0.9}]]
+    rewriter = SlowRewriter(["r1", "r2"], delay=0.5)
+    pipeline = QueryPipeline(rewriter, self.retriever, self.chunk_storage, finalK=1, skip_rewrite_score=0.8)
+    pipeline.rewritten_latency.record(1.0)
+
+    # Act
+    start = time.monotonic()
+    chunks = pipeline.query("q")
+    elapsed = time.monotonic() - start
+
+    # Assert: Answered from the original query alone, without waiting for the rewriter
+    self.assertEqual(chunks, [{"search_text": "q"}])
+    self.assertLess(elapsed, 0.4)
+    self.assertEqual(pipeline.rewrites_skipped, 1)
+    self.assertEqual(pipeline.skip_rate, 1.0)
+    self.assertGreater(pipeline.seconds_saved, 0.5)
+
+    # The gate closed the stream mid-read rather than waiting out the 0.5s until its next rewrite
+    self.assertTrue(rewriter.finished.wait(0.2))
+
+    # The cancelled stream sends no rewrite to retrieval
+    time.sleep(0.6)
+    self.assertEqual(self.retriever.retrieve_subresults.call_count, 1)
+
+  def test_unconfident_original_query_is_rewritten(self):
+    self.retriever.retrieve_subresults.side_effect = lambda queries: [[{"id": queries[0], "score": 0.5}]]
+    rewriter = MagicMock()
+    rewriter.stream_rewrite_query.return_value = iter(["r1"])
+    pipeline = QueryPipeline(rewriter, self.retriever, self.chunk_storage, finalK=2, skip_rewrite_score=0.8)
+
+    chunks = pipeline.query("q")
+
+    self.assertEqual(len(chunks), 2)
+    self.assertEqual(pipeline.rewrites_skipped, 0)
+    self.assertEqual(pipeline.rewrites_completed, 1)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,260 @@
+from typing import List, Tuple, Dict
+import heapq
+import math
+import random
+import numpy as np
+from vector_stores.numpy_vector_store import NumpyVectorStore
+from rag_types.vector import SemanticCandidate, Metadata, MetadataFilter, Vectors, VectorLike
+
+# Approximate nearest neighbour search over a Hierarchical Navigable Small World graph. Vectors are kept
+# in the same contiguous matrix as NumpyVectorStore (which also gives us exact search to measure recall
+# against), and every row additionally gets a list of neighbour rows on each of the graph levels it lives on
+class HNSWVectorStore(NumpyVectorStore):
+  def __init__(self, dimension: int, path: str | None = None, M: int = 16, ef_construction: int = 200,
+      ef_search: int = 64, seed: int | None = None, initial_capacity: int = 1024):
+    if M < 2:
+      raise RuntimeError("HNSWVectorStore requires M to be at least 2.")
+    if ef_construction < 1 or ef_search < 1:
+      raise RuntimeError("HNSWVectorStore requires ef_construction and ef_search to be at least 1.")
+
+    self.M = M
+    self.max_M0 = 2 * M # The bottom level is denser, as in the HNSW paper
+    self.ef_construction = ef_construction
+    self.ef_search = ef_search
+    self.level_multiplier = 1 / math.log(M)
+    self.rng = random.Random(seed)
+
+    # neighbours[row][level] is the list of neighbour rows of row on that level
+    self.neighbours: List[List[List[int]]] = []
+    self.entry_point: int | None = None
+    self.max_level = -1
+
+    super().__init__(dimension, path, initial_capacity)
+
+  def store_embeddings(self, ids: List[int], vectors: Vectors, metadata: List[Metadata] | None = None):
+    # Rows of ids that are already in the graph get new vectors, so their links are rebuilt after the write
+    overwritten = {self.row_of_id[int(id)] for id in ids if int(id) in self.row_of_id}
+    first_new_row = self.size
+    self._upsert_rows(ids, vectors, metadata)
+    for row in range(first_new_row, self.size):
+      self._insert(row)
+    if overwritten:
+      self._relink(overwritten)
+
+  def semantic_search(self, query: VectorLike, k: int, filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
+    # Filtered searches scan just the matching rows exactly. Walking the graph would waste most of its
+    # visits on rows the filter rejects, and the exact scan already costs only as much as the filter matches
+    if filter is not None:
+      return super().semantic_search(query, k, filter)
+
+    query_vector = self._prepare_query(query, k)
+    if self.entry_point is None:
+      return []
+
+    # Greedily descend the upper levels, then do a wide beam search on the bottom level
+    entry_rows = [self.entry_point]
+    for level in range(self.max_level, 0, -1):
+      entry_rows = [max(self._search_layer(query_vector, entry_rows, 1, level))[1]]
+    found = self._search_layer(query_vector, entry_rows, max(self.ef_search, k), 0)
+
+    return [{"id": int(self.ids[row]), "score": float(score)} for score, row in heapq.nlargest(k, found)]
+
+  # The graph is walked separately for every query, so skip NumpyVectorStore's exact batched product
+  def semantic_search_batch(self, queries: Vectors, k: int, filter: MetadataFilter | None = None) -> List[List[SemanticCandidate]]:
+    if filter is not None:
+      return super().semantic_search_batch(queries, k, filter)
+    return [self.semantic_search(query, k) for query in queries]
+
+  # Brute force search over the same vectors, used as ground truth for recall
+  def exact_search(self, query: VectorLike, k: int) -> List[SemanticCandidate]:
+    return super().semantic_search(query, k)
+
+  # Returns the mean fraction of the exact top k that the graph search also finds (recall@k), so that
+  # M, ef_construction and ef_search can be picked for a given corpus
+  def measure_recall(self, queries: Vectors, k: int) -> float:
+    if len(queries) == 0:
+      raise RuntimeError("measure_recall needs at least one query")
+
+    total = 0.0
+    for query in queries:
+      exact = {candidate['id'] for candidate in self.exact_search(query, k)}
+      if not exact:
+        total += 1.0
+        continue
+      approximate = {candidate['id'] for candidate in self.semantic_search(query, k)}
+      total += len(exact & approximate) / len(exact)
+    return total / len(queries)
+
+  # Draws a level from the exponentially decaying distribution used by HNSW
+  def _random_level(self) -> int:
+    return int(-math.log(1.0 - self.rng.random()) * self.level_multiplier)
+
+  # Links a row that has already been written to the matrix into the graph
+  def _insert(self, row: int):
+    level = self._random_level()
+    self.neighbours.append([[] for _ in range(level + 1)])
+
+    if self.entry_point is None:
+      self.entry_point = row
+      self.max_level = level
+      return
+
+    self._connect(row, level)
+    if level > self.max_level:
+      self.entry_point = row
+      self.max_level = level
+
+  # Rebuilds the links of rows whose vectors were overwritten. Links pointing at their old positions are
+  # dropped everywhere, then every row is connected again on the levels it already lives on, exactly like
+  # a fresh insert
+  def _relink(self, rows: set):
+    for node in self.neighbours:
+      for level, links in enumerate(node):
+        if any(link in rows for link in links):
+          node[level] = [link for link in links if link not in rows]
+
+    for row in sorted(rows):
+      if self.size > 1:
+        self._connect(row, len(self.neighbours[row]) - 1)
+
+  # Finds the neighbours of row on every level up to level and adds the links in both directions
+  def _connect(self, row: int, level: int):
+    vector = self.matrix[row]
+    entry_rows = [self.entry_point]
+
+    # Greedy descent through the levels above the new node's top level
+    for current_level in range(self.max_level, level, -1):
+      entry_rows = [max(self._search_layer(vector, entry_rows, 1, current_level))[1]]
+
+    # Connect the node on every level it lives on, from the top down. The walk can reach the row itself
+    # when it is being relinked, and a row is never its own neighbour
+    for current_level in range(min(level, self.max_level), -1, -1):
+      found = [(score, found_row) for score, found_row in
+        self._search_layer(vector, entry_rows, self.ef_construction, current_level) if found_row != row]
+      selected = self._select_neighbours(found, self.M)
+      self.neighbours[row][current_level] = selected
+
+      # Add the reverse links, pruning any neighbour that now has too many connections
+      max_connections = self.max_M0 if current_level == 0 else self.M
+      for neighbour in selected:
+        links = self.neighbours[neighbour][current_level]
+        links.append(row)
+        if len(links) > max_connections:
+          scores = self.matrix[links] @ self.matrix[neighbour]
+          self.neighbours[neighbour][current_level] = self._select_neighbours(
+            list(zip(scores.tolist(), links)), max_connections)
+
+      entry_rows = [found_row for _, found_row in found] or entry_rows
+
+  # Beam search on one level. Returns up to ef (score, row) pairs closest to the query, in no particular order
+  def _search_layer(self, query: np.ndarray, entry_rows: List[int], ef: int, level: int) -> List[Tuple[float, int]]:
+    visited = set(entry_rows)
+    entry_scores = (self.matrix[entry_rows] @ query).tolist()
+
+    # candidates is a max-heap on score (negated), results is a min-heap holding the best ef so far
+    candidates = [(-score, row) for score, row in zip(entry_scores, entry_rows)]
+    results = [(score, row) for score, row in zip(entry_scores, entry_rows)]
+    heapq.heapify(candidates)
+    heapq.heapify(results)
+    while len(results) > ef:
+      heapq.heappop(results)
+
+    while candidates:
+      negative_score, row = heapq.heappop(candidates)
+      if -negative_score < results[0][0] and len(results) >= ef:
+        break
+
+      unvisited = [neighbour for neighbour in self.neighbours[row][level] if neighbour not in visited]
+      if not unvisited:
+        continue
+      visited.update(unvisited)
+
+      # Score all unvisited neighbours with a single matrix-vector product
+      scores = (self.matrix[unvisited] @ query).tolist()
+      for score, neighbour in zip(scores, unvisited):
+        if len(results) < ef or score > results[0][0]:
+          heapq.heappush(candidates, (-score, neighbour))
+          heapq.heappush(results, (score, neighbour))
+          if len(results) > ef:
+            heapq.heappop(results)
+
+    return results
+
+  # Neighbour selection heuristic from the HNSW paper: found holds (similarity to the base vector, row)
+  # pairs, and we prefer candidates that are closer to the base vector than to any neighbour already
+  # picked, which keeps links spread out in different directions.
+  # Pruned candidates fill any remaining slots so that nodes stay well connected
+  def _select_neighbours(self, found: List[Tuple[float, int]], m: int) -> List[int]:
+    ordered = sorted(found, reverse=True)
+    if len(ordered) <= m:
+      return [row for _, row in ordered]
+
+    # Pairwise similarities between the candidates are computed once, and closest_selected[i] tracks
+    # candidate i's highest similarity to any neighbour picked so far
+    rows = [row for _, row in ordered]
+    pairwise = self.matrix[rows] @ self.matrix[rows].T
+    closest_selected = np.full(len(rows), -np.inf, dtype=np.float32)
+
+    selected: List[int] = []
+    pruned: List[int] = []
+    for i, (score, row) in enumerate(ordered):
+      if len(selected) >= m:
+        break
+      if closest_selected[i] > score:
+        pruned.append(row)
+      else:
+        selected.append(row)
+        np.maximum(closest_selected, pairwise[i], out=closest_selected)
+
+    for row in pruned:
+      if len(selected) >= m:
+        break
+      selected.append(row)
+    return selected
+
+  # Saves the graph alongside the vectors, with the adjacency lists flattened into offsets and links
+  def _archive_arrays(self) -> Dict[str, np.ndarray]:
+    levels = np.array([len(node) - 1 for node in self.neighbours], dtype=np.int64)
+    offsets = [0]
+    links: List[int] = []
+    for node in self.neighbours:
+      for level_links in node:
+        links.extend(level_links)
+        offsets.append(len(links))
+
+    return super()._archive_arrays() | {
+      "levels": levels,
+      "offsets": np.array(offsets, dtype=np.int64),
+      "links": np.array(links, dtype=np.int64),
+      "entry_point": np.array(-1 if self.entry_point is None else self.entry_point, dtype=np.int64),
+      "max_level": np.array(self.max_level, dtype=np.int64),
+    }
+
+  # Loads the vectors and graph. An archive written by a plain NumpyVectorStore has no graph, in which
+  # case the graph is rebuilt from the vectors
+  def load(self):
+    super().load()
+
+    with np.load(self.path) as archive:
+      if "levels" not in archive:
+        self.neighbours = []
+        self.entry_point = None
+        self.max_level = -1
+        for row in range(self.size):
+          self._insert(row)
+        return
+      levels = archive["levels"].tolist()
+      offsets = archive["offsets"].tolist()
+      links = archive["links"].tolist()
+      entry_point = int(archive["entry_point"])
+      self.max_level = int(archive["max_level"])
+
+    self.neighbours = []
+    position = 0
+    for level in levels:
+      node = []
+      for _ in range(level + 1):
+        node.append(links[offsets[position]:offsets[position + 1]])
+        position += 1
+      self.neighbours.append(node)
+    self.entry_point = None if entry_point < 0 else entry_point
@@ -0,0 +1,70 @@
+from typing import List
+import numpy as np
+from vector_stores.numpy_vector_store import NumpyVectorStore, normalize_rows, top_k_indices
+from rag_types.vector import SemanticCandidate, Metadata, MetadataFilter, Vectors, VectorLike
+
+# Two-stage search for Matryoshka embeddings (e.g. OpenAI's text-embedding-3 models), whose leading
+# dimensions are a usable embedding on their own. Every stored vector is kept at full dimension and as a
+# renormalized prefix of prefix_dimension values, both derived from the same embedding. A search scans
+# the prefixes of the whole corpus, then reranks the best shortlist_k rows with the full vectors
+class MatryoshkaVectorStore(NumpyVectorStore):
+  def __init__(self, dimension: int, prefix_dimension: int = 256, shortlist_k: int = 300, path: str | None = None,
+      initial_capacity: int = 1024):
+    if prefix_dimension < 1 or prefix_dimension > dimension:
+      raise RuntimeError("MatryoshkaVectorStore requires a prefix_dimension between 1 and the full dimension.")
+    if shortlist_k < 1:
+      raise RuntimeError("MatryoshkaVectorStore requires a shortlist_k of at least 1.")
+
+    self.prefix_dimension = prefix_dimension
+    self.shortlist_k = shortlist_k
+    self.prefix_matrix = np.empty((max(initial_capacity, 1), prefix_dimension), dtype=np.float32)
+
+    super().__init__(dimension, path, initial_capacity)
+
+  # Truncates normalized full vectors to the prefix and renormalizes, which is what the embedding API
+  # itself does when asked for fewer dimensions
+  def _prefixes(self, vectors: np.ndarray) -> np.ndarray:
+    return normalize_rows(vectors[:, :self.prefix_dimension])
+
+  def _ensure_capacity(self, required: int):
+    super()._ensure_capacity(required)
+    if self.prefix_matrix.shape[0] < self.matrix.shape[0]:
+      prefix_matrix = np.empty((self.matrix.shape[0], self.prefix_dimension), dtype=np.float32)
+      prefix_matrix[:self.size] = self.prefix_matrix[:self.size]
+      self.prefix_matrix = prefix_matrix
+
+  def _upsert_rows(self, ids: List[int], vectors: Vectors, metadata: List[Metadata] | None = None):
+    super()._upsert_rows(ids, vectors, metadata)
+    rows = [self.row_of_id[int(id)] for id in ids]
+    self.prefix_matrix[rows] = self._prefixes(self.matrix[rows])
+
+  def semantic_search(self, query: VectorLike, k: int, filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
+    return self.semantic_search_batch([query], k, filter)[0]
+
+  def semantic_search_batch(self, queries: Vectors, k: int, filter: MetadataFilter | None = None) -> List[List[SemanticCandidate]]:
+    if len(queries) == 0:
+      return []
+    query_matrix = self._prepare_queries(queries, k)
+
+    # First stage: one low-dimensional matrix-matrix product over every row that passes the filter
+    rows = self._filtered_rows(filter)
+    if rows is None:
+      rows = np.arange(self.size)
+      prefix_scores = self._prefixes(query_matrix) @ self.prefix_matrix[:self.size].T
+    else:
+      prefix_scores = self._prefixes(query_matrix) @ self.prefix_matrix[rows].T
+
+    # Second stage: rerank each query's shortlist with the full vectors
+    results = []
+    for query_vector, scores in zip(query_matrix, prefix_scores):
+      shortlist = rows[np.sort(top_k_indices(scores, max(self.shortlist_k, k)))]
+      full_scores = self.matrix[shortlist] @ query_vector
+      top = top_k_indices(full_scores, k)
+      results.append([{"id": int(self.ids[shortlist[i]]), "score": float(full_scores[i])} for i in top])
+    return results
+
+  # The prefixes are derived from the persisted full vectors, so only those need to be saved
+  def load(self):
+    super().load()
+    self.prefix_matrix = np.empty((self.matrix.shape[0], self.prefix_dimension), dtype=np.float32)
+    self.prefix_matrix[:self.size] = self._prefixes(self.matrix[:self.size])
@@ -0,0 +1,129 @@
+from typing import List, Dict, Set, Any
+import numpy as np
+from rag_types.vector import Metadata, MetadataFilter
+
+# Inverted index from metadata (field, value) pairs to the rows that carry them, used by the local vector
+# stores to turn a filter expression into the set of rows to scan before any vectors are touched. Supports
+# the subset of Pinecone's filter language that maps onto posting lists: $eq, $ne, $in, $nin, $gt, $gte,
+# $lt, $lte, $exists, $and and $or, with several conditions in one dict meaning "and"
+class MetadataIndex:
+  def __init__(self):
+    self.postings: Dict[str, Dict[Any, Set[int]]] = {}
+    self.row_metadata: List[Metadata | None] = []
+
+  # Bools are kept apart from ints so that True and 1 don't share a posting list
+  @staticmethod
+  def _key(value: Any) -> Any:
+    return (isinstance(value, bool), value)
+
+  # List values are indexed once per distinct element, so {"tags": "a"} matches {"tags": ["a", "b"]} and
+  # ["a", "a"] only lands in one posting list once
+  @classmethod
+  def _keys(cls, value: Any) -> Set[Any]:
+    return {cls._key(element) for element in (value if isinstance(value, list) else [value])}
+
+  # Filter operands are looked up in the posting lists, so they must be scalars like the indexed values
+  @classmethod
+  def _operand_key(cls, operator: str, operand: Any) -> Any:
+    if isinstance(operand, (list, dict)):
+      raise RuntimeError(f"The {operator} metadata filter operator takes a single value, got {operand!r}")
+    return cls._key(operand)
+
+  @classmethod
+  def _operand_keys(cls, operator: str, operand: Any) -> List[Any]:
+    if not isinstance(operand, list):
+      raise RuntimeError(f"The {operator} metadata filter operator takes a list of values, got {operand!r}")
+    return [cls._operand_key(operator, value) for value in operand]
+
+  # Sets (or replaces) the metadata of a row
+  def set(self, row: int, metadata: Metadata | None):
+    while len(self.row_metadata) <= row:
+      self.row_metadata.append(None)
+
+    old = self.row_metadata[row]
+    if old:
+      for field, value in old.items():
+        for key in self._keys(value):
+          posting = self.postings[field][key]
+          posting.discard(row)
+          if not posting:
+            del self.postings[field][key]
+
+    self.row_metadata[row] = metadata
+    if metadata:
+      for field, value in metadata.items():
+        for key in self._keys(value):
+          self.postings.setdefault(field, {}).setdefault(key, set()).add(row)
+
+  # Returns the sorted rows (out of the first size rows) whose metadata matches the filter
+  def evaluate(self, filter: MetadataFilter, size: int) -> np.ndarray:
+    rows = self._evaluate(filter, size)
+    return np.sort(np.fromiter((row for row in rows if row < size), dtype=np.int64, count=-1))
+
+  def _evaluate(self, filter: MetadataFilter, size: int) -> Set[int]:
+    if not isinstance(filter, dict):
+      raise RuntimeError("A metadata filter must be a dict")
+
+    result: Set[int] | None = None
+    for key, condition in filter.items():
+      if key == "$and":
+        matched = self._combine([self._evaluate(sub_filter, size) for sub_filter in condition], intersect=True, size=size)
+      elif key == "$or":
+        matched = self._combine([self._evaluate(sub_filter, size) for sub_filter in condition], intersect=False, size=size)
+      elif key.startswith("$"):
+        raise RuntimeError(f"Unsupported metadata filter operator {key}")
+      else:
+        matched = self._evaluate_field(key, condition, size)
+      result = matched if result is None else result & matched
+
+    # An empty filter matches everything
+    return result if result is not None else set(range(size))
+
+  @staticmethod
+  def _combine(sets: List[Set[int]], intersect: bool, size: int) -> Set[int]:
+    if not sets:
+      return set(range(size)) if intersect else set()
+    combined = set(sets[0])
+    for other in sets[1:]:
+      combined = combined & other if intersect else combined | other
+    return combined
+
+  def _evaluate_field(self, field: str, condition: Any, size: int) -> Set[int]:
+    values = self.postings.get(field, {})
+    if not isinstance(condition, dict):
+      condition = {"$eq": condition}
+
+    result: Set[int] | None = None
+    for operator, operand in condition.items():
+      if operator == "$eq":
+        matched = set(values.get(self._operand_key(operator, operand), ()))
+      elif operator == "$in":
+        matched = set().union(*(values.get(key, ()) for key in self._operand_keys(operator, operand)))
+      elif operator == "$ne":
+        matched = set(range(size)) - values.get(self._operand_key(operator, operand), set())
+      elif operator == "$nin":
+        matched = set(range(size)).difference(*(values.get(key, ()) for key in self._operand_keys(operator, operand)))
+      elif operator in ("$gt", "$gte", "$lt", "$lte"):
+        # Range conditions union the posting lists of every numeric value in range
+        matched = set().union(*(
+          rows for (is_bool, value), rows in values.items()
+          if not is_bool and isinstance(value, (int, float)) and self._compare(operator, value, operand)
+        ))
+      elif operator == "$exists":
+        present = set().union(*values.values())
+        matched = present if operand else set(range(size)) - present
+      else:
+        raise RuntimeError(f"Unsupported metadata filter operator {operator}")
+      result = matched if result is None else result & matched
+
+    return result if result is not None else set(range(size))
+
+  @staticmethod
+  def _compare(operator: str, value: float, operand: float) -> bool:
+    if operator == "$gt":
+      return value > operand
+    if operator == "$gte":
+      return value >= operand
+    if operator == "$lt":
+      return value < operand
+    return value <= operand
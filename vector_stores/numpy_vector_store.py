@@ -0,0 +1,201 @@
+from typing import List, Dict
+from pathlib import Path
+import json
+import os
+import numpy as np
+from vector_stores.vector_store import VectorStore
+from vector_stores.metadata_index import MetadataIndex
+from rag_types.vector import SemanticCandidate, Metadata, MetadataFilter, Vectors, VectorLike
+
+# Normalizes the rows of a float32 matrix to unit length so that cosine similarity becomes a dot product
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+  norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+  norms[norms == 0] = 1.0
+  return matrix / norms
+
+# Returns the indices of the k highest scores in descending order of score, using argpartition so we
+# only pay O(n) for the selection and O(k log k) for sorting the winners
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+  k = min(k, scores.shape[0])
+  if k == 0:
+    return np.empty(0, dtype=np.int64)
+  if k < scores.shape[0]:
+    candidates = np.argpartition(scores, -k)[-k:]
+  else:
+    candidates = np.arange(scores.shape[0])
+  return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+# Writes an .npz archive atomically: the arrays go to a temporary file next to path, which then replaces
+# path in one step, so a crash mid-write leaves the previous archive intact
+def write_archive(path: Path, arrays: Dict[str, np.ndarray]):
+  temporary = path.with_name(path.name + ".tmp")
+  with open(temporary, "wb") as f:
+    np.savez(f, **arrays)
+    f.flush()
+    os.fsync(f.fileno())
+  os.replace(temporary, path)
+
+class NumpyVectorStore(VectorStore):
+  def __init__(self, dimension: int, path: str | None = None, initial_capacity: int = 1024):
+    if dimension < 1:
+      raise RuntimeError("NumpyVectorStore requires a dimension of at least 1.")
+
+    self.dimension = dimension
+    self.path = Path(path) if path is not None else None
+
+    # All vectors live in one contiguous float32 matrix; only the first self.size rows are in use
+    self.matrix = np.empty((max(initial_capacity, 1), dimension), dtype=np.float32)
+    self.ids = np.empty(max(initial_capacity, 1), dtype=np.int64)
+    self.size = 0
+    self.row_of_id: Dict[int, int] = {}
+    self.metadata_index = MetadataIndex()
+
+    # Whether anything was stored since the last save
+    self.dirty = False
+
+    # Load previously persisted vectors if there are any
+    if self.path is not None and self.path.exists():
+      self.load()
+
+  # Grows the backing arrays by amortized doubling so that appends are O(1) on average
+  def _ensure_capacity(self, required: int):
+    capacity = self.matrix.shape[0]
+    if required <= capacity:
+      return
+    while capacity < required:
+      capacity *= 2
+    matrix = np.empty((capacity, self.dimension), dtype=np.float32)
+    matrix[:self.size] = self.matrix[:self.size]
+    ids = np.empty(capacity, dtype=np.int64)
+    ids[:self.size] = self.ids[:self.size]
+    self.matrix = matrix
+    self.ids = ids
+
+  def store_embeddings(self, ids: List[int], vectors: Vectors, metadata: List[Metadata] | None = None):
+    self._upsert_rows(ids, vectors, metadata)
+
+  # Saves the store if it has a path and anything changed since the last save
+  def flush(self):
+    if self.path is not None and self.dirty:
+      self.save()
+
+  # Normalizes the vectors and writes them into the matrix, overwriting rows whose id already exists
+  # (upsert semantics, like Pinecone) and appending the rest
+  def _upsert_rows(self, ids: List[int], vectors: Vectors, metadata: List[Metadata] | None = None):
+    if len(ids) != len(vectors):
+      raise RuntimeError("The number of ids must match the number of vectors")
+    if metadata is not None and len(metadata) != len(ids):
+      raise RuntimeError("The number of metadata entries must match the number of vectors")
+    if len(ids) == 0:
+      return
+
+    batch = np.asarray(vectors, dtype=np.float32)
+    if batch.ndim != 2 or batch.shape[1] != self.dimension:
+      raise RuntimeError(f"The dimension of the stored vectors must be {self.dimension}")
+    batch = normalize_rows(batch)
+
+    self._ensure_capacity(self.size + len(ids))
+    rows = np.empty(len(ids), dtype=np.int64)
+    for i, id in enumerate(ids):
+      id = int(id)
+      row = self.row_of_id.get(id)
+      if row is None:
+        row = self.size
+        self.size += 1
+        self.row_of_id[id] = row
+        self.ids[row] = id
+      rows[i] = row
+      self.metadata_index.set(row, metadata[i] if metadata is not None else None)
+
+    # One block copy of the whole batch instead of a row at a time
+    self.matrix[rows] = batch
+    self.dirty = True
+
+  # Validates a query and returns it as a normalized float32 vector
+  def _prepare_query(self, query: VectorLike, k: int) -> np.ndarray:
+    if k < 1:
+      raise RuntimeError("K must be at least 1 for semantic search")
+    if len(query) != self.dimension:
+      raise RuntimeError(f"The dimension of the query vector must be the same as the data vectors ({self.dimension})")
+    return normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+
+  # Validates a batch of queries and returns them as one normalized float32 matrix, converting a list of
+  # lists once rather than query by query
+  def _prepare_queries(self, queries: Vectors, k: int) -> np.ndarray:
+    if k < 1:
+      raise RuntimeError("K must be at least 1 for semantic search")
+    try:
+      query_matrix = np.asarray(queries, dtype=np.float32)
+    except ValueError:
+      query_matrix = None
+    if query_matrix is None or query_matrix.ndim != 2 or query_matrix.shape[1] != self.dimension:
+      raise RuntimeError(f"The dimension of the query vector must be the same as the data vectors ({self.dimension})")
+    return normalize_rows(query_matrix)
+
+  # Returns the rows that pass the filter, or None when every row should be scanned
+  def _filtered_rows(self, filter: MetadataFilter | None) -> np.ndarray | None:
+    if filter is None:
+      return None
+    return self.metadata_index.evaluate(filter, self.size)
+
+  def semantic_search(self, query: VectorLike, k: int, filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
+    return self._exact_search_batch(np.stack([self._prepare_query(query, k)]), k, filter)[0]
+
+  def semantic_search_batch(self, queries: Vectors, k: int, filter: MetadataFilter | None = None) -> List[List[SemanticCandidate]]:
+    if len(queries) == 0:
+      return []
+    return self._exact_search_batch(self._prepare_queries(queries, k), k, filter)
+
+  # Scores every query against every row that passes the filter with a single matrix-matrix product, then
+  # picks each query's top k with argpartition. Filtering happens first, so a selective filter only pays
+  # for the rows it matches
+  def _exact_search_batch(self, query_matrix: np.ndarray, k: int, filter: MetadataFilter | None) -> List[List[SemanticCandidate]]:
+    rows = self._filtered_rows(filter)
+    if rows is None:
+      scores = query_matrix @ self.matrix[:self.size].T
+      ids = self.ids[:self.size]
+    else:
+      scores = query_matrix @ self.matrix[rows].T
+      ids = self.ids[rows]
+
+    results = []
+    for query_scores in scores:
+      top = top_k_indices(query_scores, k)
+      results.append([{"id": int(ids[i]), "score": float(query_scores[i])} for i in top])
+    return results
+
+  # Arrays written to the .npz archive by save
+  def _archive_arrays(self) -> Dict[str, np.ndarray]:
+    return {
+      "matrix": self.matrix[:self.size],
+      "ids": self.ids[:self.size],
+      "metadata": np.array(json.dumps(self.metadata_index.row_metadata[:self.size])),
+    }
+
+  # Writes the used part of the matrix, the ids and the metadata to self.path as an .npz archive
+  def save(self):
+    if self.path is None:
+      raise RuntimeError("NumpyVectorStore cannot save without a path")
+    write_archive(self.path, self._archive_arrays())
+    self.dirty = False
+
+  # Replaces the contents of the store with the archive at self.path
+  def load(self):
+    if self.path is None:
+      raise RuntimeError("NumpyVectorStore cannot load without a path")
+    with np.load(self.path) as archive:
+      matrix = archive["matrix"]
+      ids = archive["ids"]
+      row_metadata = json.loads(str(archive["metadata"])) if "metadata" in archive else []
+    if matrix.ndim != 2 or matrix.shape[1] != self.dimension:
+      raise RuntimeError(f"The vectors stored at {self.path} do not have dimension {self.dimension}")
+
+    self.size = 0
+    self._ensure_capacity(matrix.shape[0])
+    self.matrix[:matrix.shape[0]] = matrix
+    self.ids[:ids.shape[0]] = ids
+    self.size = matrix.shape[0]
+    self.row_of_id = {int(id): row for row, id in enumerate(ids)}
+    self.metadata_index = MetadataIndex()
+    for row, metadata in enumerate(row_metadata):
+      self.metadata_index.set(row, metadata)
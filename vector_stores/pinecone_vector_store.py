@@ -1,10 +1,48 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, TypedDict
 from vector_stores.vector_store import VectorStore
 from pinecone import Pinecone, QueryResponse, ServerlessSpec, Vector
-from rag_types.vector import SemanticCandidate
+from rag_types.vector import SemanticCandidate, Metadata, MetadataFilter, Vectors, VectorLike
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+import numpy as np
+import random
+import time
+
+# Pinecone rejects upsert requests larger than 2MB or with more than 1000 vectors
+MAX_UPSERT_BYTES = 2 * 1024 * 1024
+MAX_UPSERT_VECTORS = 1000
+
+# Rough serialized size of one float value (digits, sign, exponent, separator) and of each vector's envelope.
+# Metadata is measured exactly by serializing it
+BYTES_PER_VALUE = 20
+BYTES_PER_VECTOR = 64
+
+class UpsertReport(TypedDict):
+  batches: int
+  failed_batches: int
+  failed_ids: List[int]
+  errors: List[str] # The last error of each failed batch
+  retries: int
+  batch_seconds: List[float] # Wall time of each batch including retries, in batch order
+  total_seconds: float
+
+# Returns the HTTP status of a Pinecone error (the attribute name differs between SDK versions)
+def _status_code(error: Exception) -> int | None:
+  return getattr(error, "status_code", None) or getattr(error, "status", None)
+
+# Raised once every batch of an upsert has finished if any of them failed. The report says which ids
+# were not stored, so the caller can retry just those
+class UpsertError(RuntimeError):
+  def __init__(self, report: UpsertReport):
+    super().__init__(f"PineconeVectorStore failed to upsert {report['failed_batches']} of {report['batches']} batches "
+      f"({len(report['failed_ids'])} vectors): {report['errors'][0]}")
+    self.report = report
 
 class PineconeVectorStore(VectorStore):
-  def __init__(self, pinecone_api_key: str, index_name: str, dimension: int, cloud: str = "aws", region: str = "us-east-1"):
+  def __init__(self, pinecone_api_key: str, index_name: str, dimension: int, cloud: str = "aws", region: str = "us-east-1",
+      max_concurrent_queries: int = 8, max_concurrent_upserts: int = 4, max_upsert_retries: int = 5,
+      retry_base_delay: float = 0.5, retry_max_delay: float = 30.0):
     self.pc = Pinecone(api_key=pinecone_api_key)
     self.index_name = index_name
     self.dimension = dimension
@@ -20,23 +58,125 @@ class PineconeVectorStore(VectorStore):
     # Get index handle
     self.index = self.pc.Index(name=self.index_name)
 
-  def store_embeddings(self, ids: List[int], vectors: List[List[float]]):
-    # Prepare items: id must be str
-    
+    # Bounded pool that is reused by every batched search instead of spinning up threads per call
+    self.query_executor = ThreadPoolExecutor(max_workers=max_concurrent_queries)
+
+    # Upserts are split into size-aware batches and sent over their own bounded pool
+    self.upsert_executor = ThreadPoolExecutor(max_workers=max_concurrent_upserts)
+    # Most vectors per batch; batches of vectors with large metadata are cut earlier to stay under MAX_UPSERT_BYTES
+    self.upsert_batch_size = self.compute_upsert_batch_size(dimension)
+    self.max_upsert_retries = max_upsert_retries
+    self.retry_base_delay = retry_base_delay
+    self.retry_max_delay = retry_max_delay
+
+  # Largest number of vectors of the given dimension, each with metadata_bytes of serialized metadata, that
+  # fits in one upsert request
+  @staticmethod
+  def compute_upsert_batch_size(dimension: int, metadata_bytes: int = 0) -> int:
+    bytes_per_vector = dimension * BYTES_PER_VALUE + BYTES_PER_VECTOR + metadata_bytes
+    return max(1, min(MAX_UPSERT_VECTORS, MAX_UPSERT_BYTES // bytes_per_vector))
+
+  # Splits an upsert into (start, end) ranges of at most upsert_batch_size vectors whose estimated request
+  # size, metadata included, stays under MAX_UPSERT_BYTES
+  def _batch_ranges(self, count: int, metadata: List[Metadata] | None) -> List[tuple[int, int]]:
+    bytes_per_vector = self.dimension * BYTES_PER_VALUE + BYTES_PER_VECTOR
+    ranges = []
+    start = 0
+    batch_bytes = 0
+    for n in range(count):
+      vector_bytes = bytes_per_vector + (len(json.dumps(metadata[n])) if metadata is not None and metadata[n] else 0)
+      if n > start and (n - start == self.upsert_batch_size or batch_bytes + vector_bytes > MAX_UPSERT_BYTES):
+        ranges.append((start, n))
+        start = n
+        batch_bytes = 0
+      batch_bytes += vector_bytes
+    if start < count:
+      ranges.append((start, count))
+    return ranges
+
+  # Upserts the vectors in concurrent batches. Failed batches are retried with exponential backoff and
+  # jitter; batches that still fail don't abort the others, but raise an UpsertError once all are done
+  def store_embeddings(self, ids: List[int], vectors: Vectors, metadata: List[Metadata] | None = None) -> UpsertReport:
+    if len(ids) != len(vectors):
+      raise RuntimeError("The number of ids must match the number of vectors")
+    if metadata is not None and len(metadata) != len(ids):
+      raise RuntimeError("The number of metadata entries must match the number of vectors")
+
+    start = time.perf_counter()
+    batches = [
+      (ids[start:end], vectors[start:end], metadata[start:end] if metadata is not None else None)
+      for start, end in self._batch_ranges(len(ids), metadata)
+    ]
+    outcomes = list(self.upsert_executor.map(lambda batch: self._upsert_batch(*batch), batches))
+
+    report: UpsertReport = {
+      "batches": len(batches),
+      "failed_batches": 0,
+      "failed_ids": [],
+      "errors": [],
+      "retries": 0,
+      "batch_seconds": [],
+      "total_seconds": 0.0,
+    }
+    for (batch_ids, _, _), (error, retries, seconds) in zip(batches, outcomes):
+      report["retries"] += retries
+      report["batch_seconds"].append(seconds)
+      if error is not None:
+        report["failed_batches"] += 1
+        report["failed_ids"] += list(batch_ids)
+        report["errors"].append(f"{error} (after {retries + 1} attempts)")
+    report["total_seconds"] = time.perf_counter() - start
+
+    if report["failed_batches"]:
+      raise UpsertError(report)
+    return report
+
+  # Sends one batch, retrying transient failures. Returns (the error that failed the batch or None, retries, seconds)
+  def _upsert_batch(self, ids: List[int], vectors: Vectors, metadata: List[Metadata] | None) -> tuple[Exception | None, int, float]:
+    # Prepare items: id must be str, values must be a list of floats (converted here, batch by batch, so the
+    # rest of the pipeline can stay on float32 matrices), and metadata is stored natively so Pinecone can filter on it
+    values = vectors.tolist() if isinstance(vectors, np.ndarray) else vectors
     upserts: List[Vector] = [
-      Vector(str(i), v)
-      for i, v in zip(ids, vectors)
+      Vector(str(i), v, metadata=metadata[n] if metadata is not None else None)
+      for n, (i, v) in enumerate(zip(ids, values))
     ]
-    self.index.upsert(vectors=upserts)
 
-  def semantic_search(self, query: List[float], k: int) -> List[SemanticCandidate]:
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+      try:
+        self.index.upsert(vectors=upserts)
+        return None, attempt, time.perf_counter() - start
+      except Exception as e:
+        # Client errors other than rate limiting will fail the same way again
+        status = _status_code(e)
+        retryable = status is None or status == 429 or status >= 500
+        if not retryable or attempt == self.max_upsert_retries:
+          return e, attempt, time.perf_counter() - start
+
+        # Full jitter: sleep a random amount up to the exponentially growing cap
+        time.sleep(random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt)))
+        attempt += 1
+
+  def semantic_search(self, query: VectorLike, k: int, filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
     if k < 1:
       raise RuntimeError("K must be at least 1 for semantic search")
     if len(query) != self.dimension:
       raise RuntimeError(f"The dimension of the query vector must be the same as the data vectors ({self.dimension})")
     
-    res = self.index.query(vector=query, top_k=k, include_values=False)
+    if isinstance(query, np.ndarray):
+      query = query.tolist()
+
+    # The filter language is Pinecone's own, so it is passed straight through to its metadata filtering
+    if filter is not None:
+      res = self.index.query(vector=query, top_k=k, include_values=False, filter=filter)
+    else:
+      res = self.index.query(vector=query, top_k=k, include_values=False)
     if not isinstance(res, QueryResponse):
       raise RuntimeError("Pinecone's index.query function returned an async reponse instead of a QueryResponse entity")
-    candidates: List[SemanticCandidate] = [{"id": candidate["id"], "score": candidate['score']} for candidate in res.matches]
-    return candidates
\ No newline at end of file
+    # Pinecone stores ids as strings; they are handed back as the ints the other stores and the chunk storage use
+    candidates: List[SemanticCandidate] = [{"id": int(candidate["id"]), "score": candidate['score']} for candidate in res.matches]
+    return candidates
+
+  def semantic_search_batch(self, queries: Vectors, k: int, filter: MetadataFilter | None = None) -> List[List[SemanticCandidate]]:
+    return list(self.query_executor.map(self.semantic_search, queries, itertools.repeat(k), itertools.repeat(filter)))
\ No newline at end of file
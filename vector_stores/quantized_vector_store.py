@@ -0,0 +1,353 @@
+from typing import List, Dict
+from pathlib import Path
+import numpy as np
+from vector_stores.vector_store import VectorStore
+from vector_stores.numpy_vector_store import normalize_rows, top_k_indices, write_archive
+from vector_stores.metadata_index import MetadataIndex
+from rag_types.vector import SemanticCandidate, Metadata, MetadataFilter, Vectors, VectorLike
+import json
+
+# Number of rows decoded at a time during the first-pass scan, which bounds the temporary float32
+# memory the scan needs no matter how large the corpus grows
+SCAN_BLOCK_ROWS = 16384
+
+# Number of centroids per product quantization subspace (so that every code fits in one byte). It is
+# also the fewest vectors the codebooks can be trained on without repeating centroids
+PQ_CENTROIDS = 256
+
+# Most vectors sampled from the store when the codebooks are trained automatically
+PQ_MAX_TRAINING_VECTORS = 65536
+
+# Runs Lloyd's k-means and returns the centroids
+def kmeans(points: np.ndarray, n_centroids: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+  n_centroids = min(n_centroids, points.shape[0])
+  centroids = points[rng.choice(points.shape[0], n_centroids, replace=False)].copy()
+  for _ in range(iterations):
+    assignments = nearest_centroids(points, centroids)
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, assignments, points)
+    counts = np.bincount(assignments, minlength=n_centroids)
+    # Centroids that lost all their points keep their previous position
+    occupied = counts > 0
+    centroids[occupied] = sums[occupied] / counts[occupied, None]
+  return centroids
+
+# Returns the index of the nearest centroid (in L2 distance) for every point
+def nearest_centroids(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+  distances = (centroids * centroids).sum(axis=1) - 2 * points @ centroids.T
+  return np.argmin(distances, axis=1)
+
+# A compressed local vector store. The first pass scans compact codes that live in memory, either int8
+# scalar-quantized vectors (~4x smaller) or product-quantized codes (dimension / pq_subvectors times 4
+# smaller), and the best rescore_multiplier * k candidates are then rescored exactly against the
+# full-precision vectors, which stay on disk in a memory-mapped file
+class QuantizedVectorStore(VectorStore):
+  def __init__(self, dimension: int, path: str, mode: str = "int8", rescore_multiplier: int = 4,
+      pq_subvectors: int | None = None, pq_iterations: int = 20, seed: int = 0, initial_capacity: int = 1024):
+    if dimension < 1:
+      raise RuntimeError("QuantizedVectorStore requires a dimension of at least 1.")
+    if not path:
+      raise RuntimeError("QuantizedVectorStore requires a path for its memory-mapped vectors.")
+    if mode not in ("int8", "pq"):
+      raise RuntimeError("QuantizedVectorStore mode must be either 'int8' or 'pq'.")
+    if rescore_multiplier < 1:
+      raise RuntimeError("QuantizedVectorStore requires a rescore_multiplier of at least 1.")
+
+    self.dimension = dimension
+    self.mode = mode
+    self.rescore_multiplier = rescore_multiplier
+    self.pq_iterations = pq_iterations
+    self.rng = np.random.default_rng(seed)
+
+    # By default every PQ subvector covers 8 dimensions, which gives 32x compression
+    self.pq_subvectors = pq_subvectors if pq_subvectors is not None else max(1, dimension // 8)
+    if mode == "pq" and dimension % self.pq_subvectors != 0:
+      raise RuntimeError("QuantizedVectorStore requires the dimension to be divisible by pq_subvectors.")
+
+    # path.f32 holds the full-precision vectors, path.npz the codes, ids and codebooks
+    self.vectors_path = Path(f"{path}.f32")
+    self.codes_path = Path(f"{path}.npz")
+
+    capacity = max(initial_capacity, 1)
+    self.size = 0
+    self.ids = np.empty(capacity, dtype=np.int64)
+    self.row_of_id: Dict[int, int] = {}
+    self.metadata_index = MetadataIndex()
+    self.codebooks: np.ndarray | None = None # (pq_subvectors, PQ_CENTROIDS, subvector dimension)
+    if mode == "int8":
+      self.codes = np.empty((capacity, dimension), dtype=np.int8)
+      self.scales = np.empty(capacity, dtype=np.float32)
+    else:
+      self.codes = np.empty((capacity, self.pq_subvectors), dtype=np.uint8)
+
+    # Whether anything was stored since the last save
+    self.dirty = False
+
+    self.vectors: np.memmap | None = None
+    if self.codes_path.exists() and self.vectors_path.exists():
+      self.load()
+    else:
+      self._resize_vectors_file(capacity)
+
+  # Reports how many bytes the in-memory codes take per vector compared to float32 vectors
+  @property
+  def compression_ratio(self) -> float:
+    code_bytes = self.dimension + 4 if self.mode == "int8" else self.pq_subvectors
+    return (self.dimension * 4) / code_bytes
+
+  # Grows (or creates) the memory-mapped full-precision file to hold capacity vectors
+  def _resize_vectors_file(self, capacity: int):
+    if self.vectors is not None:
+      self.vectors.flush()
+      self.vectors = None
+    with open(self.vectors_path, "ab") as f:
+      f.truncate(capacity * self.dimension * 4)
+    self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+
+  # Grows the codes, ids and full-precision file by amortized doubling
+  def _ensure_capacity(self, required: int):
+    capacity = self.codes.shape[0]
+    if required <= capacity:
+      return
+    while capacity < required:
+      capacity *= 2
+
+    codes = np.empty((capacity, self.codes.shape[1]), dtype=self.codes.dtype)
+    codes[:self.size] = self.codes[:self.size]
+    self.codes = codes
+    ids = np.empty(capacity, dtype=np.int64)
+    ids[:self.size] = self.ids[:self.size]
+    self.ids = ids
+    if self.mode == "int8":
+      scales = np.empty(capacity, dtype=np.float32)
+      scales[:self.size] = self.scales[:self.size]
+      self.scales = scales
+    self._resize_vectors_file(capacity)
+
+  # Learns the product quantization codebooks from at least PQ_CENTROIDS vectors and re-encodes every
+  # stored vector with them. Called automatically, with a sample of the stored vectors, once the store
+  # holds PQ_CENTROIDS vectors, but can be called up front with a more representative sample
+  def train(self, vectors: Vectors):
+    if self.mode != "pq":
+      return
+    sample = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    if sample.ndim != 2 or sample.shape[1] != self.dimension:
+      raise RuntimeError(f"The dimension of the training vectors must be {self.dimension}")
+    if len(sample) < PQ_CENTROIDS:
+      raise RuntimeError(f"Product quantization needs at least {PQ_CENTROIDS} training vectors, got {len(sample)}")
+
+    subvector_dimension = self.dimension // self.pq_subvectors
+    codebooks = np.empty((self.pq_subvectors, PQ_CENTROIDS, subvector_dimension), dtype=np.float32)
+    for m in range(self.pq_subvectors):
+      subspace = sample[:, m * subvector_dimension:(m + 1) * subvector_dimension]
+      codebooks[m] = kmeans(subspace, PQ_CENTROIDS, self.pq_iterations, self.rng)
+    self.codebooks = codebooks
+
+    assert self.vectors is not None
+    for start in range(0, self.size, SCAN_BLOCK_ROWS):
+      end = min(start + SCAN_BLOCK_ROWS, self.size)
+      self._encode(np.asarray(self.vectors[start:end]), np.arange(start, end))
+    self.dirty = True
+
+  # Encodes normalized vectors into the codes for the current mode
+  def _encode(self, batch: np.ndarray, rows: np.ndarray):
+    if self.mode == "int8":
+      # Symmetric per-vector scale so that the largest component maps to +-127
+      scales = np.abs(batch).max(axis=1) / 127
+      scales[scales == 0] = 1.0
+      self.codes[rows] = np.round(batch / scales[:, None]).astype(np.int8)
+      self.scales[rows] = scales
+    else:
+      assert self.codebooks is not None
+      subvector_dimension = self.dimension // self.pq_subvectors
+      codes = np.empty((len(batch), self.pq_subvectors), dtype=np.uint8)
+      for m in range(self.pq_subvectors):
+        subspace = batch[:, m * subvector_dimension:(m + 1) * subvector_dimension]
+        codes[:, m] = nearest_centroids(subspace, self.codebooks[m])
+      self.codes[rows] = codes
+
+  def store_embeddings(self, ids: List[int], vectors: Vectors, metadata: List[Metadata] | None = None):
+    if len(ids) != len(vectors):
+      raise RuntimeError("The number of ids must match the number of vectors")
+    if metadata is not None and len(metadata) != len(ids):
+      raise RuntimeError("The number of metadata entries must match the number of vectors")
+    if len(ids) == 0:
+      return
+
+    batch = np.asarray(vectors, dtype=np.float32)
+    if batch.ndim != 2 or batch.shape[1] != self.dimension:
+      raise RuntimeError(f"The dimension of the stored vectors must be {self.dimension}")
+    batch = normalize_rows(batch)
+
+    # Upsert semantics, like Pinecone: existing ids are overwritten, new ids are appended
+    self._ensure_capacity(self.size + len(ids))
+    rows = np.empty(len(ids), dtype=np.int64)
+    for i, id in enumerate(ids):
+      id = int(id)
+      row = self.row_of_id.get(id)
+      if row is None:
+        row = self.size
+        self.size += 1
+        self.row_of_id[id] = row
+        self.ids[row] = id
+      rows[i] = row
+      self.metadata_index.set(row, metadata[i] if metadata is not None else None)
+
+    assert self.vectors is not None
+    self.vectors[rows] = batch
+    self.dirty = True
+
+    # Until the store holds enough vectors to train the codebooks, PQ rows have no codes and are scanned
+    # at full precision instead
+    if self.mode == "pq" and self.codebooks is None:
+      if self.size >= PQ_CENTROIDS:
+        sample = np.sort(self.rng.choice(self.size, min(self.size, PQ_MAX_TRAINING_VECTORS), replace=False))
+        self.train(self.vectors[sample])
+      return
+    self._encode(batch, rows)
+
+  # Saves the codes if anything changed since the last save
+  def flush(self):
+    if self.dirty:
+      self.save()
+
+  # Validates a query and returns it as a normalized float32 vector
+  def _prepare_query(self, query: VectorLike, k: int) -> np.ndarray:
+    if k < 1:
+      raise RuntimeError("K must be at least 1 for semantic search")
+    if len(query) != self.dimension:
+      raise RuntimeError(f"The dimension of the query vector must be the same as the data vectors ({self.dimension})")
+    return normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+
+  # Validates a batch of queries and returns them as one normalized float32 matrix, converting a list of
+  # lists once rather than query by query
+  def _prepare_queries(self, queries: Vectors, k: int) -> np.ndarray:
+    if k < 1:
+      raise RuntimeError("K must be at least 1 for semantic search")
+    try:
+      query_matrix = np.asarray(queries, dtype=np.float32)
+    except ValueError:
+      query_matrix = None
+    if query_matrix is None or query_matrix.ndim != 2 or query_matrix.shape[1] != self.dimension:
+      raise RuntimeError(f"The dimension of the query vector must be the same as the data vectors ({self.dimension})")
+    return normalize_rows(query_matrix)
+
+  # First-pass scores of the given rows (every row when None) for every query, computed from the codes
+  # one block at a time
+  def _approximate_scores(self, query_matrix: np.ndarray, rows: np.ndarray | None) -> np.ndarray:
+    count = self.size if rows is None else len(rows)
+    scores = np.empty((len(query_matrix), count), dtype=np.float32)
+
+    if self.mode == "pq" and self.codebooks is not None:
+      # Asymmetric distance computation: one lookup table of centroid-query dot products per query
+      subvector_dimension = self.dimension // self.pq_subvectors
+      query_subvectors = query_matrix.reshape(len(query_matrix), self.pq_subvectors, subvector_dimension)
+      tables = np.einsum("msd,qmd->qms", self.codebooks, query_subvectors)
+      subspaces = np.arange(self.pq_subvectors)
+
+    for start in range(0, count, SCAN_BLOCK_ROWS):
+      end = min(start + SCAN_BLOCK_ROWS, count)
+      block_rows = slice(start, end) if rows is None else rows[start:end]
+      if self.mode == "pq" and self.codebooks is None:
+        assert self.vectors is not None
+        scores[:, start:end] = query_matrix @ self.vectors[block_rows].T
+      elif self.mode == "int8":
+        block = self.codes[block_rows].astype(np.float32)
+        scores[:, start:end] = (query_matrix @ block.T) * self.scales[block_rows]
+      else:
+        block = self.codes[block_rows].astype(np.int64)
+        for q, table in enumerate(tables):
+          scores[q, start:end] = table[subspaces, block].sum(axis=1)
+    return scores
+
+  # Rescores a shortlist of the scanned rows against the full-precision vectors and returns the best k
+  def _rescore(self, query_vector: np.ndarray, approximate_scores: np.ndarray, rows: np.ndarray | None, k: int) -> List[SemanticCandidate]:
+    assert self.vectors is not None
+    shortlist = np.sort(top_k_indices(approximate_scores, k * self.rescore_multiplier))
+    if rows is not None:
+      shortlist = rows[shortlist]
+    exact_scores = self.vectors[shortlist] @ query_vector
+    top = top_k_indices(exact_scores, k)
+    return [{"id": int(self.ids[shortlist[i]]), "score": float(exact_scores[i])} for i in top]
+
+  def semantic_search(self, query: VectorLike, k: int, filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
+    return self.semantic_search_batch([query], k, filter)[0]
+
+  def semantic_search_batch(self, queries: Vectors, k: int, filter: MetadataFilter | None = None) -> List[List[SemanticCandidate]]:
+    if len(queries) == 0:
+      return []
+    query_matrix = self._prepare_queries(queries, k)
+
+    # The filter is resolved to rows through the metadata index before any codes are scanned
+    rows = None if filter is None else self.metadata_index.evaluate(filter, self.size)
+    approximate_scores = self._approximate_scores(query_matrix, rows)
+    return [self._rescore(query_vector, scores, rows, k) for query_vector, scores in zip(query_matrix, approximate_scores)]
+
+  # Brute force search over the full-precision vectors, used as ground truth for recall
+  def exact_search(self, query: VectorLike, k: int) -> List[SemanticCandidate]:
+    assert self.vectors is not None
+    query_vector = self._prepare_query(query, k)
+    scores = np.empty(self.size, dtype=np.float32)
+    for start in range(0, self.size, SCAN_BLOCK_ROWS):
+      end = min(start + SCAN_BLOCK_ROWS, self.size)
+      scores[start:end] = self.vectors[start:end] @ query_vector
+    return [{"id": int(self.ids[row]), "score": float(scores[row])} for row in top_k_indices(scores, k)]
+
+  # Returns the mean fraction of the exact top k that the quantized search also finds (recall@k), so
+  # that the mode, pq_subvectors and rescore_multiplier can be picked for a given corpus
+  def measure_recall(self, queries: Vectors, k: int) -> float:
+    if len(queries) == 0:
+      raise RuntimeError("measure_recall needs at least one query")
+
+    total = 0.0
+    for query, approximate in zip(queries, self.semantic_search_batch(queries, k)):
+      exact = {candidate['id'] for candidate in self.exact_search(query, k)}
+      if not exact:
+        total += 1.0
+        continue
+      total += len(exact & {candidate['id'] for candidate in approximate}) / len(exact)
+    return total / len(queries)
+
+  # Flushes the full-precision vectors and writes the codes, ids, metadata and codebooks to disk
+  def save(self):
+    assert self.vectors is not None
+    self.vectors.flush()
+    arrays = {
+      "ids": self.ids[:self.size],
+      "codes": self.codes[:self.size],
+      "metadata": np.array(json.dumps(self.metadata_index.row_metadata[:self.size])),
+    }
+    if self.mode == "int8":
+      arrays["scales"] = self.scales[:self.size]
+    elif self.codebooks is not None:
+      arrays["codebooks"] = self.codebooks
+    write_archive(self.codes_path, arrays)
+    self.dirty = False
+
+  # Restores the codes, ids, metadata and codebooks and maps the existing full-precision file
+  def load(self):
+    with np.load(self.codes_path) as archive:
+      ids = archive["ids"]
+      codes = archive["codes"]
+      scales = archive["scales"] if "scales" in archive else None
+      self.codebooks = archive["codebooks"] if "codebooks" in archive else None
+      row_metadata = json.loads(str(archive["metadata"])) if "metadata" in archive else []
+    if codes.shape[1] != self.codes.shape[1]:
+      raise RuntimeError(f"The codes stored at {self.codes_path} do not match this store's mode and dimension")
+
+    capacity = max(self.codes.shape[0], len(ids))
+    self.size = len(ids)
+    self.ids = np.empty(capacity, dtype=np.int64)
+    self.ids[:self.size] = ids
+    self.codes = np.empty((capacity, codes.shape[1]), dtype=self.codes.dtype)
+    self.codes[:self.size] = codes
+    if self.mode == "int8":
+      if scales is None:
+        raise RuntimeError(f"The codes stored at {self.codes_path} were not written in int8 mode")
+      self.scales = np.empty(capacity, dtype=np.float32)
+      self.scales[:self.size] = scales
+    self.row_of_id = {int(id): row for row, id in enumerate(ids)}
+    self.metadata_index = MetadataIndex()
+    for row, metadata in enumerate(row_metadata):
+      self.metadata_index.set(row, metadata)
+    self._resize_vectors_file(capacity)
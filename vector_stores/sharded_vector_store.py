@@ -0,0 +1,81 @@
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import numpy as np
+from vector_stores.vector_store import VectorStore
+from vector_stores.numpy_vector_store import top_k_indices
+from rag_types.vector import SemanticCandidate, Metadata, MetadataFilter, Vectors, VectorLike, as_matrix
+
+# Spreads vectors over several local shards by hashing their ids, and answers searches by querying every
+# shard in parallel and merging the per-shard top k lists with one top k over their scores. The shards can be any VectorStore
+# (NumpyVectorStore, HNSWVectorStore, QuantizedVectorStore, ...). They are driven from a thread pool,
+# which scales across cores because NumPy releases the GIL for the matrix products doing the work, so the
+# routing and merging around them are vectorized too rather than looping over ids in Python
+class ShardedVectorStore(VectorStore):
+  def __init__(self, shards: List[VectorStore], max_workers: int | None = None):
+    if len(shards) == 0:
+      raise RuntimeError("ShardedVectorStore requires at least one shard.")
+
+    self.shards = shards
+    self.executor = ThreadPoolExecutor(max_workers=max_workers or len(shards))
+
+  # Fibonacci hashing of the id, so that runs of sequential ids still spread evenly over the shards
+  def shard_of(self, id: int) -> int:
+    return ((int(id) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF) % len(self.shards)
+
+  # shard_of over a whole array of ids at once; uint64 multiplication wraps modulo 2**64 like the mask above
+  def shards_of(self, ids: np.ndarray) -> np.ndarray:
+    hashed = ids.astype(np.int64).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    return (hashed % np.uint64(len(self.shards))).astype(np.int64)
+
+  def store_embeddings(self, ids: List[int], vectors: Vectors, metadata: List[Metadata] | None = None):
+    if len(ids) != len(vectors):
+      raise RuntimeError("The number of ids must match the number of vectors")
+    if metadata is not None and len(metadata) != len(ids):
+      raise RuntimeError("The number of metadata entries must match the number of vectors")
+    vectors = as_matrix(vectors)
+
+    # Partition the positions by shard with one stable sort, then store every non-empty partition in parallel
+    id_array = np.asarray(ids, dtype=np.int64)
+    shard_indices = self.shards_of(id_array)
+    order = np.argsort(shard_indices, kind="stable")
+    boundaries = np.cumsum(np.bincount(shard_indices, minlength=len(self.shards)))[:-1]
+    partitions = np.split(order, boundaries)
+
+    futures = [
+      self.executor.submit(
+        shard.store_embeddings,
+        id_array[positions].tolist(),
+        vectors[positions],
+        None if metadata is None else [metadata[p] for p in positions],
+      )
+      for shard, positions in zip(self.shards, partitions) if len(positions)
+    ]
+    for future in futures:
+      future.result()
+
+  def flush(self):
+    for future in [self.executor.submit(shard.flush) for shard in self.shards]:
+      future.result()
+
+  def semantic_search(self, query: VectorLike, k: int, filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
+    return self.semantic_search_batch([query], k, filter)[0]
+
+  def semantic_search_batch(self, queries: Vectors, k: int, filter: MetadataFilter | None = None) -> List[List[SemanticCandidate]]:
+    if k < 1:
+      raise RuntimeError("K must be at least 1 for semantic search")
+    if len(queries) == 0:
+      return []
+
+    # Every shard answers the whole batch, then each query's per-shard top k lists are merged
+    per_shard = list(self.executor.map(
+      lambda shard: shard.semantic_search_batch(queries, k, filter), self.shards))
+    return [self._merge([shard_results[q] for shard_results in per_shard], k) for q in range(len(queries))]
+
+  # Concatenates the per-shard candidates and takes the top k of their scores in one NumPy pass; the
+  # stable sort keeps earlier shards first on ties, like the heap merge it replaces
+  @staticmethod
+  def _merge(shard_candidates: List[List[SemanticCandidate]], k: int) -> List[SemanticCandidate]:
+    candidates = list(itertools.chain.from_iterable(shard_candidates))
+    scores = np.fromiter((c['score'] for c in candidates), dtype=np.float64, count=len(candidates))
+    return [candidates[i] for i in top_k_indices(scores, k)]
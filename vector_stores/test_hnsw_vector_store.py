@@ -0,0 +1,116 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from vector_stores.hnsw_vector_store import HNSWVectorStore
+from vector_stores.numpy_vector_store import NumpyVectorStore
+
+TEST_DIMENSION = 16
+
+class TestHNSWVectorStore(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.default_rng(0)
+    self.vectors = rng.normal(size=(500, TEST_DIMENSION)).astype(np.float32)
+    self.queries = rng.normal(size=(20, TEST_DIMENSION)).astype(np.float32)
+    self.vector_store = HNSWVectorStore(dimension=TEST_DIMENSION, M=8, ef_construction=64, ef_search=64, seed=0)
+
+  def test_recall_against_exact_search_is_high(self):
+    # Arrange: Insert incrementally over several calls
+    for start in range(0, 500, 100):
+      self.vector_store.store_embeddings(list(range(start, start + 100)), self.vectors[start:start + 100].tolist())
+
+    # Act
+    recall = self.vector_store.measure_recall(self.queries.tolist(), k=10)
+
+    # Assert
+    self.assertGreaterEqual(recall, 0.9)
+
+  def test_each_vector_finds_itself(self):
+    # Arrange
+    self.vector_store.store_embeddings(list(range(100)), self.vectors[:100].tolist())
+
+    # Act & Assert
+    for i in range(0, 100, 10):
+      self.assertEqual(self.vector_store.semantic_search(self.vectors[i].tolist(), k=1)[0]['id'], i)
+
+  def test_overwritten_vectors_are_found_at_their_new_position(self):
+    # Arrange: Move 50 stored vectors somewhere else entirely
+    self.vector_store.store_embeddings(list(range(500)), self.vectors.tolist())
+    moved = np.random.default_rng(1).normal(size=(50, TEST_DIMENSION)).astype(np.float32)
+
+    # Act
+    self.vector_store.store_embeddings(list(range(0, 500, 10)), moved.tolist())
+
+    # Assert: Every moved vector is reachable through its new links, and the graph is still accurate
+    for i, vector in enumerate(moved):
+      self.assertEqual(self.vector_store.semantic_search(vector.tolist(), k=1)[0]['id'], i * 10)
+    self.assertGreaterEqual(self.vector_store.measure_recall(self.queries.tolist(), k=10), 0.9)
+    self.assertTrue(all(row not in links for row, node in enumerate(self.vector_store.neighbours)
+      for links in node))
+
+  def test_results_are_sorted_by_score(self):
+    # Arrange
+    self.vector_store.store_embeddings(list(range(200)), self.vectors[:200].tolist())
+
+    # Act
+    results = self.vector_store.semantic_search(self.queries[0].tolist(), k=5)
+
+    # Assert
+    scores = [result['score'] for result in results]
+    self.assertEqual(len(results), 5)
+    self.assertEqual(scores, sorted(scores, reverse=True))
+
+  def test_search_on_empty_store_returns_nothing(self):
+    self.assertEqual(self.vector_store.semantic_search(self.queries[0].tolist(), k=3), [])
+
+  def test_filtered_search_only_returns_matching_vectors(self):
+    # Arrange
+    metadata = [{"tenant": "acme" if i % 3 == 0 else "globex"} for i in range(60)]
+    self.vector_store.store_embeddings(list(range(60)), self.vectors[:60].tolist(), metadata)
+
+    # Act
+    results = self.vector_store.semantic_search(self.vectors[1].tolist(), k=5, filter={"tenant": "acme"})
+
+    # Assert: The unfiltered nearest neighbour (id 1) belongs to another tenant and is excluded
+    self.assertEqual(len(results), 5)
+    self.assertTrue(all(r['id'] % 3 == 0 for r in results))
+
+  def test_save_and_load_round_trip(self):
+    with tempfile.TemporaryDirectory() as directory:
+      # Arrange
+      path = os.path.join(directory, "hnsw.npz")
+      store = HNSWVectorStore(dimension=TEST_DIMENSION, path=path, M=8, seed=0)
+      store.store_embeddings(list(range(200)), self.vectors[:200].tolist())
+      store.flush()
+      expected = store.semantic_search(self.queries[0].tolist(), k=5)
+
+      # Act: A fresh store pointed at the same path loads the persisted graph
+      reloaded = HNSWVectorStore(dimension=TEST_DIMENSION, path=path, M=8, seed=0)
+
+      # Assert
+      self.assertEqual(reloaded.neighbours, store.neighbours)
+      self.assertEqual(reloaded.semantic_search(self.queries[0].tolist(), k=5), expected)
+
+  def test_load_rebuilds_graph_from_plain_numpy_archive(self):
+    with tempfile.TemporaryDirectory() as directory:
+      # Arrange: Vectors persisted without a graph
+      path = os.path.join(directory, "vectors.npz")
+      plain = NumpyVectorStore(dimension=TEST_DIMENSION, path=path)
+      plain.store_embeddings(list(range(50)), self.vectors[:50].tolist())
+      plain.flush()
+
+      # Act
+      store = HNSWVectorStore(dimension=TEST_DIMENSION, path=path, M=8, seed=0)
+
+      # Assert
+      self.assertEqual(len(store.neighbours), 50)
+      self.assertEqual(store.semantic_search(self.vectors[7].tolist(), k=1)[0]['id'], 7)
+
+  def test_semantic_search_with_zero_k_raises_error(self):
+    with self.assertRaises(RuntimeError) as context:
+      self.vector_store.semantic_search([1.0] * TEST_DIMENSION, k=0)
+    self.assertIn("K must be at least 1", str(context.exception))
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from vector_stores.matryoshka_vector_store import MatryoshkaVectorStore
+from vector_stores.numpy_vector_store import NumpyVectorStore
+
+TEST_DIMENSION = 64
+TEST_PREFIX_DIMENSION = 16
+
+class TestMatryoshkaVectorStore(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.default_rng(0)
+    self.vectors = rng.normal(size=(300, TEST_DIMENSION)).astype(np.float32)
+    self.queries = rng.normal(size=(10, TEST_DIMENSION)).astype(np.float32)
+    self.vector_store = MatryoshkaVectorStore(TEST_DIMENSION, prefix_dimension=TEST_PREFIX_DIMENSION, shortlist_k=50,
+      initial_capacity=4)
+
+  def test_prefixes_are_renormalized_truncations(self):
+    # Arrange & Act
+    self.vector_store.store_embeddings([1], [self.vectors[0].tolist()])
+
+    # Assert
+    expected = self.vectors[0][:TEST_PREFIX_DIMENSION] / np.linalg.norm(self.vectors[0][:TEST_PREFIX_DIMENSION])
+    np.testing.assert_allclose(self.vector_store.prefix_matrix[0], expected, rtol=1e-5)
+
+  def test_shortlist_covering_corpus_matches_exact_search(self):
+    # Arrange: A shortlist as large as the corpus means the rerank sees every vector
+    store = MatryoshkaVectorStore(TEST_DIMENSION, prefix_dimension=TEST_PREFIX_DIMENSION, shortlist_k=300)
+    exact = NumpyVectorStore(TEST_DIMENSION)
+    store.store_embeddings(list(range(300)), self.vectors.tolist())
+    exact.store_embeddings(list(range(300)), self.vectors.tolist())
+
+    # Act & Assert
+    for query in self.queries.tolist():
+      self.assertEqual([r['id'] for r in store.semantic_search(query, k=5)], [r['id'] for r in exact.semantic_search(query, k=5)])
+
+  def test_scores_are_full_dimension_scores(self):
+    # Arrange
+    self.vector_store.store_embeddings(list(range(300)), self.vectors.tolist())
+
+    # Act
+    results = self.vector_store.semantic_search(self.vectors[42].tolist(), k=3)
+
+    # Assert: The vector finds itself with a full-dimension cosine similarity of 1
+    self.assertEqual(results[0]['id'], 42)
+    self.assertAlmostEqual(results[0]['score'], 1.0, places=5)
+
+  def test_semantic_search_batch_returns_one_list_per_query(self):
+    # Arrange
+    self.vector_store.store_embeddings(list(range(300)), self.vectors.tolist())
+
+    # Act
+    results = self.vector_store.semantic_search_batch([self.vectors[3].tolist(), self.vectors[7].tolist()], k=2)
+
+    # Assert
+    self.assertEqual([r[0]['id'] for r in results], [3, 7])
+
+  def test_filtered_search_only_returns_matching_vectors(self):
+    # Arrange
+    metadata = [{"tenant": "acme" if i % 3 == 0 else "globex"} for i in range(60)]
+    self.vector_store.store_embeddings(list(range(60)), self.vectors[:60].tolist(), metadata)
+
+    # Act
+    results = self.vector_store.semantic_search(self.vectors[1].tolist(), k=5, filter={"tenant": "acme"})
+
+    # Assert: The unfiltered nearest neighbour (id 1) belongs to another tenant and is excluded
+    self.assertEqual(len(results), 5)
+    self.assertTrue(all(r['id'] % 3 == 0 for r in results))
+
+  def test_save_and_load_rebuilds_prefixes(self):
+    with tempfile.TemporaryDirectory() as directory:
+      # Arrange
+      path = os.path.join(directory, "vectors.npz")
+      store = MatryoshkaVectorStore(TEST_DIMENSION, prefix_dimension=TEST_PREFIX_DIMENSION, path=path)
+      store.store_embeddings(list(range(50)), self.vectors[:50].tolist())
+      store.flush()
+
+      # Act
+      reloaded = MatryoshkaVectorStore(TEST_DIMENSION, prefix_dimension=TEST_PREFIX_DIMENSION, path=path)
+
+      # Assert
+      np.testing.assert_allclose(reloaded.prefix_matrix[:50], store.prefix_matrix[:50])
+
+  def test_invalid_prefix_dimension_raises_error(self):
+    with self.assertRaises(RuntimeError):
+      MatryoshkaVectorStore(TEST_DIMENSION, prefix_dimension=TEST_DIMENSION + 1)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from vector_stores.metadata_index import MetadataIndex
+
+class TestMetadataIndex(unittest.TestCase):
+
+  def setUp(self):
+    self.index = MetadataIndex()
+    self.index.set(0, {"tenant": "acme", "year": 2020, "tags": ["a", "b"]})
+    self.index.set(1, {"tenant": "acme", "year": 2023, "draft": True})
+    self.index.set(2, {"tenant": "globex", "year": 2021, "tags": ["b"]})
+    self.index.set(3, None)
+
+  def evaluate(self, filter):
+    return self.index.evaluate(filter, 4).tolist()
+
+  def test_equality_shorthand_and_eq(self):
+    self.assertEqual(self.evaluate({"tenant": "acme"}), [0, 1])
+    self.assertEqual(self.evaluate({"tenant": {"$eq": "globex"}}), [2])
+
+  def test_list_values_match_any_element(self):
+    self.assertEqual(self.evaluate({"tags": "b"}), [0, 2])
+    self.assertEqual(self.evaluate({"tags": {"$in": ["a", "z"]}}), [0])
+
+  def test_negations_include_rows_without_the_field(self):
+    self.assertEqual(self.evaluate({"tenant": {"$ne": "acme"}}), [2, 3])
+    self.assertEqual(self.evaluate({"tenant": {"$nin": ["acme", "globex"]}}), [3])
+
+  def test_ranges(self):
+    self.assertEqual(self.evaluate({"year": {"$gte": 2021}}), [1, 2])
+    self.assertEqual(self.evaluate({"year": {"$gt": 2020, "$lt": 2023}}), [2])
+
+  def test_bools_do_not_match_ints(self):
+    self.index.set(3, {"draft": 1})
+    self.assertEqual(self.evaluate({"draft": True}), [1])
+
+  def test_exists(self):
+    self.assertEqual(self.evaluate({"tags": {"$exists": True}}), [0, 2])
+    self.assertEqual(self.evaluate({"tags": {"$exists": False}}), [1, 3])
+
+  def test_and_or_and_implicit_and(self):
+    self.assertEqual(self.evaluate({"$or": [{"tenant": "globex"}, {"draft": True}]}), [1, 2])
+    self.assertEqual(self.evaluate({"$and": [{"tenant": "acme"}, {"year": {"$lt": 2021}}]}), [0])
+    self.assertEqual(self.evaluate({"tenant": "acme", "tags": "b"}), [0])
+
+  def test_replacing_metadata_updates_postings(self):
+    # Act
+    self.index.set(0, {"tenant": "globex"})
+
+    # Assert
+    self.assertEqual(self.evaluate({"tenant": "acme"}), [1])
+    self.assertEqual(self.evaluate({"tenant": "globex"}), [0, 2])
+    self.assertEqual(self.evaluate({"tags": "a"}), [])
+
+  def test_repeated_list_elements_can_be_replaced(self):
+    # Arrange
+    self.index.set(3, {"tags": ["a", "a"]})
+
+    # Act
+    self.index.set(3, {"tags": ["c"]})
+
+    # Assert
+    self.assertEqual(self.evaluate({"tags": "a"}), [0])
+    self.assertEqual(self.evaluate({"tags": "c"}), [3])
+
+  def test_list_operands_raise_error(self):
+    with self.assertRaises(RuntimeError):
+      self.evaluate({"tags": {"$eq": ["a"]}})
+    with self.assertRaises(RuntimeError):
+      self.evaluate({"tags": ["a"]})
+    with self.assertRaises(RuntimeError):
+      self.evaluate({"tags": {"$in": [["a"]]}})
+    with self.assertRaises(RuntimeError):
+      self.evaluate({"tags": {"$nin": "a"}})
+
+  def test_unknown_operator_raises_error(self):
+    with self.assertRaises(RuntimeError):
+      self.evaluate({"year": {"$regex": "20.*"}})
+
+if __name__ == "__main__":
+  unittest.main()
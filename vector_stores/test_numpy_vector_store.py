@@ -0,0 +1,169 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from vector_stores.numpy_vector_store import NumpyVectorStore
+
+TEST_DIMENSION = 10
+
+class TestNumpyVectorStore(unittest.TestCase):
+
+  def setUp(self):
+    self.vector_store = NumpyVectorStore(dimension=TEST_DIMENSION, initial_capacity=2)
+
+  def test_cluster_query_returns_nearest_neighbors(self):
+    # Arrange: Create 10 vectors - 7 in a cluster around [.01,1,1,...], 3 around [.9,1,1,...]
+    vectors = []
+    ids = []
+    for i in range(7):
+      vectors.append([0.01 + (i * 0.001)] + [1.0] * (TEST_DIMENSION - 1))
+      ids.append(i)
+    for i in range(7, 10):
+      vectors.append([0.9 + ((i-7) * 0.001)] + [1.0] * (TEST_DIMENSION - 1))
+      ids.append(i)
+    self.vector_store.store_embeddings(ids, vectors)
+
+    # Act: Query with a vector close to the 3-vector direction
+    results = self.vector_store.semantic_search([0.9] + [1.0] * (TEST_DIMENSION - 1), k=3)
+
+    # Assert: The 3 nearest should all be from the 3-vector direction (ids 7-9), best first
+    self.assertEqual(sorted(r['id'] for r in results), [7, 8, 9])
+    self.assertEqual(results[0]['id'], 7)
+    self.assertGreaterEqual(results[0]['score'], results[1]['score'])
+    self.assertGreaterEqual(results[1]['score'], results[2]['score'])
+
+  def test_store_grows_past_initial_capacity(self):
+    # Arrange: initial capacity is 2, so this forces several doublings
+    ids = list(range(9))
+    vectors = [[float(i == j) for j in range(TEST_DIMENSION)] for i in ids]
+
+    # Act
+    self.vector_store.store_embeddings(ids, vectors)
+
+    # Assert: Every vector is its own nearest neighbour
+    self.assertEqual(self.vector_store.size, 9)
+    for i in ids:
+      self.assertEqual(self.vector_store.semantic_search(vectors[i], k=1)[0]['id'], i)
+
+  def test_storing_existing_id_overwrites_vector(self):
+    # Arrange
+    self.vector_store.store_embeddings([1], [[1.0] + [0.0] * (TEST_DIMENSION - 1)])
+
+    # Act: Store a different vector under the same id
+    self.vector_store.store_embeddings([1], [[0.0, 1.0] + [0.0] * (TEST_DIMENSION - 2)])
+
+    # Assert: Only one vector exists and it is the new one
+    results = self.vector_store.semantic_search([0.0, 1.0] + [0.0] * (TEST_DIMENSION - 2), k=5)
+    self.assertEqual(len(results), 1)
+    self.assertAlmostEqual(results[0]['score'], 1.0, places=5)
+
+  def test_k_larger_than_corpus_returns_everything(self):
+    # Arrange
+    self.vector_store.store_embeddings([1, 2], [[1.0] * TEST_DIMENSION, [0.5] * TEST_DIMENSION])
+
+    # Act & Assert
+    self.assertEqual(len(self.vector_store.semantic_search([1.0] * TEST_DIMENSION, k=10)), 2)
+
+  def test_float32_matrices_are_accepted_for_storage_and_queries(self):
+    # Arrange
+    vectors = np.eye(TEST_DIMENSION, dtype=np.float32)[:4]
+    self.vector_store.store_embeddings([10, 11, 12, 13], vectors)
+
+    # Act
+    results = self.vector_store.semantic_search_batch(vectors[[2, 0]], k=1)
+    single = self.vector_store.semantic_search(vectors[3], k=1)
+
+    # Assert
+    self.assertEqual([r[0]['id'] for r in results], [12, 10])
+    self.assertEqual(single[0]['id'], 13)
+
+  def test_semantic_search_batch_matches_single_searches(self):
+    # Arrange
+    ids = list(range(6))
+    vectors = [[float(i == j) + 0.1 * j for j in range(TEST_DIMENSION)] for i in ids]
+    self.vector_store.store_embeddings(ids, vectors)
+    queries = [vectors[0], vectors[3], [1.0] * TEST_DIMENSION]
+
+    # Act
+    batched = self.vector_store.semantic_search_batch(queries, k=3)
+
+    # Assert: One result list per query, identical to searching one at a time
+    self.assertEqual(len(batched), 3)
+    for query, results in zip(queries, batched):
+      single = self.vector_store.semantic_search(query, k=3)
+      self.assertEqual([r['id'] for r in results], [r['id'] for r in single])
+      for batched_result, single_result in zip(results, single):
+        self.assertAlmostEqual(batched_result['score'], single_result['score'], places=5)
+
+  def test_filtered_search_only_returns_matching_vectors(self):
+    # Arrange: Identical vectors for two tenants
+    ids = list(range(6))
+    vectors = [[1.0] * TEST_DIMENSION for _ in ids]
+    metadata = [{"tenant": "acme" if i % 2 == 0 else "globex"} for i in ids]
+    self.vector_store.store_embeddings(ids, vectors, metadata)
+
+    # Act
+    results = self.vector_store.semantic_search([1.0] * TEST_DIMENSION, k=10, filter={"tenant": "globex"})
+    batched = self.vector_store.semantic_search_batch([[1.0] * TEST_DIMENSION], k=10, filter={"tenant": "acme"})
+
+    # Assert
+    self.assertEqual(sorted(r['id'] for r in results), [1, 3, 5])
+    self.assertEqual(sorted(r['id'] for r in batched[0]), [0, 2, 4])
+
+  def test_filter_matching_nothing_returns_nothing(self):
+    self.vector_store.store_embeddings([1], [[1.0] * TEST_DIMENSION], [{"tenant": "acme"}])
+    self.assertEqual(self.vector_store.semantic_search([1.0] * TEST_DIMENSION, k=3, filter={"tenant": "initech"}), [])
+
+  def test_search_on_empty_store_returns_nothing(self):
+    self.assertEqual(self.vector_store.semantic_search([1.0] * TEST_DIMENSION, k=3), [])
+
+  def test_save_and_load_round_trip(self):
+    with tempfile.TemporaryDirectory() as directory:
+      # Arrange
+      path = os.path.join(directory, "vectors.npz")
+      store = NumpyVectorStore(dimension=TEST_DIMENSION, path=path)
+      store.store_embeddings([5, 6], [[1.0] + [0.0] * (TEST_DIMENSION - 1), [0.0] * (TEST_DIMENSION - 1) + [1.0]],
+        [{"tenant": "acme"}, {"tenant": "globex"}])
+      store.flush()
+
+      # Act: A fresh store pointed at the same path loads the persisted vectors
+      reloaded = NumpyVectorStore(dimension=TEST_DIMENSION, path=path)
+
+      # Assert
+      results = reloaded.semantic_search([0.0] * (TEST_DIMENSION - 1) + [1.0], k=1)
+      self.assertEqual(results[0]['id'], 6)
+      filtered = reloaded.semantic_search([0.0] * (TEST_DIMENSION - 1) + [1.0], k=1, filter={"tenant": "acme"})
+      self.assertEqual(filtered[0]['id'], 5)
+
+  def test_nothing_is_written_until_flush(self):
+    with tempfile.TemporaryDirectory() as directory:
+      # Arrange
+      path = os.path.join(directory, "vectors.npz")
+      store = NumpyVectorStore(dimension=TEST_DIMENSION, path=path)
+
+      # Act
+      store.store_embeddings([1], [[1.0] * TEST_DIMENSION])
+      written_before_flush = os.path.exists(path)
+      store.flush()
+
+      # Assert: The archive only appears on flush, and no temporary file is left behind
+      self.assertFalse(written_before_flush)
+      self.assertEqual(os.listdir(directory), ["vectors.npz"])
+      self.assertFalse(store.dirty)
+
+  def test_semantic_search_with_zero_k_raises_error(self):
+    with self.assertRaises(RuntimeError) as context:
+      self.vector_store.semantic_search([1.0] * TEST_DIMENSION, k=0)
+    self.assertIn("K must be at least 1", str(context.exception))
+
+  def test_semantic_search_with_wrong_dimension_raises_error(self):
+    with self.assertRaises(RuntimeError) as context:
+      self.vector_store.semantic_search([1.0] * (TEST_DIMENSION + 5), k=3)
+    self.assertIn("dimension", str(context.exception).lower())
+
+  def test_store_with_wrong_dimension_raises_error(self):
+    with self.assertRaises(RuntimeError):
+      self.vector_store.store_embeddings([1], [[1.0] * (TEST_DIMENSION + 1)])
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,8 +1,11 @@
 import unittest
+import numpy as np
 import os
 import dotenv
-from vector_stores.pinecone_vector_store import PineconeVectorStore
+from unittest.mock import patch
+from vector_stores.pinecone_vector_store import PineconeVectorStore, UpsertError
 from pinecone import Pinecone
+from pinecone.exceptions import PineconeApiException
 
 dotenv.load_dotenv()
 
@@ -85,5 +88,125 @@ class TestPineconeVectorStore(unittest.TestCase):
     
     self.assertIn("dimension", str(context.exception).lower())
 
+class TestPineconeVectorStoreUpserts(unittest.TestCase):
+
+  def setUp(self):
+    # Mock the Pinecone client so no index is created, and skip the backoff sleeps
+    pinecone_patcher = patch('vector_stores.pinecone_vector_store.Pinecone')
+    sleep_patcher = patch('vector_stores.pinecone_vector_store.time.sleep')
+    self.mock_pinecone = pinecone_patcher.start()
+    self.mock_sleep = sleep_patcher.start()
+    self.addCleanup(pinecone_patcher.stop)
+    self.addCleanup(sleep_patcher.stop)
+
+    self.mock_pinecone.return_value.list_indexes.return_value = [{"name": TEST_INDEX_NAME}]
+    self.index = self.mock_pinecone.return_value.Index.return_value
+    self.vector_store = PineconeVectorStore("key", TEST_INDEX_NAME, TEST_DIMENSION, max_upsert_retries=2)
+
+  def test_batch_size_shrinks_with_dimension(self):
+    # Small vectors are capped by the vector count limit, large ones by the request size limit
+    self.assertEqual(PineconeVectorStore.compute_upsert_batch_size(10), 1000)
+    large_batch_size = PineconeVectorStore.compute_upsert_batch_size(3072)
+    self.assertLess(large_batch_size, 1000)
+    self.assertLessEqual(large_batch_size * 3072 * 20, 2 * 1024 * 1024)
+
+  def test_store_embeddings_splits_into_batches(self):
+    # Arrange
+    self.vector_store.upsert_batch_size = 4
+    ids = list(range(10))
+    vectors = [[float(i)] * TEST_DIMENSION for i in ids]
+
+    # Act
+    report = self.vector_store.store_embeddings(ids, vectors)
+
+    # Assert: 10 vectors in batches of 4 is 3 upserts, covering every id exactly once
+    self.assertEqual(self.index.upsert.call_count, 3)
+    upserted_ids = sorted(int(v.id) for c in self.index.upsert.call_args_list for v in c.kwargs['vectors'])
+    self.assertEqual(upserted_ids, ids)
+    self.assertEqual(report['batches'], 3)
+    self.assertEqual(report['failed_batches'], 0)
+    self.assertEqual(len(report['batch_seconds']), 3)
+
+  def test_large_metadata_shrinks_batches(self):
+    # Arrange: Each vector carries ~300KB of metadata, so only 6 fit under the 2MB request limit
+    ids = list(range(10))
+    vectors = [[float(i)] * TEST_DIMENSION for i in ids]
+    metadata = [{"source": "x" * 300_000} for _ in ids]
+
+    # Act
+    report = self.vector_store.store_embeddings(ids, vectors, metadata)
+
+    # Assert
+    batch_sizes = [len(c.kwargs['vectors']) for c in self.index.upsert.call_args_list]
+    self.assertEqual(sorted(batch_sizes), [4, 6])
+    self.assertEqual(report['batches'], 2)
+    self.assertLess(PineconeVectorStore.compute_upsert_batch_size(TEST_DIMENSION, metadata_bytes=300_000), 10)
+
+  def test_float32_matrices_are_converted_to_lists_at_the_edge(self):
+    # Arrange
+    vectors = np.full((2, TEST_DIMENSION), 0.5, dtype=np.float32)
+
+    # Act
+    self.vector_store.store_embeddings([1, 2], vectors)
+
+    # Assert
+    upserted = self.index.upsert.call_args.kwargs['vectors']
+    self.assertEqual([v.values for v in upserted], [[0.5] * TEST_DIMENSION] * 2)
+
+  def test_transient_failures_are_retried(self):
+    # Arrange: First attempt is rate limited, second succeeds
+    self.index.upsert.side_effect = [PineconeApiException("rate limited", 429), None]
+
+    # Act
+    report = self.vector_store.store_embeddings([1], [[1.0] * TEST_DIMENSION])
+
+    # Assert
+    self.assertEqual(self.index.upsert.call_count, 2)
+    self.assertEqual(report['retries'], 1)
+    self.assertEqual(report['failed_batches'], 0)
+    self.mock_sleep.assert_called_once()
+
+  def test_batches_that_keep_failing_raise_with_report(self):
+    # Arrange: Every attempt fails with a server error
+    self.index.upsert.side_effect = PineconeApiException("unavailable", 503)
+
+    # Act
+    with self.assertRaises(UpsertError) as context:
+      self.vector_store.store_embeddings([1, 2], [[1.0] * TEST_DIMENSION, [2.0] * TEST_DIMENSION])
+
+    # Assert: One initial attempt plus max_upsert_retries retries, then the batch is reported as failed
+    self.assertEqual(self.index.upsert.call_count, 3)
+    self.assertEqual(context.exception.report['failed_batches'], 1)
+    self.assertEqual(context.exception.report['failed_ids'], [1, 2])
+
+  def test_other_batches_finish_before_a_failure_is_raised(self):
+    # Arrange: The first batch is rejected, the second goes through
+    self.vector_store.upsert_batch_size = 1
+    def upsert(vectors):
+      if vectors[0].id == "1":
+        raise PineconeApiException("bad request", 400)
+    self.index.upsert.side_effect = upsert
+
+    # Act
+    with self.assertRaises(UpsertError) as context:
+      self.vector_store.store_embeddings([1, 2], [[1.0] * TEST_DIMENSION, [2.0] * TEST_DIMENSION])
+
+    # Assert
+    self.assertEqual(self.index.upsert.call_count, 2)
+    self.assertEqual(context.exception.report['failed_ids'], [1])
+    self.assertIn("bad request", str(context.exception))
+
+  def test_client_errors_are_not_retried(self):
+    # Arrange
+    self.index.upsert.side_effect = PineconeApiException("bad request", 400)
+
+    # Act
+    with self.assertRaises(UpsertError) as context:
+      self.vector_store.store_embeddings([1], [[1.0] * TEST_DIMENSION])
+
+    # Assert
+    self.assertEqual(self.index.upsert.call_count, 1)
+    self.assertEqual(context.exception.report['failed_batches'], 1)
+
 if __name__ == "__main__":
   unittest.main()
@@ -0,0 +1,126 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+from vector_stores.quantized_vector_store import QuantizedVectorStore
+
+TEST_DIMENSION = 32
+
+class TestQuantizedVectorStore(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+    self.path = os.path.join(self.directory.name, "vectors")
+
+    rng = np.random.default_rng(0)
+    self.vectors = rng.normal(size=(600, TEST_DIMENSION)).astype(np.float32)
+    self.queries = rng.normal(size=(20, TEST_DIMENSION)).astype(np.float32)
+
+  def test_int8_recall_against_exact_search_is_high(self):
+    # Arrange
+    store = QuantizedVectorStore(TEST_DIMENSION, self.path, mode="int8", initial_capacity=16)
+    store.store_embeddings(list(range(600)), self.vectors.tolist())
+
+    # Act
+    recall = store.measure_recall(self.queries.tolist(), k=10)
+
+    # Assert
+    self.assertGreaterEqual(recall, 0.95)
+    self.assertGreater(store.compression_ratio, 3.5)
+
+  def test_pq_recall_against_exact_search_is_reasonable(self):
+    # Arrange: 4 dimensions per subvector
+    store = QuantizedVectorStore(TEST_DIMENSION, self.path, mode="pq", pq_subvectors=8, rescore_multiplier=10)
+    store.store_embeddings(list(range(600)), self.vectors.tolist())
+
+    # Act
+    recall = store.measure_recall(self.queries.tolist(), k=10)
+
+    # Assert
+    self.assertGreaterEqual(recall, 0.8)
+    self.assertEqual(store.compression_ratio, 16)
+
+  def test_pq_trains_once_enough_vectors_are_stored(self):
+    # Arrange
+    store = QuantizedVectorStore(TEST_DIMENSION, self.path, mode="pq", pq_subvectors=8)
+
+    # Act & Assert: Small batches are searched at full precision until the codebooks can be trained
+    store.store_embeddings(list(range(100)), self.vectors[:100].tolist())
+    self.assertIsNone(store.codebooks)
+    self.assertEqual(store.semantic_search(self.vectors[5].tolist(), k=1)[0]['id'], 5)
+    store.store_embeddings(list(range(100, 300)), self.vectors[100:300].tolist())
+    self.assertIsNotNone(store.codebooks)
+    self.assertEqual(store.semantic_search(self.vectors[5].tolist(), k=1)[0]['id'], 5)
+
+  def test_pq_training_with_too_few_vectors_raises_error(self):
+    store = QuantizedVectorStore(TEST_DIMENSION, self.path, mode="pq", pq_subvectors=8)
+    with self.assertRaises(RuntimeError) as context:
+      store.train(self.vectors[:100].tolist())
+    self.assertIn("at least 256 training vectors", str(context.exception))
+
+  def test_results_are_rescored_with_full_precision(self):
+    # Arrange
+    store = QuantizedVectorStore(TEST_DIMENSION, self.path, mode="int8")
+    store.store_embeddings(list(range(100)), self.vectors[:100].tolist())
+
+    # Act
+    results = store.semantic_search(self.vectors[5].tolist(), k=3)
+
+    # Assert: The vector finds itself with an exact cosine similarity of 1
+    self.assertEqual(results[0]['id'], 5)
+    self.assertAlmostEqual(results[0]['score'], 1.0, places=5)
+    scores = [result['score'] for result in results]
+    self.assertEqual(scores, sorted(scores, reverse=True))
+
+  def test_filtered_search_only_returns_matching_vectors(self):
+    # Arrange
+    store = QuantizedVectorStore(TEST_DIMENSION, self.path)
+    metadata = [{"tenant": "acme" if i % 3 == 0 else "globex"} for i in range(60)]
+    store.store_embeddings(list(range(60)), self.vectors[:60].tolist(), metadata)
+
+    # Act
+    results = store.semantic_search(self.vectors[1].tolist(), k=5, filter={"tenant": "acme"})
+
+    # Assert: The unfiltered nearest neighbour (id 1) belongs to another tenant and is excluded
+    self.assertEqual(len(results), 5)
+    self.assertTrue(all(r['id'] % 3 == 0 for r in results))
+
+  def test_save_and_load_round_trip(self):
+    # Arrange
+    store = QuantizedVectorStore(TEST_DIMENSION, self.path, mode="pq", pq_subvectors=8)
+    store.store_embeddings(list(range(300)), self.vectors[:300].tolist())
+    store.flush()
+    expected = store.semantic_search(self.queries[0].tolist(), k=5)
+
+    # Act: A fresh store pointed at the same path maps the persisted vectors and codes
+    reloaded = QuantizedVectorStore(TEST_DIMENSION, self.path, mode="pq", pq_subvectors=8)
+
+    # Assert
+    self.assertEqual(reloaded.size, 300)
+    self.assertEqual(reloaded.semantic_search(self.queries[0].tolist(), k=5), expected)
+
+  def test_storing_existing_id_overwrites_vector(self):
+    # Arrange
+    store = QuantizedVectorStore(TEST_DIMENSION, self.path)
+    store.store_embeddings([1, 2], self.vectors[:2].tolist())
+
+    # Act
+    store.store_embeddings([1], [self.vectors[9].tolist()])
+
+    # Assert
+    self.assertEqual(store.size, 2)
+    self.assertEqual(store.semantic_search(self.vectors[9].tolist(), k=1)[0]['id'], 1)
+
+  def test_invalid_mode_raises_error(self):
+    with self.assertRaises(RuntimeError):
+      QuantizedVectorStore(TEST_DIMENSION, self.path, mode="binary")
+
+  def test_semantic_search_with_zero_k_raises_error(self):
+    store = QuantizedVectorStore(TEST_DIMENSION, self.path)
+    with self.assertRaises(RuntimeError) as context:
+      store.semantic_search([1.0] * TEST_DIMENSION, k=0)
+    self.assertIn("K must be at least 1", str(context.exception))
+
+if __name__ == "__main__":
+  unittest.main()
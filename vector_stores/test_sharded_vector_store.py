@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+from vector_stores.sharded_vector_store import ShardedVectorStore
+from vector_stores.numpy_vector_store import NumpyVectorStore
+
+TEST_DIMENSION = 16
+
+class TestShardedVectorStore(unittest.TestCase):
+
+  def setUp(self):
+    rng = np.random.default_rng(0)
+    self.vectors = rng.normal(size=(200, TEST_DIMENSION)).astype(np.float32)
+    self.queries = rng.normal(size=(5, TEST_DIMENSION)).astype(np.float32)
+    self.shards = [NumpyVectorStore(TEST_DIMENSION) for _ in range(4)]
+    self.vector_store = ShardedVectorStore(self.shards)
+
+  def test_every_id_lands_in_exactly_one_shard(self):
+    # Act
+    self.vector_store.store_embeddings(list(range(200)), self.vectors.tolist())
+
+    # Assert: All ids are stored once, and every shard got a share
+    stored = sorted(int(id) for shard in self.shards for id in shard.ids[:shard.size])
+    self.assertEqual(stored, list(range(200)))
+    self.assertTrue(all(shard.size > 0 for shard in self.shards))
+    for shard_index, shard in enumerate(self.shards):
+      for id in shard.ids[:shard.size]:
+        self.assertEqual(self.vector_store.shard_of(int(id)), shard_index)
+
+  def test_vectorized_routing_matches_shard_of(self):
+    # Arrange: Include ids large enough for the hash to wrap, and negative ones
+    ids = np.array([0, 1, 7, 2**40 + 3, 2**62, -1, -12345], dtype=np.int64)
+
+    # Act
+    shard_indices = self.vector_store.shards_of(ids)
+
+    # Assert
+    self.assertEqual(shard_indices.tolist(), [self.vector_store.shard_of(id) for id in ids.tolist()])
+
+  def test_merged_results_match_a_single_store(self):
+    # Arrange
+    single = NumpyVectorStore(TEST_DIMENSION)
+    single.store_embeddings(list(range(200)), self.vectors.tolist())
+    self.vector_store.store_embeddings(list(range(200)), self.vectors.tolist())
+
+    # Act & Assert
+    batched = self.vector_store.semantic_search_batch(self.queries.tolist(), k=7)
+    for query, results in zip(self.queries.tolist(), batched):
+      expected = [r['id'] for r in single.semantic_search(query, k=7)]
+      self.assertEqual([r['id'] for r in self.vector_store.semantic_search(query, k=7)], expected)
+      self.assertEqual([r['id'] for r in results], expected)
+
+  def test_filter_and_metadata_reach_the_shards(self):
+    # Arrange
+    metadata = [{"tenant": "acme" if i < 10 else "globex"} for i in range(200)]
+    self.vector_store.store_embeddings(list(range(200)), self.vectors.tolist(), metadata)
+
+    # Act
+    results = self.vector_store.semantic_search(self.queries[0].tolist(), k=20, filter={"tenant": "acme"})
+
+    # Assert
+    self.assertEqual(sorted(r['id'] for r in results), list(range(10)))
+
+  def test_semantic_search_with_zero_k_raises_error(self):
+    with self.assertRaises(RuntimeError):
+      self.vector_store.semantic_search([1.0] * TEST_DIMENSION, k=0)
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,12 +1,34 @@
 from abc import ABC, abstractmethod
 from typing import List
-from rag_types.vector import SemanticCandidate
+from rag_types.vector import SemanticCandidate, Metadata, MetadataFilter, Vectors, VectorLike
+import asyncio
 
 class VectorStore(ABC):
+  # Stores vectors by id, optionally with one metadata dict per vector that searches can be filtered on
   @abstractmethod
-  def store_embeddings(self, ids: List[int], vectors: List[List[float]]):
+  def store_embeddings(self, ids: List[int], vectors: Vectors, metadata: List[Metadata] | None = None):
     pass
 
+  # Persists everything stored since the last flush. Stores that keep their vectors on disk write them here
+  # rather than on every store_embeddings call, so ingesting in many small batches doesn't rewrite the whole
+  # store each time. Remote and in-memory stores have nothing to do
+  def flush(self):
+    pass
+
+  # Returns the k nearest vectors to the query, considering only vectors whose metadata matches the filter
   @abstractmethod
-  def semantic_search(self, query: List[float], k: int) -> List[SemanticCandidate]:
-    pass
\ No newline at end of file
+  def semantic_search(self, query: VectorLike, k: int, filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
+    pass
+
+  # Runs one semantic search per query. Backends that can answer several queries in a single operation
+  # (one matrix-matrix product, one pooled fan-out, ...) should override this
+  def semantic_search_batch(self, queries: Vectors, k: int, filter: MetadataFilter | None = None) -> List[List[SemanticCandidate]]:
+    return [self.semantic_search(query, k, filter) for query in queries]
+
+  # Async counterparts of the searches. The defaults run the synchronous methods in a worker thread;
+  # backends with a native async client should override them
+  async def semantic_search_async(self, query: VectorLike, k: int, filter: MetadataFilter | None = None) -> List[SemanticCandidate]:
+    return await asyncio.to_thread(self.semantic_search, query, k, filter)
+
+  async def semantic_search_batch_async(self, queries: Vectors, k: int, filter: MetadataFilter | None = None) -> List[List[SemanticCandidate]]:
+    return await asyncio.to_thread(self.semantic_search_batch, queries, k, filter)
\ No newline at end of file